@@ -0,0 +1,90 @@
+"""Compare per-check inserts with the batched ``CheckWriter``.
+
+Usage: python -m benchmarks.bench_check_writer [--checks N] [--urls N]
+       [--batch-size N] [--threads N]
+
+Needs DATABASE_URL pointing at a migrated scratch database.  The script
+adds N urls of its own, stores the same number of checks once with
+``insert_url_check`` and once through a ``CheckWriter``, both from a
+pool of threads like the scheduler uses, and deletes its urls (and with
+them their checks) at the end.
+"""
+
+import argparse
+import sys
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from page_analyzer import database
+from page_analyzer.writer import CheckWriter
+
+HTTP_OK = 200
+
+
+def make_urls(count):
+    prefix = f"https://bench-{uuid.uuid4().hex[:8]}"
+    database.insert_urls(
+        [f"{prefix}-{number}.invalid" for number in range(count)]
+    )
+    with database.get_conn() as conn, conn.cursor() as cur:
+        cur.execute(
+            "SELECT id FROM urls WHERE name LIKE %s ORDER BY id",
+            (prefix + "-%",),
+        )
+        return prefix, [row[0] for row in cur.fetchall()]
+
+
+def drop_urls(prefix):
+    with database.get_conn() as conn, conn.cursor() as cur:
+        cur.execute("DELETE FROM urls WHERE name LIKE %s", (prefix + "-%",))
+        conn.commit()
+
+
+def run(store, url_ids, checks, threads):
+    def one(number):
+        url_id = url_ids[number % len(url_ids)]
+        store(url_id, HTTP_OK, f"h1 {number}", "title", "description")
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(one, range(checks)))
+    return time.perf_counter() - started
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--checks", type=int, default=20_000)
+    parser.add_argument("--urls", type=int, default=1000)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--threads", type=int, default=8)
+    args = parser.parse_args(argv)
+    if not database.DATABASE_URL:
+        print("DATABASE_URL is not set", file=sys.stderr)
+        return 1
+
+    prefix, url_ids = make_urls(args.urls)
+    try:
+        per_row = run(
+            database.insert_url_check, url_ids, args.checks, args.threads
+        )
+        with CheckWriter(args.batch_size) as writer:
+            batched = run(writer.add, url_ids, args.checks, args.threads)
+            closing = time.perf_counter()
+        batched += time.perf_counter() - closing
+    finally:
+        drop_urls(prefix)
+    for name, elapsed in (
+        ("insert_url_check", per_row),
+        ("CheckWriter", batched),
+    ):
+        print(
+            f"{name:>16}: {elapsed:7.2f} s, "
+            f"{args.checks / elapsed:9.0f} checks/s, "
+            f"{per_row / elapsed:5.1f}x"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,76 @@
+"""Compare the SEO extraction backends on a corpus of saved pages.
+
+Usage: python -m benchmarks.bench_parsers CORPUS_DIR [--repeat N]
+
+Every ``*.html`` file under CORPUS_DIR is parsed by each available backend.
+The script reports the mean time per page and lists the pages where a
+backend disagrees with ``bs4`` (the reference implementation).
+"""
+
+import argparse
+import statistics
+import sys
+import time
+from pathlib import Path
+
+from page_analyzer.parser import PARSER_BACKENDS
+
+REFERENCE = "bs4"
+
+
+def load_corpus(directory):
+    pages = {}
+    for path in sorted(Path(directory).rglob("*.html")):
+        pages[path.name] = path.read_bytes().decode("utf-8", "replace")
+    return pages
+
+
+def bench(parse, pages, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for html in pages.values():
+            parse(html)
+        timings.append((time.perf_counter() - started) / len(pages))
+    return min(timings), statistics.mean(timings)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("corpus", help="directory with saved *.html pages")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    pages = load_corpus(args.corpus)
+    if not pages:
+        print(f"no *.html files in {args.corpus}", file=sys.stderr)
+        return 1
+    size = sum(len(html) for html in pages.values())
+    print(f"{len(pages)} page(s), {size / len(pages) / 1024:.1f} KiB avg")
+
+    reference = PARSER_BACKENDS[REFERENCE]
+    expected = {name: reference(html) for name, html in pages.items()}
+    backends = sorted(PARSER_BACKENDS, key=lambda name: name != REFERENCE)
+    reference_time = None
+    for backend in backends:
+        parse = PARSER_BACKENDS[backend]
+        best, mean = bench(parse, pages, args.repeat)
+        reference_time = reference_time or best
+        mismatches = [
+            name
+            for name, html in pages.items()
+            if parse(html) != expected[name]
+        ]
+        print(
+            f"{backend:>5}: best {best * 1000:8.3f} ms/page, "
+            f"mean {mean * 1000:8.3f} ms/page, "
+            f"{reference_time / best:5.1f}x vs {REFERENCE}, "
+            f"{len(mismatches)} mismatch(es)"
+        )
+        for name in mismatches:
+            print(f"    {name}: {parse(pages[name])!r} != {expected[name]!r}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,96 @@
+"""Time url validation and normalization as done by the bulk importer.
+
+Usage: python -m benchmarks.bench_url_utils [--lines N] [--repeat N]
+
+A synthetic import of N lines is built: mostly distinct urls, some
+repeated, some malformed.  Every line is validated and the valid ones
+normalized, once with the previous implementation (no memo, no
+pre-check, ``urlparse``) and once with ``page_analyzer.url_utils``.
+"""
+
+import argparse
+import random
+import statistics
+import sys
+import time
+from urllib.parse import urlparse
+
+import validators
+
+from page_analyzer import url_utils
+
+REPEATED_SHARE = 0.3
+MALFORMED_SHARE = 0.2
+MALFORMED = [
+    "example.com",
+    "www.example.com/path",
+    "not a url",
+    "https:/example.com",
+    "",
+    "mailto:admin@example.com",
+]
+
+
+def baseline_validate(url, max_length=url_utils.DEFAULT_MAX_LENGTH):
+    if not url or len(url) > max_length:
+        return False
+    return validators.url(url) is True
+
+
+def baseline_normalize(url):
+    parsed = urlparse(url)
+    return f"{parsed.scheme}://{parsed.netloc}"
+
+
+def make_lines(count, seed=0):
+    rnd = random.Random(seed)
+    lines = []
+    for number in range(count):
+        roll = rnd.random()
+        if roll < MALFORMED_SHARE:
+            lines.append(rnd.choice(MALFORMED))
+        elif roll < MALFORMED_SHARE + REPEATED_SHARE and lines:
+            lines.append(f"https://site{rnd.randrange(1000)}.com/")
+        else:
+            lines.append(f"https://Host{number}.Example.com/page?id={number}")
+    return lines
+
+
+def run(validate, normalize, lines):
+    started = time.perf_counter()
+    for line in lines:
+        if validate(line):
+            normalize(line)
+    return time.perf_counter() - started
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--lines", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    lines = make_lines(args.lines)
+    candidates = {
+        "baseline": (baseline_validate, baseline_normalize),
+        "url_utils": (url_utils.validate_url, url_utils.normalize_url),
+    }
+    reference = None
+    for name, (validate, normalize) in candidates.items():
+        timings = []
+        for _ in range(args.repeat):
+            url_utils._validate.cache_clear()
+            timings.append(run(validate, normalize, lines))
+        best = min(timings)
+        reference = reference or best
+        print(
+            f"{name:>9}: best {best * 1000:8.1f} ms, "
+            f"mean {statistics.mean(timings) * 1000:8.1f} ms, "
+            f"{best / len(lines) * 1e6:6.2f} us/line, "
+            f"{reference / best:4.1f}x"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,4 +1,4 @@
 #!/usr/bin/env bash
 curl -LsSf https://astral.sh/uv/install.sh | sh
 source $HOME/.local/bin/env
-make install && psql -a -d $DATABASE_URL -f database.sql
\ No newline at end of file
+make install && make migrate
\ No newline at end of file
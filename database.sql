@@ -1,15 +1,64 @@
+-- Current schema for reference. Changes are shipped as versioned files in
+-- page_analyzer/migrations and applied with `make migrate`.
+
 CREATE TABLE IF NOT EXISTS urls (
     id SERIAL PRIMARY KEY,
     name VARCHAR(255) UNIQUE NOT NULL,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    last_checked_at TIMESTAMP,
+    last_status_code INT,
+    check_interval INTERVAL CHECK (check_interval > INTERVAL '0'),
+    next_check_at TIMESTAMP
 );
 
-CREATE TABLE url_checks (
-    id SERIAL PRIMARY KEY,
+CREATE INDEX IF NOT EXISTS urls_next_check_at_idx
+    ON urls (next_check_at) WHERE next_check_at IS NOT NULL;
+
+CREATE TABLE IF NOT EXISTS url_checks (
+    id SERIAL,
     url_id INT REFERENCES urls(id) ON DELETE CASCADE,
     status_code INT,
     h1 TEXT,
     title TEXT,
     description TEXT,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-);
\ No newline at end of file
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    etag TEXT,
+    last_modified TEXT,
+    content_hash TEXT,
+    PRIMARY KEY (id, created_at)
+) PARTITION BY RANGE (created_at);
+
+-- One partition per month, url_checks_YYYY_MM; created ahead of time by
+-- `python -m page_analyzer partitions` and the check worker.  Checks of
+-- a month without its partition go to url_checks_default.
+CREATE TABLE IF NOT EXISTS url_checks_default
+    PARTITION OF url_checks DEFAULT;
+
+CREATE INDEX IF NOT EXISTS url_checks_url_id_created_at_idx
+    ON url_checks (url_id, created_at DESC, id DESC);
+
+CREATE TABLE IF NOT EXISTS check_jobs (
+    id SERIAL PRIMARY KEY,
+    url_id INT NOT NULL REFERENCES urls(id) ON DELETE CASCADE,
+    status VARCHAR(16) NOT NULL DEFAULT 'queued',
+    attempts INT NOT NULL DEFAULT 0,
+    error TEXT,
+    url_check_id INT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    started_at TIMESTAMP,
+    finished_at TIMESTAMP
+);
+
+CREATE UNIQUE INDEX IF NOT EXISTS check_jobs_active_url_id_idx
+    ON check_jobs (url_id) WHERE status IN ('queued', 'running');
+
+CREATE INDEX IF NOT EXISTS check_jobs_queued_idx
+    ON check_jobs (id) WHERE status = 'queued';
+
+CREATE INDEX IF NOT EXISTS check_jobs_url_id_idx
+    ON check_jobs (url_id, id DESC);
+
+CREATE TABLE IF NOT EXISTS worker_heartbeats (
+    name VARCHAR(255) PRIMARY KEY,
+    seen_at TIMESTAMP NOT NULL
+);
@@ -0,0 +1,16 @@
+from page_analyzer.metrics import registry
+
+
+def on_starting(server):
+    registry.archive_stale()
+
+
+def post_fork(server, worker):
+    # Only the web workers report to METRICS_DIR, not every process
+    # that imports the app (CLI commands, pool processes).
+    registry.start()
+
+
+def child_exit(server, worker):
+    # A worker killed on timeout never runs its atexit flush.
+    registry.archive(worker.pid)
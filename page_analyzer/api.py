@@ -0,0 +1,164 @@
+"""Versioned JSON API over urls and their checks.
+
+``/api/v1/urls``, ``/api/v1/urls/<id>`` and ``/api/v1/urls/<id>/checks``
+return JSON.  Lists are keyset-paginated: a page carries
+``next_cursor``, passed back as ``?before=`` for the following page.
+``?fields=id,name`` limits the columns read and returned, so clients
+can leave out the long texts of checks.
+
+With ``?format=ndjson`` a list is streamed as one JSON object per line
+instead, read from a server-side cursor: without ``limit`` every row
+after the cursor is sent, and memory use does not depend on how many
+there are.
+"""
+
+import json
+import os
+from datetime import datetime, timedelta
+
+from flask import Blueprint, Response, request, stream_with_context
+
+from .database import (
+    CHECK_COLUMNS,
+    URL_COLUMNS,
+    checks_query,
+    fetch_rows,
+    stream_rows,
+    urls_query,
+)
+
+api = Blueprint("api", __name__, url_prefix="/api/v1")
+
+API_PAGE_SIZE = 100
+API_MAX_PAGE_SIZE = 1000
+STREAM_ITERSIZE = int(os.getenv("API_STREAM_ITERSIZE", "1000"))
+NDJSON = "application/x-ndjson"
+
+
+class BadRequest(ValueError):
+    pass
+
+
+@api.errorhandler(BadRequest)
+def bad_request(error):
+    return {"error": str(error)}, 400
+
+
+def _json_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, timedelta):
+        return value.total_seconds()
+    return value
+
+
+def _fields(allowed):
+    value = request.args.get("fields")
+    if not value:
+        return list(allowed)
+    fields = [field.strip() for field in value.split(",") if field.strip()]
+    unknown = [field for field in fields if field not in allowed]
+    if unknown:
+        raise BadRequest(f"unknown field(s): {', '.join(unknown)}")
+    return fields
+
+
+def _limit():
+    value = request.args.get("limit")
+    if value is None:
+        return None
+    if not value.isdigit() or int(value) == 0:
+        raise BadRequest("limit must be a positive integer")
+    return int(value)
+
+
+def _url_cursor():
+    value = request.args.get("before")
+    if value is None:
+        return None
+    if not value.isdigit():
+        raise BadRequest("invalid cursor")
+    return int(value)
+
+
+def _check_cursor():
+    value = request.args.get("before")
+    if value is None:
+        return None
+    created_at, _, check_id = value.rpartition("_")
+    try:
+        return datetime.fromisoformat(created_at), int(check_id)
+    except ValueError:
+        raise BadRequest("invalid cursor") from None
+
+
+def _listing(build_query, fields, keys, cursor_of):
+    """Answer a list request as a JSON page or an NDJSON stream.
+
+    ``keys`` are the columns the cursor is made of; they are read even
+    when not asked for.  ``build_query(columns, limit)`` returns the
+    query and ``cursor_of(row)`` the cursor value of a row.
+    """
+    columns = [*keys, *(field for field in fields if field not in keys)]
+    positions = [columns.index(field) for field in fields]
+    limit = _limit()
+
+    def item(row):
+        return {
+            field: _json_value(row[position])
+            for field, position in zip(fields, positions, strict=True)
+        }
+
+    if request.args.get("format") == "ndjson":
+        query, params = build_query(columns, limit)
+
+        def lines():
+            for row in stream_rows(query, params, STREAM_ITERSIZE):
+                yield json.dumps(item(row), ensure_ascii=False) + "\n"
+
+        return Response(stream_with_context(lines()), mimetype=NDJSON)
+
+    limit = min(limit or API_PAGE_SIZE, API_MAX_PAGE_SIZE)
+    rows = fetch_rows(*build_query(columns, limit + 1))
+    page = rows[:limit]
+    has_next = len(rows) > limit
+    return {
+        "items": [item(row) for row in page],
+        "next_cursor": cursor_of(page[-1]) if has_next else None,
+    }
+
+
+@api.get("/urls")
+def urls():
+    before = _url_cursor()
+    return _listing(
+        lambda columns, limit: urls_query(columns, limit, before),
+        _fields(URL_COLUMNS),
+        ("id",),
+        lambda row: str(row[0]),
+    )
+
+
+@api.get("/urls/<int:id>")
+def url(id):
+    fields = _fields(URL_COLUMNS)
+    rows = fetch_rows(*urls_query(fields, url_id=id))
+    if not rows:
+        return {"error": "url not found"}, 404
+    return {
+        field: _json_value(value)
+        for field, value in zip(fields, rows[0], strict=True)
+    }
+
+
+@api.get("/urls/<int:id>/checks")
+def url_checks(id):
+    before = _check_cursor()
+    if not fetch_rows(*urls_query(["id"], url_id=id)):
+        return {"error": "url not found"}, 404
+    return _listing(
+        lambda columns, limit: checks_query(id, columns, limit, before),
+        _fields(CHECK_COLUMNS),
+        ("created_at", "id"),
+        lambda row: f"{row[0].isoformat()}_{row[1]}",
+    )
@@ -1,22 +1,168 @@
+import functools
 import os
+import time
+from datetime import datetime
+from urllib.parse import urlencode
 
 from dotenv import load_dotenv
-from flask import Flask, flash, redirect, render_template, request, url_for
+from flask import (
+    Flask,
+    Response,
+    flash,
+    g,
+    make_response,
+    redirect,
+    request,
+    session,
+    url_for,
+)
+from flask import render_template as flask_render_template
 from requests.exceptions import RequestException
 
+from .api import api
+from .cache import LIST_PAGES, CachedPage, page_cache, url_pages
 from .database import (
+    enqueue_check,
+    fetch_check_jobs,
     fetch_url,
     fetch_urls_with_last_check,
-    find_url_by_name,
-    insert_url,
-    insert_url_check,
+    find_url_by_id,
+    pool_stats,
+    upsert_url,
+)
+from .importer import import_urls
+from .metrics import (
+    CONTENT_TYPE,
+    HTTP_REQUEST_SECONDS,
+    TEMPLATE_RENDER_SECONDS,
+    registry,
 )
-from .parser import fetch_html, parse_seo
+from .parser import fetcher
 from .url_utils import normalize_url, validate_url
+from .worker import run_check, worker_alive
 
 load_dotenv()
 app = Flask(__name__)
 app.config["SECRET_KEY"] = os.getenv("SECRET_KEY")
+# True queues checks for the worker, False runs them in the request and
+# None (unset) queues them only while a worker is alive.
+app.config["CHECKS_ASYNC"] = {
+    "1": True,
+    "true": True,
+    "yes": True,
+    "0": False,
+    "false": False,
+    "no": False,
+}.get(os.getenv("CHECKS_ASYNC", "").strip().lower())
+app.register_blueprint(api)
+
+URLS_PAGE_SIZE = 50
+URLS_MAX_PAGE_SIZE = 200
+CHECKS_PAGE_SIZE = int(os.getenv("CHECKS_PAGE_SIZE", "50"))
+CHECKS_MAX_PAGE_SIZE = 500
+
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+
+@app.after_request
+def record_request_time(response):
+    started = g.pop("request_started", None)
+    if started is not None:
+        HTTP_REQUEST_SECONDS.observe(
+            time.perf_counter() - started,
+            endpoint=request.endpoint or "unmatched",
+            method=request.method,
+            status=response.status_code,
+        )
+    registry.flush()
+    return response
+
+
+def render_template(template_name, **context):
+    with TEMPLATE_RENDER_SECONDS.time(template=template_name):
+        return flask_render_template(template_name, **context)
+
+
+def _int_arg(name):
+    value = request.args.get(name, "")
+    return int(value) if value.isdigit() else None
+
+
+def _check_cursor_arg(name):
+    created_at, _, check_id = request.args.get(name, "").rpartition("_")
+    try:
+        return datetime.fromisoformat(created_at), int(check_id)
+    except ValueError:
+        return None
+
+
+def _check_cursor(check):
+    return f"{check[5].isoformat()}_{check[0]}"
+
+
+def _page_size(default, maximum):
+    return min(_int_arg("limit") or default, maximum)
+
+
+def _keyset_page(rows, limit, before, after):
+    """Cut rows fetched with ``limit + 1`` to a page.
+
+    Returns ``(page, has_prev, has_next)``.
+    """
+    if after is not None and before is None:
+        return rows[-limit:], len(rows) > limit, True
+    return rows[:limit], before is not None, len(rows) > limit
+
+
+def cached_page(scope):
+    """Serve a GET view from the page cache and answer revalidations.
+
+    ``scope`` is the cache scope of the view's pages, or a function of
+    the view's arguments returning it.  Only plain rendered pages are
+    cached; redirects and pages rendered while flash messages are
+    pending bypass the cache.
+    """
+
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            if page_cache is None or session.get("_flashes"):
+                return view(*args, **kwargs)
+            key = request.path
+            if request.args:
+                key += "?" + urlencode(sorted(request.args.items()))
+            generation = page_cache.generation(
+                scope(*args, **kwargs) if callable(scope) else scope
+            )
+            page = page_cache.get(key, generation)
+            if page is None:
+                body = view(*args, **kwargs)
+                if not isinstance(body, str):
+                    return body
+                page = CachedPage.render(body)
+                page_cache.put(key, generation, page)
+            if page.not_modified(
+                request.headers.get("If-None-Match"),
+                request.headers.get("If-Modified-Since"),
+            ):
+                response = make_response("", 304)
+            else:
+                response = make_response(page.body)
+            response.headers.update(page.headers())
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+def checks_async():
+    """Whether checks go to the worker queue, see ``CHECKS_ASYNC``."""
+    mode = app.config["CHECKS_ASYNC"]
+    return worker_alive() if mode is None else mode
 
 
 @app.route("/", methods=["GET", "POST"])
@@ -26,6 +172,21 @@ def index():
     return render_template("index.html")
 
 
+@app.get("/health")
+def health():
+    return {
+        "status": "ok",
+        "db_pool": pool_stats(),
+        "dns_cache": fetcher.dns_cache.stats(),
+        "page_cache": page_cache.stats() if page_cache else None,
+    }
+
+
+@app.get("/metrics")
+def metrics():
+    return Response(registry.render(), content_type=CONTENT_TYPE)
+
+
 @app.post("/urls")
 def urls_create():
     url = request.form.get("url", "").strip()
@@ -37,50 +198,106 @@ def urls_create():
     url_norm = normalize_url(url)
 
     try:
-        row = find_url_by_name(url_norm)
-        if row:
+        url_id, created = upsert_url(url_norm)
+        if created:
+            flash("Страница успешно добавлена", "success")
+        else:
             flash("Страница уже существует", "info")
-            return redirect(url_for("show_url", id=row[0]))
-
-        new_id = insert_url(url_norm)
-        flash("Страница успешно добавлена", "success")
-        return redirect(url_for("show_url", id=new_id))
+        return redirect(url_for("show_url", id=url_id))
 
     except Exception:
         flash("Ошибка при добавлении", "danger")
         return render_template("index.html", url=url), 500
 
 
+@app.post("/urls/import")
+def urls_import():
+    upload = request.files.get("file")
+    if not upload or not upload.filename:
+        flash("Выберите файл для импорта", "danger")
+        return redirect(url_for("index"))
+
+    lines = (line.decode("utf-8", "replace") for line in upload.stream)
+    try:
+        stats = import_urls(lines)
+    except Exception:
+        flash("Ошибка при импорте", "danger")
+        return redirect(url_for("index"))
+
+    flash(
+        f"Добавлено: {stats.inserted}, уже были: {stats.duplicates}, "
+        f"некорректных: {stats.invalid}",
+        "success" if stats.inserted else "info",
+    )
+    return redirect(url_for("urls_index"))
+
+
 @app.get("/urls")
+@cached_page(LIST_PAGES)
 def urls_index():
-    urls_list = fetch_urls_with_last_check()
-    return render_template("urls.html", urls=urls_list)
+    limit = _page_size(URLS_PAGE_SIZE, URLS_MAX_PAGE_SIZE)
+    before = _int_arg("before")
+    after = _int_arg("after")
+    rows = fetch_urls_with_last_check(
+        limit=limit + 1, before=before, after=None if before else after
+    )
+    urls_list, has_prev, has_next = _keyset_page(rows, limit, before, after)
+
+    return render_template(
+        "urls.html",
+        urls=urls_list,
+        limit=limit,
+        prev_cursor=urls_list[0][0] if urls_list and has_prev else None,
+        next_cursor=urls_list[-1][0] if urls_list and has_next else None,
+    )
 
 
 @app.get("/urls/<int:id>")
+@cached_page(url_pages)
 def show_url(id):
-    url_item, checks = fetch_url(id)
+    limit = _page_size(CHECKS_PAGE_SIZE, CHECKS_MAX_PAGE_SIZE)
+    before = _check_cursor_arg("before")
+    after = _check_cursor_arg("after")
+    url_item, rows = fetch_url(
+        id, limit=limit + 1, before=before, after=None if before else after
+    )
     if not url_item:
         flash("Страница не найдена", "danger")
         return redirect(url_for("urls_index"))
 
-    return render_template("show_url.html", url=url_item, checks=checks)
+    checks, has_prev, has_next = _keyset_page(rows, limit, before, after)
+    jobs = []
+    if app.config["CHECKS_ASYNC"] is not False:
+        jobs = fetch_check_jobs(id)
+    return render_template(
+        "show_url.html",
+        url=url_item,
+        checks=checks,
+        jobs=jobs,
+        limit=limit,
+        prev_cursor=_check_cursor(checks[0]) if checks and has_prev else None,
+        next_cursor=_check_cursor(checks[-1]) if checks and has_next else None,
+    )
 
 
 @app.post("/urls/<int:id>/checks")
 def create_check(id):
-    url_item, _ = fetch_url(id)
+    url_item = find_url_by_id(id)
     if not url_item:
         flash("Сайт не найден", "danger")
         return redirect(url_for("urls_index"))
 
+    if checks_async():
+        if enqueue_check(id):
+            flash("Проверка поставлена в очередь", "info")
+        else:
+            flash("Проверка уже выполняется", "info")
+        return redirect(url_for("show_url", id=id))
+
     url = url_item[1]
 
     try:
-        html, status_code = fetch_html(url, timeout=10)
-        h1, title, description = parse_seo(html)
-
-        insert_url_check(id, status_code, h1, title, description)
+        run_check(id, url)
         flash("Страница успешно проверена", "success")
 
     except RequestException:
@@ -0,0 +1,394 @@
+"""Concurrent re-check of every url in the catalog.
+
+Urls are streamed from the database, fetched with aiohttp under a global
+and a per-host connection limit, parsed with ``parse_seo`` and written
+back with batched inserts.  Timeouts, retries and the User-Agent follow
+the same ``FetcherConfig`` as the synchronous fetcher.
+
+Urls go through a ``HostScheduler``: requests to one host are spaced out
+by the per-host rate limit and hosts take turns, so a host that is
+throttled (or sent ``Retry-After``) does not hold up the others.
+
+With ``parse_workers`` set, fetched pages are parsed in a process pool
+instead of the event loop's thread pool, so parsing is not bound by the
+GIL.  Pages are sent to the pool in chunks of ``parse_chunk_size`` and
+only the extracted ``(h1, title, description)`` tuples come back, with
+the CPU time each page took, which is recorded here.
+
+Fetches are timed by phase in ``page_analyzer_fetch_phase_duration_seconds``
+like those of the synchronous fetcher: ``dns`` and ``connect`` through an
+aiohttp trace, ``first_byte`` and ``total`` around the request.
+
+A failed batch write does not end the run: it is retried while the
+database is unavailable, up to ``WRITE_ATTEMPTS`` times, and written row
+by row when one of its rows is at fault.  Checks that still cannot be
+written are logged and counted as unsaved.
+"""
+
+import asyncio
+import itertools
+import logging
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field, replace
+from datetime import datetime
+
+import aiohttp
+
+from .database import insert_url_checks, is_transient_error, iter_urls
+from .fetcher import RETRY_STATUSES, FetcherConfig
+from .metrics import FETCH_PHASE_SECONDS, registry
+from .parser import (
+    LastCheck,
+    content_hash,
+    is_unchanged,
+    parse_many,
+    parse_seo,
+    record_parse_time,
+)
+from .partitions import ensure_partitions
+from .ratelimit import RATE_LIMIT_STATUSES, HostScheduler
+from .url_utils import host_key
+
+logger = logging.getLogger(__name__)
+
+HTTP_ERROR_STATUS = 400
+WRITE_ATTEMPTS = 3
+WRITE_RETRY_DELAY = 1.0
+
+
+class _RetryableStatusError(aiohttp.ClientResponseError):
+    pass
+
+
+def _phase_trace():
+    """An aiohttp trace recording the ``dns`` and ``connect`` phases."""
+
+    async def on_connect_start(session, context, params):
+        context.connect_started = time.perf_counter()
+        context.dns_seconds = 0.0
+
+    async def on_connect_end(session, context, params):
+        FETCH_PHASE_SECONDS.observe(
+            time.perf_counter() - context.connect_started - context.dns_seconds,
+            phase="connect",
+        )
+
+    async def on_dns_start(session, context, params):
+        context.dns_started = time.perf_counter()
+
+    async def on_dns_end(session, context, params):
+        context.dns_seconds = time.perf_counter() - context.dns_started
+        FETCH_PHASE_SECONDS.observe(context.dns_seconds, phase="dns")
+
+    trace = aiohttp.TraceConfig()
+    trace.on_connection_create_start.append(on_connect_start)
+    trace.on_connection_create_end.append(on_connect_end)
+    trace.on_dns_resolvehost_start.append(on_dns_start)
+    trace.on_dns_resolvehost_end.append(on_dns_end)
+    return trace
+
+
+@dataclass
+class BatchStats:
+    checked: int = 0
+    failed: int = 0
+    unchanged: int = 0
+    unsaved: int = 0
+    latencies: list = field(default_factory=list)
+    started: float = field(default_factory=time.monotonic)
+    finished: float | None = None
+
+    def record(self, latency, *, ok):
+        self.latencies.append(latency)
+        if ok:
+            self.checked += 1
+        else:
+            self.failed += 1
+
+    def percentile(self, pct):
+        if not self.latencies:
+            return 0.0
+        ordered = sorted(self.latencies)
+        index = min(len(ordered) - 1, round(pct / 100 * (len(ordered) - 1)))
+        return ordered[index]
+
+    def summary(self):
+        elapsed = (self.finished or time.monotonic()) - self.started
+        total = self.checked + self.failed
+        return (
+            f"{total} url(s) in {elapsed:.1f}s "
+            f"({total / elapsed if elapsed else 0:.1f}/s): "
+            f"{self.checked} checked ({self.unchanged} unchanged), "
+            f"{self.failed} failed"
+            f"{f', {self.unsaved} not saved' if self.unsaved else ''}; "
+            f"latency p50={self.percentile(50):.3f}s "
+            f"p95={self.percentile(95):.3f}s "
+            f"p99={self.percentile(99):.3f}s "
+            f"max={max(self.latencies, default=0):.3f}s"
+        )
+
+
+class BatchChecker:
+    def __init__(
+        self,
+        *,
+        concurrency=50,
+        per_host=2,
+        timeout=None,
+        batch_size=500,
+        parse_workers=0,
+        parse_chunk_size=16,
+        config=None,
+    ):
+        config = config or FetcherConfig.from_env()
+        if timeout is not None:
+            config = replace(config, read_timeout=timeout)
+        self.config = config
+        self.concurrency = concurrency
+        self.per_host = per_host
+        self.batch_size = batch_size
+        self.parse_workers = parse_workers
+        self.parse_chunk_size = parse_chunk_size
+        self.stats = BatchStats()
+        self.limiter = config.limiter()
+        self._rows = []
+        self._pool = None
+        self._pages = []
+        self._parsing = set()
+        self._parse_slots = None
+
+    async def fetch(self, session, url, headers=None):
+        """Return ``(html, status_code, fingerprint)`` for ``url``.
+
+        ``fingerprint`` is ``(etag, last_modified, content_hash)``.
+        """
+        attempt = 0
+        with FETCH_PHASE_SECONDS.time(phase="total"):
+            while True:
+                retry = attempt < self.config.retries
+                try:
+                    return await self._get(
+                        session, url, retry=retry, headers=headers
+                    )
+                except (aiohttp.ClientConnectorError, _RetryableStatusError):
+                    if not retry:
+                        raise
+                await asyncio.sleep(
+                    max(
+                        self.config.backoff(attempt),
+                        self.limiter.take(host_key(url)),
+                    )
+                )
+                attempt += 1
+
+    async def _get(self, session, url, *, retry, headers):
+        started = time.perf_counter()
+        async with session.get(url, headers=headers) as response:
+            FETCH_PHASE_SECONDS.observe(
+                time.perf_counter() - started, phase="first_byte"
+            )
+            if response.status in RATE_LIMIT_STATUSES:
+                self.limiter.retry_after(
+                    url, response.headers.get("Retry-After")
+                )
+            if retry and (
+                response.status in RETRY_STATUSES
+                or response.status in RATE_LIMIT_STATUSES
+            ):
+                raise _RetryableStatusError(
+                    response.request_info,
+                    response.history,
+                    status=response.status,
+                )
+            if response.status >= HTTP_ERROR_STATUS:
+                raise aiohttp.ClientResponseError(
+                    response.request_info,
+                    response.history,
+                    status=response.status,
+                )
+            body = await response.read()
+            html = body.decode(response.get_encoding(), errors="replace")
+            fingerprint = (
+                response.headers.get("ETag"),
+                response.headers.get("Last-Modified"),
+                content_hash(body),
+            )
+            return html, response.status, fingerprint
+
+    async def check(self, session, url_id, url, last_check=None):
+        last_check = last_check and LastCheck(*last_check)
+        headers = last_check.conditional_headers() if last_check else None
+        started = time.monotonic()
+        try:
+            html, status_code, fingerprint = await self.fetch(
+                session, url, headers
+            )
+        except (TimeoutError, aiohttp.ClientError):
+            self.stats.record(time.monotonic() - started, ok=False)
+            return
+        self.stats.record(time.monotonic() - started, ok=True)
+        etag, last_modified, body_hash = fingerprint
+        if is_unchanged(last_check, status_code, body_hash):
+            self.stats.unchanged += 1
+            fingerprint = (
+                etag or last_check.etag,
+                last_modified or last_check.last_modified,
+                last_check.content_hash,
+            )
+            page = (url_id, last_check.status_code, html, datetime.now())
+            seo = (last_check.h1, last_check.title, last_check.description)
+            await self._add_page((*page, fingerprint), seo)
+            return
+        page = (url_id, status_code, html, datetime.now(), fingerprint)
+        if self._pool is not None:
+            self._pages.append(page)
+            if len(self._pages) >= self.parse_chunk_size:
+                await self._submit_pages()
+            return
+        loop = asyncio.get_running_loop()
+        seo = await loop.run_in_executor(None, parse_seo, html)
+        await self._add_page(page, seo)
+
+    async def _add_page(self, page, seo):
+        url_id, status_code, _, checked_at, fingerprint = page
+        await self._add_row(
+            (url_id, status_code, *seo, checked_at, *fingerprint)
+        )
+
+    async def _add_row(self, row):
+        self._rows.append(row)
+        if len(self._rows) >= self.batch_size:
+            await self.flush()
+
+    async def _submit_pages(self):
+        pages, self._pages = self._pages, []
+        # Bound the chunks waiting for the pool so fetchers slow down
+        # instead of piling up page bodies in memory.
+        await self._parse_slots.acquire()
+        finished = {task for task in self._parsing if task.done()}
+        self._parsing -= finished
+        for task in finished:
+            task.result()  # re-raise a failed chunk, e.g. a broken pool
+        self._parsing.add(asyncio.create_task(self._parse_pages(pages)))
+
+    async def _parse_pages(self, pages):
+        loop = asyncio.get_running_loop()
+        try:
+            results = await loop.run_in_executor(
+                self._pool, parse_many, [page[2] for page in pages]
+            )
+        finally:
+            self._parse_slots.release()
+        for page, (seo, cpu_seconds) in zip(pages, results, strict=True):
+            record_parse_time(cpu_seconds)
+            await self._add_page(page, seo)
+
+    async def _drain_parsing(self):
+        if self._pages:
+            await self._submit_pages()
+        await asyncio.gather(*self._parsing)
+
+    async def flush(self):
+        rows, self._rows = self._rows, []
+        if rows:
+            self.stats.unsaved += await asyncio.to_thread(self._write, rows)
+
+    def _write(self, rows):
+        """Write ``rows``, row by row if needed; return how many failed."""
+        try:
+            self._insert(rows)
+        except Exception as error:
+            if is_transient_error(error):
+                logger.exception("could not write %s check(s)", len(rows))
+                return len(rows)
+        else:
+            return 0
+        unsaved = 0
+        for row in rows:
+            try:
+                self._insert([row])
+            except Exception:
+                logger.exception("could not write the check of url %s", row[0])
+                unsaved += 1
+        return unsaved
+
+    def _insert(self, rows):
+        for attempt in itertools.count(1):
+            try:
+                insert_url_checks(rows)
+                return
+            except Exception as error:
+                if attempt >= WRITE_ATTEMPTS or not is_transient_error(error):
+                    raise
+            time.sleep(WRITE_RETRY_DELAY * 2 ** (attempt - 1))
+
+    async def _consume(self, session, scheduler):
+        while (item := await scheduler.get()) is not None:
+            await self.check(session, *item)
+
+    async def run(self, urls):
+        """Check every ``(url_id, url[, last_check])`` from ``urls``.
+
+        ``last_check`` is a row as returned by ``fetch_last_check``; when
+        given, the page is requested conditionally and not parsed again
+        if it did not change.
+        """
+        # aiohttp has its own resolver cache; give it the same lifetime.
+        connector = aiohttp.TCPConnector(
+            limit=self.concurrency,
+            limit_per_host=self.per_host,
+            use_dns_cache=self.config.dns_ttl > 0,
+            ttl_dns_cache=self.config.dns_ttl,
+        )
+        session = aiohttp.ClientSession(
+            connector=connector,
+            headers={"User-Agent": self.config.user_agent},
+            timeout=aiohttp.ClientTimeout(
+                sock_connect=self.config.connect_timeout,
+                sock_read=self.config.read_timeout,
+            ),
+            trace_configs=[_phase_trace()],
+        )
+        scheduler = HostScheduler(self.limiter)
+        if self.parse_workers:
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.parse_workers,
+                mp_context=multiprocessing.get_context("forkserver"),
+            )
+            self._parse_slots = asyncio.Semaphore(self.parse_workers * 2)
+        try:
+            async with session:
+                consumers = [
+                    asyncio.create_task(self._consume(session, scheduler))
+                    for _ in range(self.concurrency)
+                ]
+                iterator = iter(urls)
+                while chunk := await asyncio.to_thread(
+                    list, itertools.islice(iterator, self.batch_size)
+                ):
+                    for item in chunk:
+                        await scheduler.put(item, item[1])
+                    # Keep up to two batches queued: enough hosts to pick
+                    # from, without reading the whole catalog into memory.
+                    await scheduler.wait_below(self.batch_size)
+                await scheduler.close()
+                await asyncio.gather(*consumers)
+            if self._pool is not None:
+                await self._drain_parsing()
+        finally:
+            if self._pool is not None:
+                self._pool.shutdown(cancel_futures=True)
+                self._pool = None
+        await self.flush()
+        self.stats.finished = time.monotonic()
+        return self.stats
+
+
+def check_all(batch_size=500, **options):
+    registry.start()
+    ensure_partitions()
+    checker = BatchChecker(batch_size=batch_size, **options)
+    urls = iter_urls(batch_size=batch_size, with_last_check=True)
+    return asyncio.run(checker.run(urls))
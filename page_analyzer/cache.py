@@ -0,0 +1,359 @@
+"""Response cache for the url list and url pages.
+
+Rendered pages are stored under a *generation*.  Every write to urls,
+url_checks or check_jobs starts a new one, so a page rendered before the
+write is never served again.  Generations are kept per *scope*: the url
+list pages (``LIST_PAGES``) and the pages of each url (``url_pages``).
+A write to one url calls ``invalidate_url_pages`` and only drops that
+url's pages and the list; ``invalidate_pages`` drops everything.
+Entries also expire after ``ttl`` seconds as a safety net for writers
+that cannot reach the cache (see below).
+
+Two backends are available:
+
+- ``MemoryPageCache`` keeps an LRU of pages in the process.  Writes made
+  by other processes (another gunicorn worker, ``worker``, ``check-all``)
+  do not invalidate it, so their results show up after at most ``ttl``.
+- ``FilePageCache`` keeps pages and the generation in a directory shared
+  by every process on the host, so any writer invalidates it at once.
+
+Each page carries an ``ETag`` (hash of the body) for conditional
+requests.  ``Last-Modified`` has whole seconds, which cannot tell apart
+two pages rendered within one second; it is only sent, and
+``If-Modified-Since`` only answered, once the page is a second old.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from datetime import UTC, datetime
+from email.utils import format_datetime, parsedate_to_datetime
+
+from dotenv import load_dotenv
+
+LIST_PAGES = "urls"
+# Age after which a page's whole-second Last-Modified is unambiguous.
+LAST_MODIFIED_AGE = 1.0
+
+
+def url_pages(url_id):
+    """Scope of the pages of url ``url_id``."""
+    return f"url:{url_id}"
+
+
+@dataclass(frozen=True)
+class CachedPage:
+    body: str
+    etag: str
+    last_modified: float
+    stored_at: float
+
+    @classmethod
+    def render(cls, body, now=None):
+        now = time.time() if now is None else now
+        etag = hashlib.sha256(body.encode()).hexdigest()[:32]
+        # HTTP dates have whole seconds.
+        return cls(body, etag, float(int(now)), now)
+
+    def _dated(self, now):
+        now = time.time() if now is None else now
+        return now - self.stored_at >= LAST_MODIFIED_AGE
+
+    def headers(self, now=None):
+        headers = {"ETag": f'"{self.etag}"', "Cache-Control": "no-cache"}
+        if self._dated(now):
+            modified = datetime.fromtimestamp(self.last_modified, UTC)
+            headers["Last-Modified"] = format_datetime(modified, usegmt=True)
+        return headers
+
+    def not_modified(
+        self, if_none_match=None, if_modified_since=None, now=None
+    ):
+        """Whether a request with these validators may get a 304.
+
+        ``If-None-Match`` wins over ``If-Modified-Since`` when both are
+        sent, as RFC 9110 requires; the date is ignored while the page
+        is younger than ``LAST_MODIFIED_AGE``.
+        """
+        if if_none_match:
+            tags = {
+                tag.strip().removeprefix("W/")
+                for tag in if_none_match.split(",")
+            }
+            return "*" in tags or f'"{self.etag}"' in tags
+        if if_modified_since and self._dated(now):
+            try:
+                since = parsedate_to_datetime(if_modified_since)
+            except (TypeError, ValueError):
+                return False
+            if since.tzinfo is None:
+                since = since.replace(tzinfo=UTC)
+            return self.last_modified <= since.timestamp()
+        return False
+
+
+class _PageCache:
+    def __init__(self, max_entries, ttl, clock):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def _fresh(self, page):
+        return self.ttl <= 0 or self.clock() - page.stored_at < self.ttl
+
+    def get(self, key, generation):
+        """Return the page cached for ``key`` in ``generation`` or None."""
+        page = self._load(key, generation)
+        if page is None or not self._fresh(page):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return page
+
+    def stats(self):
+        return {
+            "backend": self.backend,
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+        }
+
+
+class MemoryPageCache(_PageCache):
+    """Pages in an LRU of ``max_entries``.
+
+    Only scopes with cached pages keep a token of their own, so the
+    bookkeeping stays within ``max_entries`` however many urls are
+    written to.  The others share ``_floor``, which moves on at every
+    invalidation: a page rendered before the call is never stored.
+    """
+
+    backend = "memory"
+
+    def __init__(self, max_entries=256, ttl=60.0, *, clock=time.time):
+        super().__init__(max_entries, ttl, clock)
+        self._generation = 0
+        self._floor = 0
+        # scope -> (token, keys of its cached pages)
+        self._scopes = {}
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _current(self, scope):
+        token, _ = self._scopes.get(scope, (self._floor, None))
+        return (scope, self._generation, token)
+
+    def generation(self, scope=LIST_PAGES):
+        with self._lock:
+            return self._current(scope)
+
+    def _load(self, key, generation):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != generation:
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def _drop(self, key):
+        generation, _ = self._entries.pop(key)
+        keys = self._scopes[generation[0]][1]
+        keys.discard(key)
+        if not keys:
+            del self._scopes[generation[0]]
+
+    def put(self, key, generation, page):
+        scope, _, token = generation
+        with self._lock:
+            if generation != self._current(scope):
+                return
+            if key in self._entries:
+                self._drop(key)
+            self._scopes.setdefault(scope, (token, set()))[1].add(key)
+            self._entries[key] = (generation, page)
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+
+    def invalidate(self, scopes=None):
+        """Drop the pages of ``scopes``, or every page when None."""
+        with self._lock:
+            if scopes is None:
+                self._generation += 1
+                self._scopes.clear()
+                self._entries.clear()
+            else:
+                for scope in scopes:
+                    _, keys = self._scopes.pop(scope, (None, ()))
+                    for key in keys:
+                        del self._entries[key]
+                self._floor += 1
+            self.invalidations += 1
+
+    def stats(self):
+        with self._lock:
+            return {**super().stats(), "size": len(self._entries)}
+
+
+class FilePageCache(_PageCache):
+    """Pages stored as files under ``directory/<generation>/``.
+
+    The current generation is the content of ``directory/generation``;
+    it is replaced atomically, so readers in other processes see either
+    the old or the new one.  Directories of old generations are removed
+    when a page of the current one is stored.  A scope's generation is
+    a token in ``directory/<generation>/scopes/``, stored with each page
+    and compared when the page is read.
+    """
+
+    backend = "file"
+
+    def __init__(
+        self, directory, max_entries=256, ttl=60.0, *, clock=time.time
+    ):
+        super().__init__(max_entries, ttl, clock)
+        self.directory = directory
+        self._generation_file = os.path.join(directory, "generation")
+        os.makedirs(directory, exist_ok=True)
+
+    def _read(self, path):
+        with open(path, encoding="ascii") as file:
+            return file.read().strip()
+
+    def _global_generation(self):
+        try:
+            return self._read(self._generation_file)
+        except FileNotFoundError:
+            return self.invalidate(count=False)
+
+    def _scope_path(self, generation, scope):
+        name = hashlib.sha256(scope.encode()).hexdigest()
+        return os.path.join(self.directory, generation, "scopes", name)
+
+    def generation(self, scope=LIST_PAGES):
+        generation = self._global_generation()
+        try:
+            token = self._read(self._scope_path(generation, scope))
+        except FileNotFoundError:
+            token = ""
+        return (scope, generation, token)
+
+    def _path(self, key, generation):
+        name = hashlib.sha256(key.encode()).hexdigest()
+        return os.path.join(self.directory, generation[1], f"{name}.json")
+
+    def _write(self, path, text):
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as file:
+            file.write(text)
+        os.replace(tmp, path)
+
+    def _load(self, key, generation):
+        try:
+            with open(self._path(key, generation), encoding="utf-8") as file:
+                data = json.load(file)
+            if data.pop("scope_generation") != generation[2]:
+                return None
+            return CachedPage(**data)
+        except (FileNotFoundError, ValueError, TypeError, KeyError):
+            return None
+
+    def put(self, key, generation, page):
+        if generation != self.generation(generation[0]):
+            return
+        path = self._path(key, generation)
+        folder = os.path.dirname(path)
+        data = {**asdict(page), "scope_generation": generation[2]}
+        try:
+            os.makedirs(folder, exist_ok=True)
+            if not os.path.exists(path) and (
+                len(os.listdir(folder)) >= self.max_entries
+            ):
+                return
+            self._write(path, json.dumps(data))
+        except OSError:
+            return
+        self._remove_old(generation[1])
+
+    def _remove_old(self, generation):
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if name != generation and os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+
+    def invalidate(self, scopes=None, *, count=True):
+        """Drop the pages of ``scopes``, or every page when None."""
+        token = f"{time.time_ns():x}{os.urandom(4).hex()}"
+        if scopes is None:
+            self._write(self._generation_file, token)
+        else:
+            generation = self._global_generation()
+            for scope in scopes:
+                path = self._scope_path(generation, scope)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                self._write(path, token)
+        if count:
+            self.invalidations += 1
+        return token
+
+    def stats(self):
+        folder = os.path.join(self.directory, self._global_generation())
+        size = (
+            sum(name.endswith(".json") for name in os.listdir(folder))
+            if os.path.isdir(folder)
+            else 0
+        )
+        return {**super().stats(), "size": size}
+
+
+PAGE_CACHE_BACKENDS = ("memory", "file")
+
+
+def page_cache_from_env():
+    """Build the cache selected by ``PAGE_CACHE``; ``None`` when off."""
+    backend = os.getenv("PAGE_CACHE", "").lower()
+    if backend in ("", "0", "off", "none"):
+        return None
+    if backend not in PAGE_CACHE_BACKENDS:
+        raise ValueError(
+            f"unknown page cache {backend!r}, "
+            f"expected one of {', '.join(PAGE_CACHE_BACKENDS)}"
+        )
+    max_entries = int(os.getenv("PAGE_CACHE_SIZE", "256"))
+    ttl = float(os.getenv("PAGE_CACHE_TTL", "60"))
+    if backend == "file":
+        directory = os.getenv("PAGE_CACHE_DIR") or os.path.join(
+            tempfile.gettempdir(), "page-analyzer-cache"
+        )
+        return FilePageCache(directory, max_entries, ttl)
+    return MemoryPageCache(max_entries, ttl)
+
+
+# database.py imports this module before it loads .env itself.
+load_dotenv()
+page_cache = page_cache_from_env()
+
+
+def invalidate_pages():
+    """Drop every cached page; called after writes to many urls."""
+    if page_cache is not None:
+        page_cache.invalidate()
+
+
+def invalidate_url_pages(*url_ids):
+    """Drop the list pages and the pages of ``url_ids``.
+
+    Called after a committed write to the given urls, their checks or
+    jobs.  Pass no ids when only the list changed (a new url).
+    """
+    if page_cache is not None:
+        page_cache.invalidate([LIST_PAGES, *map(url_pages, url_ids)])
@@ -0,0 +1,506 @@
+import argparse
+import logging
+import signal
+import sys
+import threading
+from datetime import datetime, timedelta
+
+import psycopg2
+
+from . import (
+    batch,
+    database,
+    export,
+    importer,
+    migrate,
+    partitions,
+    retention,
+    scheduler,
+    worker,
+)
+
+
+def connect():
+    return psycopg2.connect(database.DATABASE_URL)
+
+
+def cmd_migrate(args):
+    conn = connect()
+    try:
+        if args.list:
+            applied = migrate.applied_versions(conn)
+            for migration in migrate.discover():
+                mark = "x" if migration.version in applied else " "
+                print(f"[{mark}] {migration.version:04d} {migration.name}")
+            return 0
+        applied = migrate.migrate(
+            conn,
+            target=args.target,
+            on_apply=lambda m: print(f"applying {m.version:04d} {m.name}"),
+        )
+        print(f"{len(applied)} migration(s) applied")
+        return 0
+    finally:
+        conn.close()
+
+
+def cmd_backfill_last_checks(args):
+    updated = database.backfill_last_checks(
+        batch_size=args.batch_size,
+        on_batch=lambda done, total, count: print(
+            f"{min(done, total)}/{total} urls scanned, {count} updated"
+        ),
+    )
+    print(f"{updated} url(s) updated")
+    return 0
+
+
+def cmd_check_last_checks(args):
+    mismatches = database.find_last_check_mismatches(limit=args.limit)
+    for url_id, stored_at, stored_code, actual_at, actual_code in mismatches:
+        print(
+            f"url {url_id}: stored ({stored_at}, {stored_code}), "
+            f"latest check ({actual_at}, {actual_code})"
+        )
+    print(f"{len(mismatches)} mismatch(es) found")
+    return 1 if mismatches else 0
+
+
+def cmd_worker(args):
+    logging.basicConfig(
+        level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s"
+    )
+    stop = threading.Event()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *_: stop.set())
+    worker.run_worker(
+        poll_interval=args.poll_interval,
+        stale_after=args.stale_after,
+        max_attempts=args.max_attempts,
+        stop=stop,
+    )
+    return 0
+
+
+def cmd_check_all(args):
+    stats = batch.check_all(
+        batch_size=args.batch_size,
+        concurrency=args.concurrency,
+        per_host=args.per_host,
+        timeout=args.timeout,
+        parse_workers=args.parse_workers,
+        parse_chunk_size=args.parse_chunk_size,
+    )
+    print(stats.summary())
+    return 0
+
+
+def cmd_prune_checks(args):
+    policy = retention.RetentionPolicy(
+        raw_days=args.raw_days,
+        hourly_days=args.hourly_days,
+        daily_days=args.daily_days or None,
+    )
+    stats = retention.prune_checks(
+        policy,
+        url_batch_size=args.url_batch_size,
+        delete_batch_size=args.batch_size,
+        vacuum=args.vacuum,
+        dry_run=args.dry_run,
+        on_batch=lambda stats: print(
+            f"{stats.urls} url(s) scanned, {stats.deleted} check(s) "
+            + ("to delete" if args.dry_run else "deleted")
+        ),
+    )
+    print(stats.summary())
+    return 0
+
+
+def cmd_partitions(args):
+    for name in partitions.ensure_partitions(months_ahead=args.ahead):
+        print(f"created {name}")
+    if args.detach_before:
+        detached = partitions.detach_partitions(
+            args.detach_before, drop=args.drop
+        )
+        for name in detached:
+            print(f"{'dropped' if args.drop else 'detached'} {name}")
+    for partition in partitions.list_partitions():
+        start = f"{partition.start:%Y-%m-%d}" if partition.start else "..."
+        end = f"{partition.end:%Y-%m-%d}" if partition.end else "..."
+        print(f"{partition.name}: {start} - {end}")
+    return 0
+
+
+def cmd_import_urls(args):
+    if args.file == "-":
+        stats = importer.import_urls(sys.stdin, batch_size=args.batch_size)
+    else:
+        with open(args.file, encoding="utf-8", newline="") as lines:
+            stats = importer.import_urls(lines, batch_size=args.batch_size)
+    print(stats.summary())
+    return 0
+
+
+def cmd_normalize_urls(args):
+    def report(url_id, name, canonical, into_id):
+        if canonical is None:
+            print(f"{url_id} {name}: cannot be normalized")
+        elif into_id == url_id:
+            print(f"{url_id} {name} -> {canonical}")
+        else:
+            print(f"{url_id} {name} -> {canonical}, merged into {into_id}")
+
+    stats = importer.normalize_stored_urls(
+        apply=not args.dry_run, on_change=report
+    )
+    print(f"{stats.summary()}{' (dry run)' if args.dry_run else ''}")
+    return 0
+
+
+def cmd_export_checks(args):
+    stats = export.export_checks(
+        args.directory,
+        args.format,
+        itersize=args.itersize,
+        row_group_size=args.row_group_size,
+        wait=args.wait,
+        full=args.full,
+        on_chunk=lambda stats: print(f"{stats.rows} check(s) written"),
+    )
+    print(stats.summary())
+    return 0
+
+
+def cmd_schedule(args):
+    count = database.schedule_urls(
+        None if args.off else args.every, url_ids=args.url_ids or None
+    )
+    action = "unscheduled" if args.off else f"scheduled every {args.every}"
+    print(f"{count} url(s) {action}")
+    return 0
+
+
+def cmd_scheduler(args):
+    logging.basicConfig(
+        level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s"
+    )
+    stop = threading.Event()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *_: stop.set())
+    stats = scheduler.run_scheduler(
+        poll_interval=args.poll_interval,
+        batch_size=args.batch_size,
+        concurrency=args.concurrency,
+        lease=timedelta(seconds=args.lease),
+        jitter=args.jitter,
+        write_batch_size=args.write_batch_size,
+        flush_interval=args.flush_interval,
+        stop=stop,
+    )
+    print(stats.summary())
+    return 0
+
+
+DURATION_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+def _duration(value):
+    """Parse ``90``, ``30m``, ``6h`` or ``1d`` into a timedelta."""
+    unit = DURATION_UNITS.get(value[-1:].lower())
+    number = value[:-1] if unit else value
+    try:
+        seconds = float(number) * (unit or 1)
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+            f"invalid duration: {value}"
+        ) from None
+    if seconds <= 0:
+        raise argparse.ArgumentTypeError("duration must be positive")
+    return timedelta(seconds=seconds)
+
+
+def _month(value):
+    return datetime.strptime(value, "%Y-%m")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="page_analyzer")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    migrate_parser = commands.add_parser(
+        "migrate", help="apply pending schema migrations"
+    )
+    migrate_parser.add_argument(
+        "--target", type=int, help="stop after this migration version"
+    )
+    migrate_parser.add_argument(
+        "--list", action="store_true", help="show migrations and their state"
+    )
+    migrate_parser.set_defaults(handler=cmd_migrate)
+
+    backfill_parser = commands.add_parser(
+        "backfill-last-checks",
+        help="fill the latest check summary on urls from url_checks",
+    )
+    backfill_parser.add_argument("--batch-size", type=int, default=1000)
+    backfill_parser.set_defaults(handler=cmd_backfill_last_checks)
+
+    check_parser = commands.add_parser(
+        "check-last-checks",
+        help="report urls whose latest check summary is out of date",
+    )
+    check_parser.add_argument("--limit", type=int, default=100)
+    check_parser.set_defaults(handler=cmd_check_last_checks)
+
+    worker_parser = commands.add_parser(
+        "worker", help="process checks queued from the web UI"
+    )
+    worker_parser.add_argument("--poll-interval", type=float, default=1.0)
+    worker_parser.add_argument(
+        "--stale-after",
+        type=float,
+        default=120.0,
+        help="seconds after which a running job is considered abandoned",
+    )
+    worker_parser.add_argument("--max-attempts", type=int, default=3)
+    worker_parser.set_defaults(handler=cmd_worker)
+
+    check_all_parser = commands.add_parser(
+        "check-all", help="check every url concurrently"
+    )
+    check_all_parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=50,
+        help="maximum number of requests in flight",
+    )
+    check_all_parser.add_argument(
+        "--per-host",
+        type=int,
+        default=2,
+        help="maximum number of concurrent connections per host",
+    )
+    check_all_parser.add_argument(
+        "--timeout",
+        type=float,
+        help="read timeout in seconds (default: FETCH_READ_TIMEOUT)",
+    )
+    check_all_parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=500,
+        help="urls read and checks written per database round trip",
+    )
+    check_all_parser.add_argument(
+        "--parse-workers",
+        type=int,
+        default=0,
+        help="processes used to parse pages (default: parse in threads)",
+    )
+    check_all_parser.add_argument(
+        "--parse-chunk-size",
+        type=int,
+        default=16,
+        help="pages sent to a parse process at a time",
+    )
+    check_all_parser.set_defaults(handler=cmd_check_all)
+
+    prune_parser = commands.add_parser(
+        "prune-checks",
+        help="downsample old checks and delete expired ones",
+    )
+    prune_parser.add_argument(
+        "--raw-days",
+        type=float,
+        default=30,
+        help="keep every check this many days",
+    )
+    prune_parser.add_argument(
+        "--hourly-days",
+        type=float,
+        default=90,
+        help="then keep one check per url and hour this many days",
+    )
+    prune_parser.add_argument(
+        "--daily-days",
+        type=float,
+        default=365,
+        help="then keep one check per url and day; 0 keeps them forever",
+    )
+    prune_parser.add_argument(
+        "--url-batch-size",
+        type=int,
+        default=100,
+        help="urls whose checks are examined per query",
+    )
+    prune_parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=5000,
+        help="checks deleted per transaction",
+    )
+    prune_parser.add_argument(
+        "--vacuum",
+        action="store_true",
+        help="run VACUUM (ANALYZE) on url_checks afterwards",
+    )
+    prune_parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="only count the checks that would be deleted",
+    )
+    prune_parser.set_defaults(handler=cmd_prune_checks)
+
+    partitions_parser = commands.add_parser(
+        "partitions",
+        help="create upcoming monthly url_checks partitions, detach old ones",
+    )
+    partitions_parser.add_argument(
+        "--ahead",
+        type=int,
+        default=3,
+        help="months after the current one to create partitions for",
+    )
+    partitions_parser.add_argument(
+        "--detach-before",
+        type=_month,
+        metavar="YYYY-MM",
+        help="detach partitions holding only checks before this month",
+    )
+    partitions_parser.add_argument(
+        "--drop",
+        action="store_true",
+        help="drop the detached partitions instead of keeping them",
+    )
+    partitions_parser.set_defaults(handler=cmd_partitions)
+
+    import_parser = commands.add_parser(
+        "import-urls",
+        help="add urls from a CSV file or a list with one url per line",
+    )
+    import_parser.add_argument("file", help="file to read, - for stdin")
+    import_parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=1000,
+        help="urls inserted per statement",
+    )
+    import_parser.set_defaults(handler=cmd_import_urls)
+
+    normalize_parser = commands.add_parser(
+        "normalize-urls",
+        help="rename stored urls to their canonical form, merging duplicates",
+    )
+    normalize_parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="only report the urls that would change",
+    )
+    normalize_parser.set_defaults(handler=cmd_normalize_urls)
+
+    _add_schedule_parsers(commands)
+    _add_export_parser(commands)
+    return parser
+
+
+def _add_export_parser(commands):
+    export_parser = commands.add_parser(
+        "export-checks",
+        help="export checks added since the last export to CSV or Parquet",
+    )
+    export_parser.add_argument(
+        "directory", help="directory for the files and the export state"
+    )
+    export_parser.add_argument(
+        "--format", choices=sorted(export.EXPORT_FORMATS), default="csv"
+    )
+    export_parser.add_argument(
+        "--itersize",
+        type=int,
+        default=10_000,
+        help="rows fetched from the server-side cursor per round trip",
+    )
+    export_parser.add_argument(
+        "--row-group-size",
+        type=int,
+        default=100_000,
+        help="rows per Parquet row group (and per write)",
+    )
+    export_parser.add_argument(
+        "--wait",
+        type=float,
+        default=export.DEFAULT_WAIT,
+        help="seconds to wait for open inserts of checks before giving up",
+    )
+    export_parser.add_argument(
+        "--full",
+        action="store_true",
+        help="export every check, ignoring the previous exports",
+    )
+    export_parser.set_defaults(handler=cmd_export_checks)
+
+
+def _add_schedule_parsers(commands):
+    schedule_parser = commands.add_parser(
+        "schedule", help="set or clear the recurring check interval of urls"
+    )
+    schedule_parser.add_argument(
+        "url_ids", nargs="*", type=int, help="urls to change (default: all)"
+    )
+    schedule_group = schedule_parser.add_mutually_exclusive_group(
+        required=True
+    )
+    schedule_group.add_argument(
+        "--every",
+        type=_duration,
+        help="check interval: seconds or a number with s, m, h or d",
+    )
+    schedule_group.add_argument(
+        "--off", action="store_true", help="stop recurring checks"
+    )
+    schedule_parser.set_defaults(handler=cmd_schedule)
+
+    scheduler_parser = commands.add_parser(
+        "scheduler", help="run the recurring checks as they come due"
+    )
+    scheduler_parser.add_argument("--poll-interval", type=float, default=5.0)
+    scheduler_parser.add_argument(
+        "--batch-size", type=int, default=50, help="urls claimed at a time"
+    )
+    scheduler_parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=8,
+        help="checks run in parallel",
+    )
+    scheduler_parser.add_argument(
+        "--lease",
+        type=float,
+        default=scheduler.DEFAULT_LEASE.total_seconds(),
+        help="seconds before urls claimed by a dead scheduler are retried",
+    )
+    scheduler_parser.add_argument(
+        "--jitter",
+        type=float,
+        default=scheduler.DEFAULT_JITTER,
+        help="spread of the next check time, as a fraction of the interval",
+    )
+    scheduler_parser.add_argument(
+        "--write-batch-size",
+        type=int,
+        default=500,
+        help="checks stored per transaction",
+    )
+    scheduler_parser.add_argument(
+        "--flush-interval",
+        type=float,
+        default=1.0,
+        help="seconds a check may wait before it is stored",
+    )
+    scheduler_parser.set_defaults(handler=cmd_scheduler)
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.handler(args)
@@ -1,89 +1,1060 @@
+import functools
+import logging
 import os
+import time
+from contextlib import contextmanager
 from datetime import datetime
 
 import psycopg2
 from dotenv import load_dotenv
+from psycopg2.extras import execute_values
+
+from .cache import invalidate_pages, invalidate_url_pages
+from .metrics import (
+    DB_CONNECTION_WAIT_SECONDS,
+    DB_QUERY_SECONDS,
+    DB_SLOW_QUERIES,
+)
+from .pool import ConnectionPool, PoolTimeoutError
+
+logger = logging.getLogger(__name__)
 
 load_dotenv()
 DATABASE_URL = os.getenv("DATABASE_URL")
+# Statements slower than this are logged; 0 turns the log off.
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "0"))
+
+pool = ConnectionPool(
+    DATABASE_URL,
+    min_size=int(os.getenv("DB_POOL_MIN_SIZE", "1")),
+    max_size=int(os.getenv("DB_POOL_MAX_SIZE", "5")),
+    timeout=float(os.getenv("DB_POOL_TIMEOUT", "5")),
+    check_idle=float(os.getenv("DB_POOL_CHECK_IDLE", "30")),
+    on_checkout=DB_CONNECTION_WAIT_SECONDS.observe,
+)
 
 
 def get_conn():
-    return psycopg2.connect(DATABASE_URL)
+    return pool.connection()
+
+
+@contextmanager
+def _timed(statement):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        DB_QUERY_SECONDS.observe(elapsed, statement=statement)
+        if SLOW_QUERY_MS and elapsed * 1000 >= SLOW_QUERY_MS:
+            DB_SLOW_QUERIES.inc(statement=statement)
+            logger.warning(
+                "slow query %s took %.1f ms", statement, elapsed * 1000
+            )
+
+
+def timed_query(func):
+    """Record the run time of ``func`` under its name as the statement.
+
+    Generators time each of their queries with ``_timed`` instead, as
+    their run time depends on the consumer.
+    """
 
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with _timed(func.__name__):
+            return func(*args, **kwargs)
 
-def find_url_by_name(name):
+    return wrapper
+
+
+def pool_stats():
+    return pool.stats()
+
+
+def is_transient_error(error):
+    """Whether the same statements may succeed when retried later.
+
+    Lost connections, timeouts and deadlocks are; errors caused by the
+    data, which fail again on every retry, are not.
+    """
+    return isinstance(
+        error,
+        (
+            PoolTimeoutError,
+            psycopg2.OperationalError,
+            psycopg2.InterfaceError,
+        ),
+    )
+
+
+@timed_query
+def find_url_by_id(id):
+    """Return ``(id, name)`` of a url, or ``None`` if there is none."""
     with get_conn() as conn, conn.cursor() as cur:
-        cur.execute("SELECT id FROM urls WHERE name=%s", (name,))
+        cur.execute("SELECT id, name FROM urls WHERE id=%s", (id,))
         return cur.fetchone()
 
 
-def insert_url(name):
+@timed_query
+def upsert_url(name):
+    """Return ``(id, created)`` for the url ``name``, inserting it if new.
+
+    A single statement, so concurrent submissions of the same url can
+    not race into a unique violation.  The no-op update makes the
+    conflicting row visible to RETURNING; ``xmax = 0`` tells a fresh
+    insert from an existing row.
+    """
     with get_conn() as conn, conn.cursor() as cur:
         cur.execute(
             """INSERT INTO urls (name, created_at)
-            VALUES (%s, %s) RETURNING id""",
+            VALUES (%s, %s)
+            ON CONFLICT (name) DO UPDATE SET name = EXCLUDED.name
+            RETURNING id, xmax = 0""",
             (name, datetime.now()),
         )
-        new_id = cur.fetchone()[0]
+        url_id, created = cur.fetchone()
         conn.commit()
-        return new_id
+        if created:
+            invalidate_url_pages()
+        return url_id, created
 
 
-def fetch_urls_with_last_check():
+@timed_query
+def insert_urls(names):
+    """Insert the urls in ``names`` that are not stored yet.
+
+    One statement for the whole batch; returns the number of urls
+    actually inserted.
+    """
+    if not names:
+        return 0
+    created_at = datetime.now()
     with get_conn() as conn, conn.cursor() as cur:
-        cur.execute(
+        rows = execute_values(
+            cur,
             """
-            SELECT
-                u.id,
-                u.name,
-                (
-                    SELECT created_at FROM url_checks
-                    WHERE url_id = u.id
-                    ORDER BY created_at DESC
-                    LIMIT 1
-                ) AS last_check,
-                (
-                    SELECT status_code FROM url_checks
-                    WHERE url_id = u.id
-                    ORDER BY created_at DESC
-                    LIMIT 1
-                ) AS last_status
-            FROM urls u
-            ORDER BY u.id DESC
+            INSERT INTO urls (name, created_at) VALUES %s
+            ON CONFLICT (name) DO NOTHING
+            RETURNING id
             """,
+            [(name, created_at) for name in names],
+            page_size=len(names),
+            fetch=True,
         )
-        return cur.fetchall()
+        conn.commit()
+        if rows:
+            invalidate_url_pages()
+        return len(rows)
+
 
+MERGE_URL_QUERY = """
+    UPDATE urls u SET
+        created_at = LEAST(u.created_at, d.created_at),
+        last_checked_at = GREATEST(u.last_checked_at, d.last_checked_at),
+        last_status_code = CASE
+            WHEN u.last_checked_at IS NULL
+                OR d.last_checked_at > u.last_checked_at
+            THEN d.last_status_code
+            ELSE u.last_status_code
+        END,
+        check_interval = COALESCE(u.check_interval, d.check_interval),
+        next_check_at = LEAST(u.next_check_at, d.next_check_at)
+    FROM urls d
+    WHERE u.id = %(into_id)s AND d.id = %(url_id)s;
+    UPDATE url_checks SET url_id = %(into_id)s WHERE url_id = %(url_id)s;
+    UPDATE check_jobs SET url_id = %(into_id)s
+    WHERE url_id = %(url_id)s AND status NOT IN ('queued', 'running');
+    DELETE FROM urls WHERE id = %(url_id)s;
+"""
 
-def fetch_url(id):
+
+@timed_query
+def canonicalize_url(url_id, name, *, apply=True):
+    """Give url ``url_id`` the canonical ``name``; return the url's new id.
+
+    When no other url has ``name`` the url is renamed and keeps its id.
+    Otherwise it is a duplicate: its checks and finished jobs move to
+    the url holding ``name``, whose id is returned, and it is deleted
+    (its queued job with it).  With ``apply`` false nothing is changed.
+    """
+    with get_conn() as conn, conn.cursor() as cur:
+        cur.execute("SELECT id FROM urls WHERE name = %s FOR UPDATE", (name,))
+        row = cur.fetchone()
+        if row is None:
+            into_id = url_id
+            cur.execute(
+                "UPDATE urls SET name = %s WHERE id = %s", (name, url_id)
+            )
+        else:
+            into_id = row[0]
+            cur.execute(MERGE_URL_QUERY, {"url_id": url_id, "into_id": into_id})
+        if not apply:
+            conn.rollback()
+            return into_id
+        conn.commit()
+        invalidate_url_pages(url_id, into_id)
+        return into_id
+
+
+URLS_PAGE_QUERY = """
+    SELECT id, name, last_checked_at, last_status_code
+    FROM urls
+    {where}
+    ORDER BY id {order}
+    LIMIT %s
+"""
+
+
+@timed_query
+def fetch_urls_with_last_check(limit=50, before=None, after=None):
+    """Return one page of urls with their latest check, newest first.
+
+    ``before`` and ``after`` are keyset cursors on ``urls.id``: the page
+    holds up to ``limit`` rows with ids below ``before`` or, when paging
+    back, the ``limit`` rows with ids right above ``after``.
+    """
+    if after is not None:
+        where, order, params = "WHERE id > %s", "ASC", (after, limit)
+    elif before is not None:
+        where, order, params = "WHERE id < %s", "DESC", (before, limit)
+    else:
+        where, order, params = "", "DESC", (limit,)
+    with get_conn() as conn, conn.cursor() as cur:
+        cur.execute(URLS_PAGE_QUERY.format(where=where, order=order), params)
+        rows = cur.fetchall()
+    if after is not None:
+        rows.reverse()
+    return rows
+
+
+CHECK_TEXT_LENGTH = 200
+
+CHECKS_PAGE_QUERY = """
+    SELECT id, status_code,
+        SUBSTR(h1, 1, %s), SUBSTR(title, 1, %s), SUBSTR(description, 1, %s),
+        created_at
+    FROM url_checks
+    WHERE url_id = %s {where}
+    ORDER BY created_at {order}, id {order}
+    LIMIT %s
+"""
+
+
+@timed_query
+def fetch_url(id, limit=50, before=None, after=None):
+    """Return a url and one page of its checks, newest first.
+
+    ``before`` and ``after`` are ``(created_at, id)`` keyset cursors that
+    work like the ones of ``fetch_urls_with_last_check``.  h1, title and
+    description are cut to ``CHECK_TEXT_LENGTH`` characters by the query.
+    """
     with get_conn() as conn, conn.cursor() as cur:
         cur.execute("SELECT id, name, created_at FROM urls WHERE id=%s", (id,))
         url_item = cur.fetchone()
         if not url_item:
             return None, []
+        # The bare created_at bound lets the planner use the
+        # (url_id, created_at) index for the row comparison.
+        if after is not None:
+            where = "AND created_at >= %s AND (created_at, id) > (%s, %s)"
+            order, cursor = "ASC", (after[0], *after)
+        elif before is not None:
+            where = "AND created_at <= %s AND (created_at, id) < (%s, %s)"
+            order, cursor = "DESC", (before[0], *before)
+        else:
+            where, order, cursor = "", "DESC", ()
         cur.execute(
-            """
-            SELECT id, status_code, h1, title, description, created_at
-            FROM url_checks
-            WHERE url_id=%s
-            ORDER BY created_at DESC
-            """,
-            (id,),
+            CHECKS_PAGE_QUERY.format(where=where, order=order),
+            (*[CHECK_TEXT_LENGTH] * 3, id, *cursor, limit),
         )
         checks = cur.fetchall()
+        if after is not None:
+            checks.reverse()
         return url_item, checks
 
 
-def insert_url_check(url_id, status_code, h1, title, description):
+LAST_CHECK_COLUMNS = """
+    status_code, h1, title, description, etag, last_modified, content_hash
+"""
+# The latest check ``c`` of each url ``u``.  It is looked up at the time
+# stored in urls.last_checked_at, so only the partition holding it is
+# read; urls without a summary are searched in full.
+LAST_CHECK_JOIN = f"""
+    JOIN LATERAL (
+        SELECT {LAST_CHECK_COLUMNS}
+        FROM url_checks
+        WHERE url_id = u.id
+            AND created_at >= COALESCE(u.last_checked_at, '-infinity')
+            AND created_at <= COALESCE(u.last_checked_at, 'infinity')
+        ORDER BY created_at DESC, id DESC
+        LIMIT 1
+    ) c ON true
+"""
+
+
+@timed_query
+def fetch_last_check(url_id):
+    """Return the latest check of a url, or ``None`` if it has none.
+
+    The row is ``(status_code, h1, title, description, etag,
+    last_modified, content_hash)``.
+    """
+    with get_conn() as conn, conn.cursor() as cur:
+        cur.execute(
+            f"SELECT c.* FROM urls u {LAST_CHECK_JOIN} WHERE u.id = %s",
+            (url_id,),
+        )
+        return cur.fetchone()
+
+
+@timed_query
+def insert_url_check(
+    url_id,
+    status_code,
+    h1,
+    title,
+    description,
+    *,
+    etag=None,
+    last_modified=None,
+    content_hash=None,
+):
+    created_at = datetime.now()
     with get_conn() as conn, conn.cursor() as cur:
         cur.execute(
             """
             INSERT INTO url_checks (
-                url_id, status_code, h1, title, description, created_at
+                url_id, status_code, h1, title, description, created_at,
+                etag, last_modified, content_hash
             )
-            VALUES (%s, %s, %s, %s, %s, %s)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+            RETURNING id
+            """,
+            (
+                url_id,
+                status_code,
+                h1,
+                title,
+                description,
+                created_at,
+                etag,
+                last_modified,
+                content_hash,
+            ),
+        )
+        check_id = cur.fetchone()[0]
+        cur.execute(
+            """
+            UPDATE urls
+            SET last_checked_at = %s, last_status_code = %s
+            WHERE id = %s
+                AND (last_checked_at IS NULL OR last_checked_at <= %s)
             """,
-            (url_id, status_code, h1, title, description, datetime.now()),
+            (created_at, status_code, url_id, created_at),
         )
         conn.commit()
+        invalidate_url_pages(url_id)
+        return check_id
+
+
+@timed_query
+def insert_url_checks(rows):
+    """Store many checks in one transaction.
+
+    ``rows`` are ``(url_id, status_code, h1, title, description,
+    created_at, etag, last_modified, content_hash)`` tuples.  The latest
+    check summary on urls is updated once per url with the newest row of
+    the batch.
+    """
+    if not rows:
+        return 0
+    latest = {}
+    for url_id, status_code, _, _, _, created_at, *_ in rows:
+        if url_id not in latest or latest[url_id][0] <= created_at:
+            latest[url_id] = (created_at, status_code)
+    with get_conn() as conn, conn.cursor() as cur:
+        execute_values(
+            cur,
+            """
+            INSERT INTO url_checks (
+                url_id, status_code, h1, title, description, created_at,
+                etag, last_modified, content_hash
+            )
+            VALUES %s
+            """,
+            rows,
+            page_size=len(rows),
+        )
+        execute_values(
+            cur,
+            """
+            UPDATE urls u
+            SET last_checked_at = v.created_at,
+                last_status_code = v.status_code
+            FROM (VALUES %s) AS v (url_id, created_at, status_code)
+            WHERE u.id = v.url_id
+                AND (
+                    u.last_checked_at IS NULL
+                    OR u.last_checked_at <= v.created_at
+                )
+            """,
+            [(url_id, *summary) for url_id, summary in latest.items()],
+            template="(%s, %s::timestamp, %s::int)",
+            page_size=len(latest),
+        )
+        conn.commit()
+        invalidate_url_pages(*latest)
+    return len(rows)
+
+
+URLS_WITH_LAST_CHECK_QUERY = f"""
+    SELECT u.id, u.name, c.*
+    FROM urls u
+    LEFT {LAST_CHECK_JOIN}
+    WHERE u.id > %s
+    ORDER BY u.id
+    LIMIT %s
+"""
+
+
+def iter_urls(batch_size=1000, *, with_last_check=False):
+    """Yield ``(id, name)`` for every url, reading ``batch_size`` at a time.
+
+    With ``with_last_check`` the rows are ``(id, name, last_check)`` where
+    ``last_check`` is what ``fetch_last_check`` returns for the url.
+
+    Each batch is a separate short query keyed on the last seen id, so
+    no transaction stays open while the caller works through the rows.
+    """
+    if with_last_check:
+        query = URLS_WITH_LAST_CHECK_QUERY
+    else:
+        query = "SELECT id, name FROM urls WHERE id > %s ORDER BY id LIMIT %s"
+    last_id = 0
+    while True:
+        with _timed("iter_urls"), get_conn() as conn, conn.cursor() as cur:
+            cur.execute(query, (last_id, batch_size))
+            rows = cur.fetchall()
+        if not rows:
+            return
+        for url_id, name, *last_check in rows:
+            if not with_last_check:
+                yield url_id, name
+            elif last_check[0] is None:
+                yield url_id, name, None
+            else:
+                yield url_id, name, tuple(last_check)
+        last_id = rows[-1][0]
+
+
+@timed_query
+def max_url_id():
+    with get_conn() as conn, conn.cursor() as cur:
+        cur.execute("SELECT COALESCE(MAX(id), 0) FROM urls")
+        return cur.fetchone()[0]
+
+
+BACKFILL_LAST_CHECKS_QUERY = """
+    UPDATE urls u
+    SET last_checked_at = c.created_at, last_status_code = c.status_code
+    FROM (
+        SELECT DISTINCT ON (url_id) url_id, created_at, status_code
+        FROM url_checks
+        WHERE url_id > %s AND url_id <= %s
+        ORDER BY url_id, created_at DESC, id DESC
+    ) c
+    WHERE u.id = c.url_id
+        AND (u.last_checked_at IS NULL OR u.last_checked_at < c.created_at)
+"""
+
+
+@timed_query
+def backfill_last_checks(batch_size=1000, on_batch=None):
+    """Fill urls.last_checked_at/last_status_code from url_checks.
+
+    Works through urls in id ranges of ``batch_size``, one short
+    transaction per range, and never moves a summary back in time, so it
+    is safe to run while checks are being written.
+    """
+    max_id = max_url_id()
+    updated = 0
+    for start in range(0, max_id, batch_size):
+        with get_conn() as conn, conn.cursor() as cur:
+            cur.execute(BACKFILL_LAST_CHECKS_QUERY, (start, start + batch_size))
+            updated += cur.rowcount
+        if on_batch:
+            on_batch(start + batch_size, max_id, updated)
+    if updated:
+        invalidate_pages()
+    return updated
+
+
+PRUNABLE_CHECKS_QUERY = """
+    SELECT id, created_at FROM (
+        SELECT id, url_id, created_at,
+            row_number() OVER (
+                PARTITION BY url_id, unit, date_trunc(unit, created_at)
+                ORDER BY created_at DESC, id DESC
+            ) AS bucket_rank
+        FROM (
+            SELECT id, url_id, created_at,
+                CASE WHEN created_at < %(hourly_before)s
+                    THEN 'day' ELSE 'hour'
+                END AS unit
+            FROM url_checks
+            WHERE url_id >= %(start)s AND url_id < %(end)s
+                AND created_at < %(raw_before)s
+        ) c
+    ) ranked
+    WHERE bucket_rank > 1
+        OR (
+            created_at < %(drop_before)s
+            AND EXISTS (
+                SELECT 1 FROM url_checks newer
+                WHERE newer.url_id = ranked.url_id
+                    AND newer.created_at > ranked.created_at
+            )
+        )
+    ORDER BY created_at, id
+"""
+
+
+@timed_query
+def find_prunable_checks(
+    start, end, *, raw_before, hourly_before, drop_before=None
+):
+    """Return ``(id, created_at)`` of checks to delete, oldest first.
+
+    Only checks of urls ``start <= id < end`` are looked at.  Checks
+    newer than ``raw_before`` are all kept.  Older ones are kept only if
+    they are the newest of their url in their hour, or in their day once
+    older than ``hourly_before``.  Checks older than ``drop_before`` go
+    as well, except the latest check of each url.
+    """
+    with get_conn() as conn, conn.cursor() as cur:
+        cur.execute(
+            PRUNABLE_CHECKS_QUERY,
+            {
+                "start": start,
+                "end": end,
+                "raw_before": raw_before,
+                "hourly_before": hourly_before,
+                "drop_before": drop_before,
+            },
+        )
+        return [tuple(row) for row in cur.fetchall()]
+
+
+@timed_query
+def delete_checks(checks):
+    """Delete ``(id, created_at)`` checks; return the count and bytes freed.
+
+    The created_at range of the batch is spelled out as well, so only the
+    partitions it spans are scanned.
+    """
+    checks = list(checks)
+    if not checks:
+        return 0, 0
+    ids, dates = zip(*checks, strict=True)
+    with get_conn() as conn, conn.cursor() as cur:
+        cur.execute(
+            """
+            WITH deleted AS (
+                DELETE FROM url_checks
+                USING unnest(%(ids)s::int[], %(dates)s::timestamp[])
+                    AS doomed (id, created_at)
+                WHERE url_checks.id = doomed.id
+                    AND url_checks.created_at = doomed.created_at
+                    AND url_checks.created_at
+                        BETWEEN %(oldest)s AND %(newest)s
+                RETURNING pg_column_size(url_checks.*) AS size
+            )
+            SELECT count(*), COALESCE(sum(size), 0) FROM deleted
+            """,
+            {
+                "ids": list(ids),
+                "dates": list(dates),
+                "oldest": min(dates),
+                "newest": max(dates),
+            },
+        )
+        deleted, size = cur.fetchone()
+        conn.commit()
+        if deleted:
+            invalidate_pages()
+        return deleted, size
+
+
+@timed_query
+def url_checks_size():
+    """Bytes used by url_checks with its indexes and TOAST data.
+
+    A partitioned table has no storage of its own, so the sizes of its
+    partitions are summed; a plain table is its own only member.
+    """
+    with get_conn() as conn, conn.cursor() as cur:
+        cur.execute(
+            """
+            SELECT COALESCE(sum(pg_total_relation_size(relid)), 0)
+            FROM pg_partition_tree('url_checks')
+            """
+        )
+        return cur.fetchone()[0]
+
+
+@timed_query
+def run_outside_transaction(statement):
+    """Execute a statement that cannot run inside a transaction block.
+
+    ``with conn`` opens a transaction even in autocommit mode, so
+    get_conn() is not used here.
+    """
+    conn = pool.getconn()
+    try:
+        conn.autocommit = True
+        with conn.cursor() as cur:
+            cur.execute(statement)
+    finally:
+        conn.autocommit = False
+        pool.putconn(conn)
+
+
+def vacuum_url_checks():
+    run_outside_transaction("VACUUM (ANALYZE) url_checks")
+
+
+@timed_query
+def find_last_check_mismatches(limit=100):
+    """Return urls whose stored summary differs from their latest check.
+
+    Rows are ``(id, last_checked_at, last_status_code, actual_created_at,
+    actual_status_code)``.
+    """
+    with get_conn() as conn, conn.cursor() as cur:
+        cur.execute(
+            """
+            SELECT
+                u.id,
+                u.last_checked_at,
+                u.last_status_code,
+                c.created_at,
+                c.status_code
+            FROM urls u
+            LEFT JOIN LATERAL (
+                SELECT created_at, status_code
+                FROM url_checks
+                WHERE url_id = u.id
+                ORDER BY created_at DESC, id DESC
+                LIMIT 1
+            ) c ON TRUE
+            WHERE u.last_checked_at IS DISTINCT FROM c.created_at
+                OR u.last_status_code IS DISTINCT FROM c.status_code
+            ORDER BY u.id
+            LIMIT %s
+            """,
+            (limit,),
+        )
+        return cur.fetchall()
+
+
+@timed_query
+def enqueue_check(url_id):
+    """Queue a check of ``url_id`` and return the job id.
+
+    Returns ``None`` when the url already has a queued or running job.
+    """
+    with get_conn() as conn, conn.cursor() as cur:
+        cur.execute(
+            """
+            INSERT INTO check_jobs (url_id, created_at)
+            VALUES (%s, %s)
+            ON CONFLICT (url_id) WHERE status IN ('queued', 'running')
+            DO NOTHING
+            RETURNING id
+            """,
+            (url_id, datetime.now()),
+        )
+        row = cur.fetchone()
+        conn.commit()
+        if row:
+            invalidate_url_pages(url_id)
+        return row[0] if row else None
+
+
+@timed_query
+def claim_check_job():
+    """Mark the oldest queued job as running and return it.
+
+    Returns ``(job_id, url_id, url_name)`` or ``None`` when the queue is
+    empty.  Rows locked by other workers are skipped, so any number of
+    workers can poll the same table.
+    """
+    with get_conn() as conn, conn.cursor() as cur:
+        cur.execute(
+            """
+            UPDATE check_jobs j
+            SET status = 'running', started_at = %s, attempts = attempts + 1
+            FROM urls u
+            WHERE j.id = (
+                SELECT id FROM check_jobs
+                WHERE status = 'queued'
+                ORDER BY id
+                FOR UPDATE SKIP LOCKED
+                LIMIT 1
+            )
+                AND u.id = j.url_id
+            RETURNING j.id, j.url_id, u.name
+            """,
+            (datetime.now(),),
+        )
+        job = cur.fetchone()
+        conn.commit()
+        if job:
+            invalidate_url_pages(job[1])
+        return job
+
+
+@timed_query
+def finish_check_job(job_id, url_check_id=None, error=None):
+    with get_conn() as conn, conn.cursor() as cur:
+        cur.execute(
+            """
+            UPDATE check_jobs
+            SET status = %s, url_check_id = %s, error = %s, finished_at = %s
+            WHERE id = %s
+            RETURNING url_id
+            """,
+            (
+                "failed" if error else "done",
+                url_check_id,
+                error,
+                datetime.now(),
+                job_id,
+            ),
+        )
+        row = cur.fetchone()
+        conn.commit()
+        if row:
+            invalidate_url_pages(row[0])
+
+
+@timed_query
+def requeue_stale_check_jobs(started_before, max_attempts):
+    """Return jobs abandoned by a dead worker to the queue.
+
+    Jobs that already used ``max_attempts`` are marked failed instead.
+    """
+    with get_conn() as conn, conn.cursor() as cur:
+        cur.execute(
+            """
+            UPDATE check_jobs
+            SET
+                status = CASE
+                    WHEN attempts >= %s THEN 'failed' ELSE 'queued'
+                END,
+                error = 'worker did not finish the job',
+                finished_at = CASE WHEN attempts >= %s THEN %s END
+            WHERE status = 'running' AND started_at < %s
+            RETURNING url_id
+            """,
+            (max_attempts, max_attempts, datetime.now(), started_before),
+        )
+        url_ids = [url_id for (url_id,) in cur.fetchall()]
+        conn.commit()
+        if url_ids:
+            invalidate_url_pages(*url_ids)
+        return len(url_ids)
+
+
+@timed_query
+def record_worker_heartbeat(name, forget_before):
+    """Mark worker ``name`` as alive now.
+
+    Rows of workers not seen since ``forget_before`` (they died without
+    removing theirs) are deleted on the way.
+    """
+    with get_conn() as conn, conn.cursor() as cur:
+        cur.execute(
+            """
+            INSERT INTO worker_heartbeats (name, seen_at) VALUES (%s, %s)
+            ON CONFLICT (name) DO UPDATE SET seen_at = EXCLUDED.seen_at
+            """,
+            (name, datetime.now()),
+        )
+        cur.execute(
+            "DELETE FROM worker_heartbeats WHERE seen_at < %s",
+            (forget_before,),
+        )
+        conn.commit()
+
+
+@timed_query
+def remove_worker_heartbeat(name):
+    with get_conn() as conn, conn.cursor() as cur:
+        cur.execute("DELETE FROM worker_heartbeats WHERE name = %s", (name,))
+        conn.commit()
+
+
+@timed_query
+def has_live_worker(seen_after):
+    """Whether some worker sent a heartbeat after ``seen_after``."""
+    with get_conn() as conn, conn.cursor() as cur:
+        cur.execute(
+            """
+            SELECT EXISTS (
+                SELECT 1 FROM worker_heartbeats WHERE seen_at > %s
+            )
+            """,
+            (seen_after,),
+        )
+        return cur.fetchone()[0]
+
+
+@timed_query
+def fetch_check_jobs(url_id, limit=10):
+    with get_conn() as conn, conn.cursor() as cur:
+        cur.execute(
+            """
+            SELECT id, status, created_at, started_at, finished_at, error
+            FROM check_jobs
+            WHERE url_id = %s
+            ORDER BY id DESC
+            LIMIT %s
+            """,
+            (url_id, limit),
+        )
+        return cur.fetchall()
+
+
+@timed_query
+def schedule_urls(interval, url_ids=None, now=None):
+    """Re-check urls every ``interval``, or stop when it is ``None``.
+
+    Applies to ``url_ids`` or to every url.  The first check of each url
+    falls at a random point within one interval, so urls scheduled
+    together do not all come due at once.  Returns the number of urls.
+    """
+    now = now or datetime.now()
+    where = "WHERE id = ANY(%s)" if url_ids is not None else ""
+    params = () if url_ids is None else (list(url_ids),)
+    with get_conn() as conn, conn.cursor() as cur:
+        cur.execute(
+            f"""
+            UPDATE urls
+            SET
+                check_interval = %s,
+                next_check_at = %s + %s::interval * random()
+            {where}
+            """,
+            (interval, now, interval, *params),
+        )
+        conn.commit()
+        return cur.rowcount
+
+
+@timed_query
+def claim_due_urls(limit, lease, now=None):
+    """Take up to ``limit`` urls whose next check is due.
+
+    Returns ``(url_id, url_name, check_interval)`` rows.  Their
+    next_check_at is pushed ``lease`` ahead, so a scheduler that dies
+    mid-batch only delays the checks; rows locked by other schedulers
+    are skipped.
+    """
+    now = now or datetime.now()
+    with get_conn() as conn, conn.cursor() as cur:
+        cur.execute(
+            """
+            UPDATE urls u
+            SET next_check_at = %s
+            WHERE u.id IN (
+                SELECT id FROM urls
+                WHERE next_check_at <= %s
+                ORDER BY next_check_at
+                FOR UPDATE SKIP LOCKED
+                LIMIT %s
+            )
+            RETURNING u.id, u.name, u.check_interval
+            """,
+            (now + lease, now, limit),
+        )
+        rows = cur.fetchall()
+        conn.commit()
+        return rows
+
+
+@timed_query
+def reschedule_urls(rows):
+    """Set next_check_at from ``(url_id, next_check_at)`` pairs.
+
+    Urls unscheduled in the meantime are left alone.
+    """
+    if not rows:
+        return
+    with get_conn() as conn, conn.cursor() as cur:
+        execute_values(
+            cur,
+            """
+            UPDATE urls SET next_check_at = v.next_check_at
+            FROM (VALUES %s) AS v (id, next_check_at)
+            WHERE urls.id = v.id AND urls.check_interval IS NOT NULL
+            """,
+            rows,
+            template="(%s, %s::timestamp)",
+        )
+        conn.commit()
+
+
+URL_COLUMNS = (
+    "id",
+    "name",
+    "created_at",
+    "last_checked_at",
+    "last_status_code",
+    "check_interval",
+    "next_check_at",
+)
+CHECK_COLUMNS = (
+    "id",
+    "url_id",
+    "status_code",
+    "h1",
+    "title",
+    "description",
+    "created_at",
+    "etag",
+    "last_modified",
+    "content_hash",
+)
+
+
+def urls_query(columns, limit=None, before=None, url_id=None):
+    """Build a query for ``columns`` of urls, newest first.
+
+    ``columns`` must come from ``URL_COLUMNS``; ``before`` is a keyset
+    cursor on ``urls.id`` and ``url_id`` selects a single url.  Returns
+    ``(query, params)`` for ``fetch_rows`` or ``stream_rows``.
+    """
+    conditions, params = [], []
+    if url_id is not None:
+        conditions.append("id = %s")
+        params.append(url_id)
+    if before is not None:
+        conditions.append("id < %s")
+        params.append(before)
+    return _select(
+        "urls", columns, conditions, "id DESC", params=params, limit=limit
+    )
+
+
+def checks_query(url_id, columns, limit=None, before=None):
+    """Build a query for ``columns`` of the checks of a url, newest first.
+
+    ``columns`` must come from ``CHECK_COLUMNS``; ``before`` is a
+    ``(created_at, id)`` keyset cursor like in ``fetch_url``.
+    """
+    conditions, params = ["url_id = %s"], [url_id]
+    if before is not None:
+        conditions.append("created_at <= %s AND (created_at, id) < (%s, %s)")
+        params.extend((before[0], *before))
+    return _select(
+        "url_checks",
+        columns,
+        conditions,
+        "created_at DESC, id DESC",
+        params=params,
+        limit=limit,
+    )
+
+
+def export_checks_query(columns, after_id=0, up_to_id=None):
+    """Build a query for the checks with ids above ``after_id``, by id.
+
+    With ``up_to_id`` only ids up to it are read.
+    """
+    conditions, params = ["id > %s"], [after_id]
+    if up_to_id is not None:
+        conditions.append("id <= %s")
+        params.append(up_to_id)
+    return _select(
+        "url_checks", columns, conditions, "id", params=params, limit=None
+    )
+
+
+CHECK_WRITERS_QUERY = """
+    SELECT DISTINCT virtualtransaction FROM pg_locks
+    WHERE relation = 'url_checks'::regclass
+        AND mode = 'RowExclusiveLock'
+        AND pid <> pg_backend_pid()
+"""
+
+
+@timed_query
+def settled_check_id(timeout=30.0, poll_interval=0.1):
+    """Return an id up to which every check is committed or rolled back.
+
+    An id is taken from the sequence when the row is inserted, not when
+    it commits, so a check can become visible after higher ids already
+    are.  The sequence is read first; a transaction holding a lower id
+    took its lock on url_checks before that and keeps it until it ends,
+    so the transactions holding such a lock are waited for.  Writers are
+    not blocked.  Raises ``TimeoutError`` if they are still running after
+    ``timeout`` seconds.
+    """
+    with get_conn() as conn, conn.cursor() as cur:
+        cur.execute(
+            """
+            SELECT COALESCE(pg_sequence_last_value(
+                pg_get_serial_sequence('url_checks', 'id')::regclass
+            ), 0)
+            """
+        )
+        settled = cur.fetchone()[0]
+        cur.execute(CHECK_WRITERS_QUERY)
+        writers = [row[0] for row in cur.fetchall()]
+        deadline = time.monotonic() + timeout
+        while writers:
+            if time.monotonic() >= deadline:
+                raise TimeoutError(
+                    f"{len(writers)} transaction(s) writing url_checks "
+                    f"still open after {timeout:g}s"
+                )
+            time.sleep(poll_interval)
+            cur.execute(
+                CHECK_WRITERS_QUERY + " AND virtualtransaction = ANY(%s)",
+                (writers,),
+            )
+            writers = [row[0] for row in cur.fetchall()]
+        return settled
+
+
+def _select(table, columns, conditions, order, *, params, limit):
+    query = f"SELECT {', '.join(columns)} FROM {table}"
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    query += f" ORDER BY {order}"
+    if limit is not None:
+        query += " LIMIT %s"
+        params = [*params, limit]
+    return query, tuple(params)
+
+
+@timed_query
+def fetch_rows(query, params=()):
+    with get_conn() as conn, conn.cursor() as cur:
+        cur.execute(query, params)
+        return cur.fetchall()
+
+
+def stream_rows(query, params=(), itersize=1000):
+    """Yield the rows of ``query`` from a server-side cursor.
+
+    Only ``itersize`` rows are held in memory at a time.  The pooled
+    connection and its transaction stay open until the generator is
+    exhausted or closed.
+    """
+    with get_conn() as conn, conn.cursor(name=f"stream_{id(conn)}") as cur:
+        cur.itersize = itersize
+        cur.execute(query, params)
+        yield from cur
@@ -0,0 +1,202 @@
+"""Export of the check history to CSV or Parquet files.
+
+Checks are read in id order from a server-side cursor, ``itersize`` rows
+per round trip, and written as they arrive, so an export of any size
+runs in constant memory.  Parquet files (``pyarrow``, extra
+``parquet``) are written in row groups of ``row_group_size`` rows.
+
+Every run writes one file, ``url_checks_<first id>_<last id>.<ext>``,
+into the target directory and records the last exported id in
+``export_state.json`` there; the next run only reads checks with a
+higher id.  Ids are taken when a check is inserted, not when it commits,
+so a run only reads up to ``database.settled_check_id``: the last id
+below which no insert is still open.  It waits up to ``wait`` seconds
+for the open ones, so a check committed late is never skipped.
+"""
+
+import csv
+import json
+import os
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from pathlib import Path
+
+from . import database
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - pyarrow is an optional extra
+    pa = pq = None
+
+PARQUET_AVAILABLE = pa is not None
+
+EXPORT_COLUMNS = database.CHECK_COLUMNS
+STATE_FILE = "export_state.json"
+DEFAULT_WAIT = 30.0
+INTEGER_COLUMNS = ("id", "url_id", "status_code")
+
+
+@dataclass
+class ExportState:
+    last_id: int = 0
+    exported_at: str | None = None
+
+    @classmethod
+    def load(cls, path):
+        try:
+            with open(path, encoding="utf-8") as state_file:
+                return cls(**json.load(state_file))
+        except FileNotFoundError:
+            return cls()
+
+    def save(self, path):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as state_file:
+            json.dump(asdict(self), state_file)
+        os.replace(tmp_path, path)
+
+
+@dataclass
+class ExportStats:
+    rows: int = 0
+    first_id: int | None = None
+    last_id: int | None = None
+    path: Path | None = None
+
+    def summary(self):
+        if not self.rows:
+            return "no new checks to export"
+        return (
+            f"{self.rows} check(s) exported to {self.path} "
+            f"(ids {self.first_id}-{self.last_id})"
+        )
+
+
+class CsvExport:
+    extension = "csv"
+
+    def __init__(self, path, columns):
+        self._file = open(path, "w", encoding="utf-8", newline="")
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(columns)
+
+    def write(self, rows):
+        self._writer.writerows(
+            [
+                value.isoformat() if isinstance(value, datetime) else value
+                for value in row
+            ]
+            for row in rows
+        )
+
+    def close(self):
+        self._file.close()
+
+
+class ParquetExport:
+    extension = "parquet"
+
+    def __init__(self, path, columns, compression="zstd"):
+        if not PARQUET_AVAILABLE:
+            raise RuntimeError(
+                "Parquet export needs pyarrow: install the parquet extra"
+            )
+        self._schema = pa.schema(
+            [(column, _parquet_type(column)) for column in columns]
+        )
+        self._writer = pq.ParquetWriter(
+            path, self._schema, compression=compression
+        )
+
+    def write(self, rows):
+        columns = list(zip(*rows, strict=True))
+        self._writer.write_table(
+            pa.Table.from_arrays(
+                [
+                    pa.array(values, type=field.type)
+                    for values, field in zip(columns, self._schema, strict=True)
+                ],
+                schema=self._schema,
+            )
+        )
+
+    def close(self):
+        self._writer.close()
+
+
+def _parquet_type(column):
+    if column in INTEGER_COLUMNS:
+        return pa.int32()
+    if column == "created_at":
+        return pa.timestamp("us")
+    return pa.string()
+
+
+EXPORT_FORMATS = {"csv": CsvExport, "parquet": ParquetExport}
+
+
+def export_checks(
+    directory,
+    export_format="csv",
+    *,
+    itersize=10_000,
+    row_group_size=100_000,
+    wait=DEFAULT_WAIT,
+    full=False,
+    on_chunk=None,
+):
+    """Export checks newer than the last run into ``directory``.
+
+    With ``full`` the state is ignored and every check is exported.
+    ``on_chunk`` is called with the ``ExportStats`` after each row group.
+    Returns the ``ExportStats`` of the run; raises ``TimeoutError`` when
+    inserts of checks stay open longer than ``wait`` seconds.
+    """
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    state_path = directory / STATE_FILE
+    state = ExportState() if full else ExportState.load(state_path)
+    query, params = database.export_checks_query(
+        EXPORT_COLUMNS,
+        after_id=state.last_id,
+        up_to_id=database.settled_check_id(timeout=wait),
+    )
+    exporter_class = EXPORT_FORMATS[export_format]
+    partial_path = directory / f"url_checks.{exporter_class.extension}.partial"
+    stats = ExportStats()
+    exporter = exporter_class(partial_path, EXPORT_COLUMNS)
+    try:
+        chunk = []
+        for row in database.stream_rows(query, params, itersize):
+            chunk.append(row)
+            if len(chunk) >= row_group_size:
+                _write_chunk(exporter, chunk, stats, on_chunk)
+        if chunk:
+            _write_chunk(exporter, chunk, stats, on_chunk)
+    except BaseException:
+        exporter.close()
+        partial_path.unlink(missing_ok=True)
+        raise
+    exporter.close()
+    if not stats.rows:
+        partial_path.unlink()
+        return stats
+    stats.path = directory / (
+        f"url_checks_{stats.first_id}_{stats.last_id}."
+        f"{exporter_class.extension}"
+    )
+    os.replace(partial_path, stats.path)
+    ExportState(stats.last_id, datetime.now().isoformat()).save(state_path)
+    return stats
+
+
+def _write_chunk(exporter, chunk, stats, on_chunk):
+    exporter.write(chunk)
+    if stats.first_id is None:
+        stats.first_id = chunk[0][0]
+    stats.last_id = chunk[-1][0]
+    stats.rows += len(chunk)
+    chunk.clear()
+    if on_chunk:
+        on_chunk(stats)
@@ -0,0 +1,185 @@
+import os
+import threading
+import time
+from dataclasses import dataclass
+
+import requests
+from urllib3.util.retry import Retry
+
+from .metrics import FETCH_PHASE_SECONDS
+from .ratelimit import RATE_LIMIT_STATUSES, HostRateLimiter
+from .resolver import CachingHTTPAdapter, DnsCache
+from .url_utils import host_key
+
+DEFAULT_USER_AGENT = "page-analyzer/0.1 (+https://github.com/WhiteA77/python-project-83)"
+RETRY_STATUSES = (500, 502, 503, 504)
+
+
+@dataclass(frozen=True)
+class FetcherConfig:
+    connect_timeout: float = 3.05
+    read_timeout: float = 10.0
+    retries: int = 2
+    backoff_factor: float = 0.5
+    max_hosts: int = 100
+    per_host: int = 4
+    user_agent: str = DEFAULT_USER_AGENT
+    streaming: bool = False
+    max_bytes: int = 1024 * 1024
+    host_rate: float = 1.0
+    host_burst: int = 2
+    max_retry_after: float = 60.0
+    dns_ttl: float = 300.0
+    dns_negative_ttl: float = 30.0
+    dns_cache_size: int = 1024
+
+    @classmethod
+    def from_env(cls):
+        defaults = cls()
+        return cls(
+            connect_timeout=float(
+                os.getenv("FETCH_CONNECT_TIMEOUT", defaults.connect_timeout)
+            ),
+            read_timeout=float(
+                os.getenv("FETCH_READ_TIMEOUT", defaults.read_timeout)
+            ),
+            retries=int(os.getenv("FETCH_RETRIES", defaults.retries)),
+            backoff_factor=float(
+                os.getenv("FETCH_BACKOFF_FACTOR", defaults.backoff_factor)
+            ),
+            max_hosts=int(os.getenv("FETCH_MAX_HOSTS", defaults.max_hosts)),
+            per_host=int(os.getenv("FETCH_PER_HOST", defaults.per_host)),
+            user_agent=os.getenv("FETCH_USER_AGENT", defaults.user_agent),
+            streaming=os.getenv("FETCH_STREAMING", "").lower()
+            in ("1", "true", "yes"),
+            max_bytes=int(os.getenv("FETCH_MAX_BYTES", defaults.max_bytes)),
+            host_rate=float(os.getenv("FETCH_HOST_RATE", defaults.host_rate)),
+            host_burst=int(
+                os.getenv("FETCH_HOST_BURST", defaults.host_burst)
+            ),
+            max_retry_after=float(
+                os.getenv("FETCH_MAX_RETRY_AFTER", defaults.max_retry_after)
+            ),
+            dns_ttl=float(os.getenv("FETCH_DNS_TTL", defaults.dns_ttl)),
+            dns_negative_ttl=float(
+                os.getenv("FETCH_DNS_NEGATIVE_TTL", defaults.dns_negative_ttl)
+            ),
+            dns_cache_size=int(
+                os.getenv("FETCH_DNS_CACHE_SIZE", defaults.dns_cache_size)
+            ),
+        )
+
+    def backoff(self, attempt):
+        """Seconds to sleep before retry number ``attempt`` (0-based)."""
+        return self.backoff_factor * 2**attempt
+
+    def dns_cache(self):
+        return DnsCache(
+            self.dns_ttl, self.dns_negative_ttl, self.dns_cache_size
+        )
+
+    def limiter(self):
+        return HostRateLimiter(
+            self.host_rate,
+            self.host_burst,
+            max_retry_after=self.max_retry_after,
+        )
+
+
+class RateLimitedError(requests.exceptions.RequestException):
+    """The host asked us to slow down for longer than we are willing to wait."""
+
+
+class Fetcher:
+    """HTTP client shared by every check made in a process.
+
+    Keeps one ``requests.Session`` per process so connections (and TLS
+    sessions) to a host are reused between checks.  At most
+    ``per_host`` connections are opened to a single host; further
+    requests wait for a free one.  Connection errors and 5xx responses
+    are retried with exponential backoff; read timeouts are not, so a
+    slow site costs at most one read timeout.
+
+    Requests to a host are spaced out by a ``HostRateLimiter``.  A request
+    that would have to wait longer than the read timeout, e.g. because
+    the host sent a long ``Retry-After``, fails with ``RateLimitedError``
+    instead of blocking the caller.  Host names are resolved through a
+    ``DnsCache`` shared by the session's connections.
+    """
+
+    def __init__(self, config=None):
+        self.config = config or FetcherConfig.from_env()
+        self.limiter = self.config.limiter()
+        self.dns_cache = self.config.dns_cache()
+        self._lock = threading.Lock()
+        self._session = None
+        self._pid = None
+
+    def _build_session(self):
+        config = self.config
+        retry = Retry(
+            total=config.retries,
+            connect=config.retries,
+            read=0,
+            status=config.retries,
+            backoff_factor=config.backoff_factor,
+            status_forcelist=RETRY_STATUSES,
+            allowed_methods=frozenset({"GET", "HEAD"}),
+            raise_on_status=False,
+            # Retry-After is handled by the limiter, which refuses long
+            # waits instead of sleeping inside the request.
+            respect_retry_after_header=False,
+        )
+        adapter = CachingHTTPAdapter(
+            self.dns_cache,
+            pool_connections=config.max_hosts,
+            pool_maxsize=config.per_host,
+            pool_block=True,
+            max_retries=retry,
+        )
+        session = requests.Session()
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        session.headers["User-Agent"] = config.user_agent
+        return session
+
+    @property
+    def session(self):
+        pid = os.getpid()
+        if self._pid != pid:
+            with self._lock:
+                if self._pid != pid:
+                    # The parent's cache lock may have been held at fork.
+                    self.dns_cache = self.config.dns_cache()
+                    self._session = self._build_session()
+                    self._pid = pid
+        return self._session
+
+    def timeout(self, read_timeout=None):
+        return (
+            self.config.connect_timeout,
+            self.config.read_timeout if read_timeout is None else read_timeout,
+        )
+
+    def get(self, url, timeout=None, **kwargs):
+        timeout = self.timeout(timeout)
+        delay = self.limiter.take(host_key(url), max_wait=timeout[1])
+        if delay > timeout[1]:
+            raise RateLimitedError(
+                f"{host_key(url)} is rate limited for {delay:.0f}s"
+            )
+        if delay > 0:
+            time.sleep(delay)
+        response = self.session.get(url, timeout=timeout, **kwargs)
+        FETCH_PHASE_SECONDS.observe(
+            response.elapsed.total_seconds(), phase="first_byte"
+        )
+        if response.status_code in RATE_LIMIT_STATUSES:
+            self.limiter.retry_after(url, response.headers.get("Retry-After"))
+        return response
+
+    def close(self):
+        with self._lock:
+            if self._session is not None and self._pid == os.getpid():
+                self._session.close()
+            self._session = self._pid = None
@@ -0,0 +1,121 @@
+"""Bulk import of urls from a CSV file or a plain list, one url per line.
+
+Lines are read lazily, so files of any size can be imported.  Each url is
+validated and normalized like in ``POST /urls``; repeats within the
+file and urls already in the database are counted as duplicates.  New
+urls are written ``batch_size`` at a time with a single
+``INSERT ... ON CONFLICT DO NOTHING`` per batch.
+
+``normalize_stored_urls`` brings urls stored under older normalization
+rules (mixed case, default ports, IDNA 2003) to their canonical name,
+merging those that turn out to be duplicates.
+"""
+
+import csv
+from dataclasses import dataclass
+
+from .database import canonicalize_url, insert_urls, iter_urls
+from .url_utils import normalize_url, validate_url
+
+HEADER_NAMES = ("url", "name")
+
+
+@dataclass
+class ImportStats:
+    inserted: int = 0
+    duplicates: int = 0
+    invalid: int = 0
+
+    def summary(self):
+        return (
+            f"{self.inserted} inserted, {self.duplicates} duplicate(s), "
+            f"{self.invalid} invalid"
+        )
+
+
+def read_urls(lines):
+    """Yield the url of each line: the first column of CSV rows.
+
+    A first row consisting of a ``url`` or ``name`` header is skipped
+    and blank lines are ignored.
+    """
+    for number, row in enumerate(csv.reader(lines)):
+        if not row or not row[0].strip():
+            continue
+        value = row[0].strip().lstrip("\ufeff")
+        if number == 0 and value.lower() in HEADER_NAMES:
+            continue
+        yield value
+
+
+def import_urls(lines, batch_size=1000):
+    """Import the urls of ``lines`` and return ``ImportStats``."""
+    stats = ImportStats()
+    seen = set()
+    batch = []
+    for url in read_urls(lines):
+        if not validate_url(url):
+            stats.invalid += 1
+            continue
+        name = normalize_url(url)
+        if name in seen:
+            stats.duplicates += 1
+            continue
+        seen.add(name)
+        batch.append(name)
+        if len(batch) >= batch_size:
+            _flush(batch, stats)
+    _flush(batch, stats)
+    return stats
+
+
+def _flush(batch, stats):
+    if not batch:
+        return
+    inserted = insert_urls(batch)
+    stats.inserted += inserted
+    stats.duplicates += len(batch) - inserted
+    batch.clear()
+
+
+@dataclass
+class NormalizeStats:
+    renamed: int = 0
+    merged: int = 0
+    invalid: int = 0
+
+    def summary(self):
+        return (
+            f"{self.renamed} renamed, {self.merged} merged, "
+            f"{self.invalid} invalid"
+        )
+
+
+def normalize_stored_urls(*, apply=True, on_change=None):
+    """Rename stored urls whose name ``normalize_url`` would change.
+
+    A url whose canonical name is taken is merged into the url holding
+    it, see ``canonicalize_url``.  Names that cannot be normalized are
+    counted as invalid and left alone.  ``on_change`` is called with
+    ``(url_id, name, canonical, into_id)``; ``canonical`` and
+    ``into_id`` are None for invalid names.  With ``apply`` false the
+    changes are only reported.
+    """
+    stats = NormalizeStats()
+    for url_id, name in iter_urls():
+        try:
+            canonical = normalize_url(name)
+        except ValueError:
+            canonical = into_id = None
+            stats.invalid += 1
+        else:
+            if canonical == name:
+                continue
+            into_id = canonicalize_url(url_id, canonical, apply=apply)
+            if into_id == url_id:
+                stats.renamed += 1
+            else:
+                stats.merged += 1
+        if on_change:
+            on_change(url_id, name, canonical, into_id)
+    return stats
@@ -0,0 +1,423 @@
+"""Latency metrics in the Prometheus text format.
+
+The metrics of this module are histograms and counters kept in process
+memory; ``registry.render()`` returns them as the text served by
+``GET /metrics``:
+
+- ``page_analyzer_http_request_duration_seconds`` by endpoint, method
+  and status code, recorded by the Flask app;
+- ``page_analyzer_db_query_duration_seconds`` by statement, the name of
+  the function in ``database.py``, connection checkout included, and
+  ``page_analyzer_db_connection_wait_seconds`` for the checkout alone;
+  statements slower than ``SLOW_QUERY_MS`` are logged and counted in
+  ``page_analyzer_db_slow_queries_total``;
+- ``page_analyzer_fetch_phase_duration_seconds`` by phase: ``dns``,
+  ``connect`` (TCP and TLS), ``first_byte`` (until the response headers)
+  and ``total`` (with the body);
+- ``page_analyzer_parse_seo_cpu_seconds`` by parser backend, the CPU
+  time of the calling thread;
+- ``page_analyzer_template_render_duration_seconds`` by template.
+
+Gunicorn workers are separate processes.  With ``METRICS_DIR`` set the
+long-running processes (gunicorn workers from the ``post_fork`` hook of
+``gunicorn.conf.py``, ``worker``, ``scheduler`` and ``check-all``) call
+``registry.start()`` and then write their metrics to
+``METRICS_DIR/metrics_<pid>.json`` at most every
+``METRICS_FLUSH_INTERVAL`` seconds (after requests and worker iterations,
+and at exit); ``render`` adds up the files of all processes, so any
+worker answers for the whole host.  Short commands never write a file.
+The file of an exited process is folded into ``archive.json`` (at exit,
+by the gunicorn ``child_exit`` hook, or when the next process starts),
+so totals never go down and the directory holds one file per running
+process.
+"""
+
+import atexit
+import bisect
+import fcntl
+import json
+import logging
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+PREFIX = "page_analyzer_"
+ARCHIVE_NAME = "archive.json"
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [*zip(names, values, strict=True), *extra]
+    if not pairs:
+        return ""
+    escaped = (
+        (name, value.replace("\\", "\\\\").replace('"', '\\"'))
+        for name, value in pairs
+    )
+    escaped = ((name, value.replace("\n", "\\n")) for name, value in escaped)
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+def _format_value(value):
+    if isinstance(value, float) and math.isinf(value):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _read(path):
+    try:
+        return json.loads(path.read_text())
+    except (OSError, ValueError):
+        return {}
+
+
+def _write(path, snapshot):
+    tmp_path = path.with_suffix(f".{threading.get_ident()}.tmp")
+    tmp_path.write_text(json.dumps(snapshot))
+    os.replace(tmp_path, path)
+
+
+def _merge(merged, snapshot):
+    """Add the series of a flushed ``snapshot`` to ``merged`` in place."""
+    for name, series in snapshot.items():
+        target = merged.setdefault(name, {})
+        for key, values in series:
+            current = target.get(tuple(key))
+            target[tuple(key)] = (
+                values
+                if current is None
+                else [a + b for a, b in zip(current, values, strict=True)]
+            )
+    return merged
+
+
+def _as_snapshot(merged):
+    return {
+        name: [[list(key), values] for key, values in series.items()]
+        for name, series in merged.items()
+    }
+
+
+def _is_running(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = PREFIX + name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _empty(self):
+        raise NotImplementedError
+
+    def _update(self, labels, index, value):
+        key = self._key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = self._empty()
+            series[index] += 1
+            if index != len(series) - 1:
+                series[-1] += value
+
+    def snapshot(self):
+        with self._lock:
+            return [
+                [list(key), list(values)]
+                for key, values in self._series.items()
+            ]
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _empty(self):
+        return [0]
+
+    def inc(self, **labels):
+        self._update(labels, 0, 0)
+
+    def render(self, series):
+        yield from (
+            f"{self.name}{_format_labels(self.labelnames, key)} "
+            f"{_format_value(values[0])}"
+            for key, values in series
+        )
+
+
+class Histogram(_Metric):
+    """Bucket counts (not cumulative), the +Inf bucket, then the sum."""
+
+    kind = "histogram"
+
+    def __init__(
+        self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _empty(self):
+        return [0] * (len(self.buckets) + 1) + [0.0]
+
+    def observe(self, value, **labels):
+        self._update(labels, bisect.bisect_left(self.buckets, value), value)
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def render(self, series):
+        bounds = [*self.buckets, math.inf]
+        for key, values in series:
+            cumulative = 0
+            for bound, count in zip(bounds, values, strict=False):
+                cumulative += count
+                labels = _format_labels(
+                    self.labelnames, key, [("le", _format_value(bound))]
+                )
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = _format_labels(self.labelnames, key)
+            yield f"{self.name}_sum{labels} {_format_value(values[-1])}"
+            yield f"{self.name}_count{labels} {cumulative}"
+
+
+class Registry:
+    """Metrics of this process, shared with others through ``directory``.
+
+    With ``from_env`` the directory and the flush interval are read from
+    ``METRICS_DIR`` and ``METRICS_FLUSH_INTERVAL`` on first use rather
+    than at import, which comes before ``.env`` is loaded.
+    """
+
+    def __init__(self, directory=None, flush_interval=1.0, *, from_env=False):
+        self.flush_interval = flush_interval
+        self.metrics = {}
+        self._from_env = from_env
+        self._directory = None
+        self._started = False
+        self._pid = None
+        self._last_flush = 0.0
+        self._lock = threading.Lock()
+        if not from_env:
+            self._set_directory(directory)
+        # A forked child starts from zero: the parent reports its own.
+        os.register_at_fork(after_in_child=self._after_fork)
+
+    def _set_directory(self, directory):
+        self._directory = Path(directory) if directory else None
+        if self._directory is not None:
+            self._directory.mkdir(parents=True, exist_ok=True)
+
+    @property
+    def directory(self):
+        if self._from_env:
+            self._from_env = False
+            self.flush_interval = float(
+                os.getenv("METRICS_FLUSH_INTERVAL", self.flush_interval)
+            )
+            self._set_directory(os.getenv("METRICS_DIR"))
+        return self._directory
+
+    def _after_fork(self):
+        self._lock = threading.Lock()
+        self._last_flush = 0.0
+        for metric in self.metrics.values():
+            metric._lock = threading.Lock()
+            metric.reset()
+
+    def _register(self, metric):
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), **kwargs):
+        return self._register(
+            Histogram(name, documentation, labelnames, **kwargs)
+        )
+
+    def snapshot(self):
+        return {
+            name: metric.snapshot() for name, metric in self.metrics.items()
+        }
+
+    def _path(self, pid=None):
+        return self.directory / f"metrics_{pid or os.getpid()}.json"
+
+    @contextmanager
+    def _locked(self, operation):
+        with open(self.directory / ".lock", "a") as lock:
+            fcntl.flock(lock, operation)
+            yield
+
+    def start(self):
+        """Report this process to ``directory`` from now on.
+
+        Only long-running processes call this, so that one-off commands
+        leave no file behind.  At exit the process's file is folded into
+        the archive.
+        """
+        if self.directory is None or self._started:
+            return
+        self._started = True
+        atexit.register(self._exit)
+
+    def _exit(self):
+        if self.directory.is_dir():
+            self.flush(force=True)
+            self.archive(os.getpid())
+
+    def flush(self, *, force=False):
+        """Write this process's metrics to ``directory`` when due."""
+        if self.directory is None or not self._started:
+            return
+        now = time.monotonic()
+        with self._lock:
+            if not force and now - self._last_flush < self.flush_interval:
+                return
+            self._last_flush = now
+        pid = os.getpid()
+        if self._pid != pid:
+            # A file under our pid was left by a dead process: keep its
+            # totals before overwriting it.
+            self._pid = pid
+            self.archive(pid)
+            self.archive_stale()
+        path = self._path(pid)
+        try:
+            _write(path, self.snapshot())
+        except OSError:
+            logger.exception("could not write metrics to %s", path)
+
+    def archive(self, pid):
+        """Fold the file of process ``pid`` into the archive, remove it."""
+        if self.directory is None:
+            return
+        path = self._path(pid)
+        archive = self.directory / ARCHIVE_NAME
+        with self._locked(fcntl.LOCK_EX):
+            if not path.exists():
+                return
+            merged = _merge(_merge({}, _read(archive)), _read(path))
+            try:
+                _write(archive, _as_snapshot(merged))
+                path.unlink()
+            except OSError:
+                logger.exception("could not archive metrics of %s", path)
+
+    def archive_stale(self):
+        """Fold the files of processes that are no longer running."""
+        if self.directory is None:
+            return
+        for path in self.directory.glob("metrics_*.json"):
+            pid = path.stem.removeprefix("metrics_")
+            if pid.isdigit() and not _is_running(int(pid)):
+                self.archive(int(pid))
+
+    def collect(self):
+        """Metrics of this process plus those flushed by the others."""
+        merged = {
+            name: {tuple(key): values for key, values in series}
+            for name, series in self.snapshot().items()
+        }
+        if self.directory is None:
+            return merged
+        own = self._path()
+        with self._locked(fcntl.LOCK_SH):
+            _merge(merged, _read(self.directory / ARCHIVE_NAME))
+            for path in self.directory.glob("metrics_*.json"):
+                if path != own:
+                    _merge(merged, _read(path))
+        return merged
+
+    def render(self):
+        lines = []
+        for name, series in sorted(self.collect().items()):
+            metric = self.metrics.get(name)
+            if metric is None:
+                continue
+            lines.append(f"# HELP {name} {metric.documentation}")
+            lines.append(f"# TYPE {name} {metric.kind}")
+            lines.extend(metric.render(sorted(series.items())))
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry(from_env=True)
+
+HTTP_REQUEST_SECONDS = registry.histogram(
+    "http_request_duration_seconds",
+    "Time spent answering HTTP requests.",
+    ("endpoint", "method", "status"),
+)
+DB_QUERY_SECONDS = registry.histogram(
+    "db_query_duration_seconds",
+    "Time spent in database statements, connection checkout included.",
+    ("statement",),
+)
+DB_CONNECTION_WAIT_SECONDS = registry.histogram(
+    "db_connection_wait_seconds",
+    "Time spent getting a connection from the pool.",
+)
+DB_SLOW_QUERIES = registry.counter(
+    "db_slow_queries_total",
+    "Database statements slower than SLOW_QUERY_MS.",
+    ("statement",),
+)
+FETCH_PHASE_SECONDS = registry.histogram(
+    "fetch_phase_duration_seconds",
+    "Time spent fetching pages, by phase.",
+    ("phase",),
+)
+PARSE_CPU_SECONDS = registry.histogram(
+    "parse_seo_cpu_seconds",
+    "CPU time spent extracting SEO tags.",
+    ("backend",),
+)
+TEMPLATE_RENDER_SECONDS = registry.histogram(
+    "template_render_duration_seconds",
+    "Time spent rendering Jinja templates.",
+    ("template",),
+)
@@ -0,0 +1,127 @@
+"""Versioned SQL migrations.
+
+Migrations live in ``page_analyzer/migrations`` as ``NNNN_name.sql`` files
+and are applied in version order.  Each applied version is recorded in the
+``schema_version`` table.  A file runs inside a single transaction unless
+its first line is ``-- migrate: no-transaction``; such files (needed for
+``CREATE INDEX CONCURRENTLY``) run statement by statement in autocommit
+mode, with statements separated by a ``;`` at the end of a line.
+"""
+
+import re
+from dataclasses import dataclass
+from pathlib import Path
+
+MIGRATIONS_DIR = Path(__file__).resolve().parent / "migrations"
+FILENAME_RE = re.compile(r"^(\d+)_(\w+)\.sql$")
+STATEMENT_END_RE = re.compile(r";[ \t]*$", re.MULTILINE)
+NO_TRANSACTION_MARKER = "-- migrate: no-transaction"
+ADVISORY_LOCK_ID = 83_0001
+
+SCHEMA_VERSION_DDL = """
+    CREATE TABLE IF NOT EXISTS schema_version (
+        version INT PRIMARY KEY,
+        name TEXT NOT NULL,
+        applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+"""
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    name: str
+    path: Path
+
+    @property
+    def sql(self):
+        return self.path.read_text(encoding="utf-8")
+
+    @property
+    def transactional(self):
+        return not self.sql.lstrip().startswith(NO_TRANSACTION_MARKER)
+
+    def statements(self):
+        chunks = STATEMENT_END_RE.split(self.sql)
+        return [chunk.strip() for chunk in chunks if _has_code(chunk)]
+
+
+def _has_code(chunk):
+    return any(
+        line.strip() and not line.strip().startswith("--")
+        for line in chunk.splitlines()
+    )
+
+
+def discover(directory=MIGRATIONS_DIR):
+    migrations = []
+    for path in Path(directory).glob("*.sql"):
+        match = FILENAME_RE.match(path.name)
+        if not match:
+            raise ValueError(f"bad migration file name: {path.name}")
+        migrations.append(Migration(int(match[1]), match[2], path))
+    migrations.sort(key=lambda migration: migration.version)
+    versions = [migration.version for migration in migrations]
+    if len(versions) != len(set(versions)):
+        raise ValueError("duplicate migration versions")
+    return migrations
+
+
+def applied_versions(conn):
+    with conn.cursor() as cur:
+        cur.execute(SCHEMA_VERSION_DDL)
+        cur.execute("SELECT version FROM schema_version")
+        return {row[0] for row in cur.fetchall()}
+
+
+def pending(conn, directory=MIGRATIONS_DIR):
+    applied = applied_versions(conn)
+    return [m for m in discover(directory) if m.version not in applied]
+
+
+def apply(conn, migration):
+    with conn.cursor() as cur:
+        if migration.transactional:
+            cur.execute("BEGIN")
+            try:
+                cur.execute(migration.sql)
+                _record(cur, migration)
+            except Exception:
+                cur.execute("ROLLBACK")
+                raise
+            cur.execute("COMMIT")
+        else:
+            for statement in migration.statements():
+                cur.execute(statement)
+            _record(cur, migration)
+
+
+def _record(cur, migration):
+    cur.execute(
+        "INSERT INTO schema_version (version, name) VALUES (%s, %s)",
+        (migration.version, migration.name),
+    )
+
+
+def migrate(conn, directory=MIGRATIONS_DIR, target=None, on_apply=None):
+    """Apply pending migrations up to ``target`` and return them.
+
+    A session advisory lock serialises concurrent runs, e.g. two deploys
+    starting at the same time.
+    """
+    conn.autocommit = True
+    with conn.cursor() as cur:
+        cur.execute("SELECT pg_advisory_lock(%s)", (ADVISORY_LOCK_ID,))
+    try:
+        applied = []
+        for migration in pending(conn, directory):
+            if target is not None and migration.version > target:
+                break
+            if on_apply:
+                on_apply(migration)
+            apply(conn, migration)
+            applied.append(migration)
+        return applied
+    finally:
+        with conn.cursor() as cur:
+            cur.execute("SELECT pg_advisory_unlock(%s)", (ADVISORY_LOCK_ID,))
@@ -0,0 +1,7 @@
+-- migrate: no-transaction
+-- Serves the per-url "latest check" lookup and the check history on the
+-- url page, both ordered by (created_at DESC, id DESC).  Built
+-- concurrently so writes to url_checks are not blocked; if the build
+-- fails, drop the INVALID index before re-running the migration.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS url_checks_url_id_created_at_idx
+    ON url_checks (url_id, created_at DESC, id DESC);
@@ -0,0 +1,5 @@
+-- Latest check summary kept up to date by insert_url_check, so the url
+-- list does not have to look into url_checks.  Existing rows are filled
+-- in by `python -m page_analyzer backfill-last-checks`.
+ALTER TABLE urls ADD COLUMN IF NOT EXISTS last_checked_at TIMESTAMP;
+ALTER TABLE urls ADD COLUMN IF NOT EXISTS last_status_code INT;
@@ -0,0 +1,24 @@
+-- Queue of checks requested from the web UI and processed by
+-- `python -m page_analyzer worker`.  status is one of queued, running,
+-- done or failed; url_check_id points at the resulting check.
+CREATE TABLE IF NOT EXISTS check_jobs (
+    id SERIAL PRIMARY KEY,
+    url_id INT NOT NULL REFERENCES urls(id) ON DELETE CASCADE,
+    status VARCHAR(16) NOT NULL DEFAULT 'queued',
+    attempts INT NOT NULL DEFAULT 0,
+    error TEXT,
+    url_check_id INT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    started_at TIMESTAMP,
+    finished_at TIMESTAMP
+);
+
+-- At most one pending job per url.
+CREATE UNIQUE INDEX IF NOT EXISTS check_jobs_active_url_id_idx
+    ON check_jobs (url_id) WHERE status IN ('queued', 'running');
+
+CREATE INDEX IF NOT EXISTS check_jobs_queued_idx
+    ON check_jobs (id) WHERE status = 'queued';
+
+CREATE INDEX IF NOT EXISTS check_jobs_url_id_idx
+    ON check_jobs (url_id, id DESC);
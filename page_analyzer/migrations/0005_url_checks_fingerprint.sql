@@ -0,0 +1,6 @@
+-- Response validators and a body fingerprint for each check, so a
+-- re-check can send If-None-Match / If-Modified-Since and skip parsing
+-- pages that did not change.  content_hash is the hex SHA-256 of the body.
+ALTER TABLE url_checks ADD COLUMN IF NOT EXISTS etag TEXT;
+ALTER TABLE url_checks ADD COLUMN IF NOT EXISTS last_modified TEXT;
+ALTER TABLE url_checks ADD COLUMN IF NOT EXISTS content_hash TEXT;
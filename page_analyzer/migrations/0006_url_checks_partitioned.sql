@@ -0,0 +1,78 @@
+-- Range partition url_checks by created_at, one partition per month, so
+-- old months can be detached or dropped instead of deleted row by row
+-- and lookups bounded by created_at only touch the months they need.
+--
+-- The existing table becomes the partition url_checks_legacy, holding
+-- everything before the first day of next month, followed by partitions
+-- for the three months after that.  The old table is not rewritten,
+-- but attaching it scans it once and its (id, created_at) primary key
+-- is built, so run this migration when the checks can wait.  Later
+-- months are created by `python -m page_analyzer partitions` and by the
+-- check worker (see page_analyzer/partitions.py).
+DO $$
+DECLARE
+    legacy_end TIMESTAMP;
+    month_start TIMESTAMP;
+    partition_name TEXT;
+BEGIN
+    IF (SELECT relkind FROM pg_class WHERE oid = 'url_checks'::regclass)
+            = 'p' THEN
+        RETURN;
+    END IF;
+
+    ALTER TABLE url_checks RENAME TO url_checks_legacy;
+    ALTER INDEX url_checks_url_id_created_at_idx
+        RENAME TO url_checks_legacy_url_id_created_at_idx;
+    UPDATE url_checks_legacy SET created_at = 'epoch'
+        WHERE created_at IS NULL;
+    ALTER TABLE url_checks_legacy ALTER COLUMN created_at SET NOT NULL;
+    ALTER TABLE url_checks_legacy DROP CONSTRAINT url_checks_pkey;
+
+    CREATE TABLE url_checks (
+        id INT NOT NULL DEFAULT nextval('url_checks_id_seq'),
+        url_id INT REFERENCES urls(id) ON DELETE CASCADE,
+        status_code INT,
+        h1 TEXT,
+        title TEXT,
+        description TEXT,
+        created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        etag TEXT,
+        last_modified TEXT,
+        content_hash TEXT,
+        PRIMARY KEY (id, created_at)
+    ) PARTITION BY RANGE (created_at);
+    ALTER SEQUENCE url_checks_id_seq OWNED BY url_checks.id;
+
+    SELECT date_trunc(
+        'month', GREATEST(max(created_at), LOCALTIMESTAMP)
+    ) + INTERVAL '1 month'
+    INTO legacy_end
+    FROM url_checks_legacy;
+    EXECUTE format(
+        'ALTER TABLE url_checks ATTACH PARTITION url_checks_legacy '
+        'FOR VALUES FROM (MINVALUE) TO (%L)',
+        legacy_end
+    );
+
+    -- Picks up the existing index of url_checks_legacy instead of
+    -- building a new one.
+    CREATE INDEX url_checks_url_id_created_at_idx
+        ON url_checks (url_id, created_at DESC, id DESC);
+
+    FOR i IN 0..2 LOOP
+        month_start := legacy_end + make_interval(months => i);
+        partition_name := 'url_checks_' || to_char(month_start, 'YYYY_MM');
+        EXECUTE format(
+            'CREATE TABLE %I (LIKE url_checks INCLUDING DEFAULTS)',
+            partition_name
+        );
+        EXECUTE format(
+            'ALTER TABLE url_checks ATTACH PARTITION %I '
+            'FOR VALUES FROM (%L) TO (%L)',
+            partition_name,
+            month_start,
+            month_start + INTERVAL '1 month'
+        );
+    END LOOP;
+END
+$$;
@@ -0,0 +1,6 @@
+-- Recurring checks: a url with a check_interval is re-checked by
+-- `python -m page_analyzer scheduler` once next_check_at has passed.
+-- Both are NULL for urls that are only checked on demand.
+ALTER TABLE urls ADD COLUMN IF NOT EXISTS check_interval INTERVAL
+    CHECK (check_interval > INTERVAL '0');
+ALTER TABLE urls ADD COLUMN IF NOT EXISTS next_check_at TIMESTAMP;
@@ -0,0 +1,7 @@
+-- migrate: no-transaction
+-- Lets the scheduler find due urls without scanning the table.  Partial,
+-- so urls that are not scheduled take no space in it.  Built
+-- concurrently; if the build fails, drop the INVALID index before
+-- re-running the migration.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS urls_next_check_at_idx
+    ON urls (next_check_at) WHERE next_check_at IS NOT NULL;
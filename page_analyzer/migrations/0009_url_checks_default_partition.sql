@@ -0,0 +1,13 @@
+-- A DEFAULT partition catches checks whose month has no partition yet,
+-- so inserts keep working when nobody runs `partitions`, the worker or
+-- the scheduler for a while.  ensure_partitions moves such rows out of
+-- it into the month's partition when that is created.
+DO $$
+BEGIN
+    IF (SELECT relkind FROM pg_class WHERE oid = 'url_checks'::regclass)
+            = 'p' THEN
+        CREATE TABLE IF NOT EXISTS url_checks_default
+            PARTITION OF url_checks DEFAULT;
+    END IF;
+END
+$$;
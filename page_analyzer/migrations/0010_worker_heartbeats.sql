@@ -0,0 +1,8 @@
+-- Liveness of `python -m page_analyzer worker` processes.  Each worker
+-- refreshes its row every few seconds and deletes it on exit; while
+-- CHECKS_ASYNC is unset the web app queues checks only when some row is
+-- recent, and runs them in the request otherwise.
+CREATE TABLE IF NOT EXISTS worker_heartbeats (
+    name VARCHAR(255) PRIMARY KEY,
+    seen_at TIMESTAMP NOT NULL
+);
@@ -1,21 +1,278 @@
-import requests
+import codecs
+import hashlib
+import os
+import re
+import time
+from contextlib import closing
+from dataclasses import dataclass
+
 from bs4 import BeautifulSoup
 
+from .fetcher import Fetcher
+from .metrics import FETCH_PHASE_SECONDS, PARSE_CPU_SECONDS
+from .seo import (
+    LXML_AVAILABLE,
+    SeoParser,
+    clean_text,
+    extract_seo,
+    extract_seo_lxml,
+)
+
+CHUNK_SIZE = 16 * 1024
+META_CHARSET = re.compile(
+    rb"""<meta[^>]+charset\s*=\s*["']?\s*([\w.:-]+)""", re.IGNORECASE
+)
+
+fetcher = Fetcher()
+
+DEFAULT_PARSER_BACKEND = "html"
+HTTP_NOT_MODIFIED = 304
+
+
+@dataclass(frozen=True)
+class LastCheck:
+    """The previous check of a url, as ``fetch_last_check`` returns it."""
+
+    status_code: int
+    h1: str | None
+    title: str | None
+    description: str | None
+    etag: str | None = None
+    last_modified: str | None = None
+    content_hash: str | None = None
+
+    def conditional_headers(self):
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+@dataclass(frozen=True)
+class FetchResult:
+    status_code: int
+    h1: str | None
+    title: str | None
+    description: str | None
+    bytes_read: int
+    truncated: bool = False
+    stopped_early: bool = False
+    etag: str | None = None
+    last_modified: str | None = None
+    content_hash: str | None = None
+    unchanged: bool = False
+
+
+def content_hash(body: bytes) -> str:
+    return hashlib.sha256(body).hexdigest()
+
+
+def is_unchanged(last_check, status_code, body_hash):
+    """True when a response shows the page is the same as ``last_check``."""
+    if last_check is None:
+        return False
+    if status_code == HTTP_NOT_MODIFIED:
+        return True
+    return body_hash is not None and body_hash == last_check.content_hash
+
+
+def reuse_last_check(last_check, *, bytes_read, etag, last_modified):
+    return FetchResult(
+        last_check.status_code,
+        last_check.h1,
+        last_check.title,
+        last_check.description,
+        bytes_read=bytes_read,
+        etag=etag or last_check.etag,
+        last_modified=last_modified or last_check.last_modified,
+        content_hash=last_check.content_hash,
+        unchanged=True,
+    )
+
 
 def fetch_html(url: str, timeout: int = 10) -> tuple[str, int]:
-    response = requests.get(url, timeout=timeout)
-    response.raise_for_status()
-    return response.text, response.status_code
+    with FETCH_PHASE_SECONDS.time(phase="total"):
+        response = fetcher.get(url, timeout=timeout)
+        response.raise_for_status()
+        return response.text, response.status_code
 
 
-def parse_seo(html: str) -> tuple[str | None, str | None, str | None]:
+def _decoder(response, head):
+    """Pick the body charset: header, then ``<meta charset>``, then UTF-8."""
+    encoding = None
+    if "charset" in response.headers.get("Content-Type", "").lower():
+        encoding = response.encoding
+    if encoding is None:
+        match = META_CHARSET.search(head[:1024])
+        if match:
+            encoding = match.group(1).decode("ascii")
+    try:
+        return codecs.getincrementaldecoder(encoding or "utf-8")(
+            errors="replace"
+        )
+    except LookupError:
+        return codecs.getincrementaldecoder("utf-8")(errors="replace")
+
+
+def fetch_seo(
+    url: str, timeout: int = 10, max_bytes=None, headers=None
+) -> FetchResult:
+    """Download ``url`` in chunks and extract its SEO tags on the fly.
+
+    The download stops as soon as the h1, title and description are known
+    or ``</body>`` has been read, and never reads more than ``max_bytes``
+    (``FETCH_MAX_BYTES`` by default) of the decompressed body.
+    """
+    if max_bytes is None:
+        max_bytes = fetcher.config.max_bytes
+    with FETCH_PHASE_SECONDS.time(phase="total"):
+        response = fetcher.get(
+            url, timeout=timeout, stream=True, headers=headers
+        )
+        with closing(response):
+            response.raise_for_status()
+            parser = SeoParser()
+            decoder = None
+            bytes_read = 0
+            truncated = stopped_early = False
+            parse_time = 0.0
+            for data in response.iter_content(CHUNK_SIZE):
+                chunk = data[: max_bytes - bytes_read]
+                truncated = len(chunk) < len(data)
+                bytes_read += len(chunk)
+                if decoder is None:
+                    decoder = _decoder(response, chunk)
+                parse_started = time.thread_time()
+                parser.feed(decoder.decode(chunk))
+                parse_time += time.thread_time() - parse_started
+                if parser.done:
+                    stopped_early = True
+                    break
+                if truncated:
+                    break
+            if decoder is not None:
+                parser.feed(decoder.decode(b"", final=True))
+            parser.close()
+    PARSE_CPU_SECONDS.observe(parse_time, backend="stream")
+    return FetchResult(
+        response.status_code,
+        *parser.result(),
+        bytes_read=bytes_read,
+        truncated=truncated and not stopped_early,
+        stopped_early=stopped_early,
+        etag=response.headers.get("ETag"),
+        last_modified=response.headers.get("Last-Modified"),
+    )
+
+
+def check_page(url: str, timeout: int = 10, last_check=None) -> FetchResult:
+    """Fetch ``url`` and extract its SEO tags.
+
+    When ``last_check`` is given the request is conditional.  A 304 reply,
+    or a body with the same SHA-256 as last time, is not parsed: the
+    result repeats the tags of ``last_check`` with ``unchanged`` set.
+    Streamed downloads (``FETCH_STREAMING``) stop early, so they get no
+    content hash and rely on the validators alone.
+    """
+    headers = last_check.conditional_headers() if last_check else None
+    if fetcher.config.streaming:
+        result = fetch_seo(url, timeout=timeout, headers=headers)
+        if is_unchanged(last_check, result.status_code, None):
+            return reuse_last_check(
+                last_check,
+                bytes_read=result.bytes_read,
+                etag=result.etag,
+                last_modified=result.last_modified,
+            )
+        return result
+    with FETCH_PHASE_SECONDS.time(phase="total"):
+        response = fetcher.get(url, timeout=timeout, headers=headers)
+        response.raise_for_status()
+        body = response.content
+    body_hash = content_hash(body)
+    etag = response.headers.get("ETag")
+    last_modified = response.headers.get("Last-Modified")
+    if is_unchanged(last_check, response.status_code, body_hash):
+        return reuse_last_check(
+            last_check,
+            bytes_read=len(body),
+            etag=etag,
+            last_modified=last_modified,
+        )
+    return FetchResult(
+        response.status_code,
+        *parse_seo(response.text),
+        bytes_read=len(body),
+        etag=etag,
+        last_modified=last_modified,
+        content_hash=body_hash,
+    )
+
+
+def parse_seo_bs4(html: str) -> tuple[str | None, str | None, str | None]:
     soup = BeautifulSoup(html, "html.parser")
     h1 = soup.h1.get_text(strip=True) if soup.h1 else None
     title = soup.title.get_text(strip=True) if soup.title else None
     description_tag = soup.find("meta", attrs={"name": "description"})
     description = (
-        description_tag.get("content", "").strip()
+        description_tag.get("content", "")
         if description_tag and description_tag.get("content")
         else None
     )
-    return h1, title, description
+    return tuple(
+        None if value is None else clean_text(value).strip()
+        for value in (h1, title, description)
+    )
+
+
+PARSER_BACKENDS = {"html": extract_seo, "bs4": parse_seo_bs4}
+if LXML_AVAILABLE:
+    PARSER_BACKENDS["lxml"] = extract_seo_lxml
+
+
+def get_parser_backend(name=None):
+    """Return the extraction function named by ``SEO_PARSER_BACKEND``."""
+    name = name or os.getenv("SEO_PARSER_BACKEND", DEFAULT_PARSER_BACKEND)
+    try:
+        return PARSER_BACKENDS[name]
+    except KeyError:
+        raise ValueError(
+            f"unknown or unavailable SEO parser backend {name!r}, "
+            f"expected one of {', '.join(PARSER_BACKENDS)}"
+        ) from None
+
+
+PARSER_BACKEND = os.getenv("SEO_PARSER_BACKEND", DEFAULT_PARSER_BACKEND)
+_parse = get_parser_backend(PARSER_BACKEND)
+
+
+def parse_seo(html: str) -> tuple[str | None, str | None, str | None]:
+    started = time.thread_time()
+    try:
+        return _parse(html)
+    finally:
+        PARSE_CPU_SECONDS.observe(
+            time.thread_time() - started, backend=PARSER_BACKEND
+        )
+
+
+def _timed_parse(html):
+    started = time.thread_time()
+    seo = _parse(html)
+    return seo, time.thread_time() - started
+
+
+def parse_many(htmls):
+    """Parse a chunk of pages; used as the unit of work of a process pool.
+
+    Returns ``(seo, cpu_seconds)`` pairs.  Metrics recorded in a pool
+    process never reach ``/metrics``, so the caller records the CPU time
+    with ``record_parse_time``.
+    """
+    return [_timed_parse(html) for html in htmls]
+
+
+def record_parse_time(cpu_seconds):
+    PARSE_CPU_SECONDS.observe(cpu_seconds, backend=PARSER_BACKEND)
@@ -0,0 +1,185 @@
+"""Monthly partitions of url_checks.
+
+Migration 0006 turns url_checks into a table range-partitioned by
+``created_at``: ``url_checks_legacy`` holds the checks written before
+the migration and ``url_checks_YYYY_MM`` one month each.  A check whose
+month has no partition lands in ``url_checks_default`` (migration 0009),
+so ``ensure_partitions`` creates the coming months ahead of time and
+moves the rows of a new month out of the default partition; the worker
+and the scheduler call it periodically and ``python -m page_analyzer
+partitions`` can be run from cron.  Concurrent calls are serialized by
+an advisory lock.
+
+Old months are removed with ``detach_partitions``, which detaches them
+and optionally drops them: much cheaper than deleting their rows.
+"""
+
+import re
+from dataclasses import dataclass
+from datetime import datetime
+
+from . import database
+from .cache import invalidate_pages
+
+PARTITION_BOUND_RE = re.compile(
+    r"FROM \((?:MINVALUE|'([^']+)')\) TO \((?:MAXVALUE|'([^']+)')\)"
+)
+
+PARTITIONS_QUERY = """
+    SELECT c.relname, pg_get_expr(c.relpartbound, c.oid)
+    FROM pg_inherits i
+    JOIN pg_class c ON c.oid = i.inhrelid
+    WHERE i.inhparent = 'url_checks'::regclass
+"""
+DEFAULT_PARTITION = "url_checks_default"
+# pg_advisory_xact_lock key taken while partitions are created.
+PARTITIONS_LOCK_ID = 0x75726C63
+# How long a detach may wait for the lock on url_checks.
+DETACH_LOCK_TIMEOUT = "5s"
+
+
+@dataclass(frozen=True)
+class Partition:
+    name: str
+    start: datetime | None
+    end: datetime | None
+
+    def covers(self, moment):
+        return (self.start is None or self.start <= moment) and (
+            self.end is None or moment < self.end
+        )
+
+
+def month_start(moment):
+    return datetime(moment.year, moment.month, 1)
+
+
+def add_months(moment, months):
+    index = moment.year * 12 + moment.month - 1 + months
+    return moment.replace(year=index // 12, month=index % 12 + 1, day=1)
+
+
+def partition_name(month):
+    return f"url_checks_{month:%Y_%m}"
+
+
+def _quote(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _parse_bound(bound):
+    match = PARTITION_BOUND_RE.search(bound)
+    start, end = match.groups() if match else (None, None)
+    return (
+        start and datetime.fromisoformat(start),
+        end and datetime.fromisoformat(end),
+    )
+
+
+def is_partitioned():
+    with database.get_conn() as conn, conn.cursor() as cur:
+        cur.execute(
+            "SELECT relkind FROM pg_class WHERE oid = 'url_checks'::regclass"
+        )
+        return cur.fetchone()[0] == "p"
+
+
+def list_partitions():
+    """Return the range partitions of url_checks ordered by their range.
+
+    The default partition is not listed.
+    """
+    with database.get_conn() as conn, conn.cursor() as cur:
+        cur.execute(PARTITIONS_QUERY)
+        rows = cur.fetchall()
+    partitions = [
+        Partition(name, *_parse_bound(bound))
+        for name, bound in rows
+        if bound != "DEFAULT"
+    ]
+    return sorted(partitions, key=lambda p: p.start or datetime.min)
+
+
+def ensure_partitions(months_ahead=3, now=None):
+    """Create missing partitions up to ``months_ahead`` months from now.
+
+    Returns the names of the created partitions.  Does nothing while
+    url_checks is not partitioned yet.  Checks of a new month already in
+    the default partition are moved to the month's partition.  Safe to
+    call from several processes at once: the creation of a partition
+    runs under an advisory lock and is skipped if another process made
+    it meanwhile.
+    """
+    if not is_partitioned():
+        return []
+    existing = list_partitions()
+    current = month_start(now or datetime.now())
+    created = []
+    for offset in range(months_ahead + 1):
+        month = add_months(current, offset)
+        if any(partition.covers(month) for partition in existing):
+            continue
+        name = partition_name(month)
+        bounds = (month, add_months(month, 1))
+        # CREATE ... PARTITION OF would lock url_checks against reads;
+        # attaching an empty table only blocks other DDL.
+        with database.get_conn() as conn, conn.cursor() as cur:
+            cur.execute(
+                "SELECT pg_advisory_xact_lock(%s)", (PARTITIONS_LOCK_ID,)
+            )
+            cur.execute("SELECT to_regclass(%s)", (name,))
+            if cur.fetchone()[0] is not None:
+                continue
+            cur.execute(
+                f"CREATE TABLE {name} (LIKE url_checks INCLUDING DEFAULTS)"
+            )
+            cur.execute("SELECT to_regclass(%s)", (DEFAULT_PARTITION,))
+            if cur.fetchone()[0] is not None:
+                # Attaching fails while the default partition holds rows
+                # of the new range.
+                cur.execute(
+                    f"WITH moved AS (DELETE FROM {DEFAULT_PARTITION} "
+                    "WHERE created_at >= %s AND created_at < %s RETURNING *) "
+                    f"INSERT INTO {name} SELECT * FROM moved",
+                    bounds,
+                )
+            cur.execute(
+                f"ALTER TABLE url_checks ATTACH PARTITION {name} "
+                "FOR VALUES FROM (%s) TO (%s)",
+                bounds,
+            )
+            conn.commit()
+        created.append(name)
+    return created
+
+
+def detach_partitions(before, *, drop=False):
+    """Detach partitions holding only checks older than ``before``.
+
+    ``before`` is rounded down to a month.  With ``drop`` the partitions
+    are dropped as well, otherwise they stay as plain tables.  Returns
+    the names of the detached partitions.
+
+    ``DETACH ... CONCURRENTLY`` is refused while url_checks has a default
+    partition, so each partition is detached in a short transaction that
+    holds an exclusive lock on url_checks: reads and writes of checks
+    wait for it.  The lock is given up after ``DETACH_LOCK_TIMEOUT``
+    rather than stall them behind a long query, and the database error
+    is raised; detaching again later picks up where this call stopped.
+    """
+    cutoff = month_start(before)
+    detached = []
+    for partition in list_partitions():
+        if partition.end is None or partition.end > cutoff:
+            continue
+        name = _quote(partition.name)
+        with database.get_conn() as conn, conn.cursor() as cur:
+            cur.execute("SET LOCAL lock_timeout = %s", (DETACH_LOCK_TIMEOUT,))
+            cur.execute(f"ALTER TABLE url_checks DETACH PARTITION {name}")
+            if drop:
+                cur.execute(f"DROP TABLE {name}")
+            conn.commit()
+        detached.append(partition.name)
+    if detached:
+        invalidate_pages()
+    return detached
@@ -0,0 +1,190 @@
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import psycopg2
+
+
+class PoolTimeoutError(Exception):
+    pass
+
+
+class ConnectionPool:
+    """Thread-safe per-process pool of psycopg2 connections.
+
+    Connections are opened lazily, so importing the app in a gunicorn
+    master (``--preload``) does not open sockets that the forked workers
+    would then share.  After a fork the child forgets every connection
+    inherited from the parent and starts with an empty pool.
+    """
+
+    def __init__(
+        self,
+        dsn,
+        *,
+        min_size=1,
+        max_size=5,
+        timeout=5.0,
+        check_idle=30.0,
+        connect=None,
+        on_checkout=None,
+    ):
+        if min_size < 0 or max_size < 1 or min_size > max_size:
+            raise ValueError("invalid pool size")
+        self.dsn = dsn
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.check_idle = check_idle
+        self._connect = connect or psycopg2.connect
+        self._on_checkout = on_checkout
+        self._reset()
+        os.register_at_fork(after_in_child=self._after_fork)
+
+    def _reset(self):
+        self._lock = threading.Condition()
+        self._pid = os.getpid()
+        self._idle = deque()
+        self._in_use = set()
+        # Connections inherited over fork are kept referenced and never
+        # closed: finalizing them would terminate the parent's sessions.
+        self._abandoned = []
+        self._counters = dict.fromkeys(
+            (
+                "created",
+                "borrowed",
+                "discarded",
+                "failed_checks",
+                "timeouts",
+                "waiting",
+            ),
+            0,
+        )
+        self._wait_time = 0.0
+
+    def _after_fork(self):
+        inherited = [conn for conn, _ in self._idle]
+        inherited.extend(self._in_use)
+        abandoned = self._abandoned
+        self._reset()
+        self._abandoned = abandoned + inherited
+
+    def _size(self):
+        return len(self._idle) + len(self._in_use)
+
+    def _open(self):
+        conn = self._connect(self.dsn)
+        self._counters["created"] += 1
+        return conn
+
+    def _is_healthy(self, conn, idle_since):
+        if conn.closed:
+            return False
+        if time.monotonic() - idle_since < self.check_idle:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+        except psycopg2.Error:
+            return False
+        return True
+
+    def _discard(self, conn):
+        self._counters["discarded"] += 1
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+
+    def _fill(self):
+        while self._size() < self.min_size:
+            self._idle.append((self._open(), time.monotonic()))
+
+    def getconn(self, timeout=None):
+        if os.getpid() != self._pid:
+            self._after_fork()
+        timeout = self.timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        with self._lock:
+            self._fill()
+            started = time.monotonic()
+            self._counters["waiting"] += 1
+            try:
+                conn = self._acquire(deadline)
+            finally:
+                self._counters["waiting"] -= 1
+                waited = time.monotonic() - started
+                self._wait_time += waited
+            self._in_use.add(conn)
+            self._counters["borrowed"] += 1
+        if self._on_checkout is not None:
+            self._on_checkout(waited)
+        return conn
+
+    def _acquire(self, deadline):
+        while True:
+            while self._idle:
+                conn, idle_since = self._idle.pop()
+                if self._is_healthy(conn, idle_since):
+                    return conn
+                self._counters["failed_checks"] += 1
+                self._discard(conn)
+            if self._size() < self.max_size:
+                return self._open()
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self._counters["timeouts"] += 1
+                raise PoolTimeoutError(
+                    f"no free connection after {self.timeout}s "
+                    f"(max_size={self.max_size})"
+                )
+            self._lock.wait(remaining)
+
+    def putconn(self, conn):
+        with self._lock:
+            if conn not in self._in_use:
+                # Borrowed before a fork: it belongs to the parent process.
+                self._abandoned.append(conn)
+                return
+            self._in_use.discard(conn)
+            if conn.closed:
+                self._discard(conn)
+            else:
+                try:
+                    conn.rollback()
+                except psycopg2.Error:
+                    self._discard(conn)
+                else:
+                    self._idle.append((conn, time.monotonic()))
+            self._lock.notify()
+
+    @contextmanager
+    def connection(self, timeout=None):
+        conn = self.getconn(timeout)
+        try:
+            with conn:
+                yield conn
+        finally:
+            self.putconn(conn)
+
+    def closeall(self):
+        with self._lock:
+            while self._idle:
+                conn, _ = self._idle.pop()
+                self._discard(conn)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "pid": self._pid,
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+                "size": self._size(),
+                "idle": len(self._idle),
+                "in_use": len(self._in_use),
+                "wait_time_total": round(self._wait_time, 6),
+                **self._counters,
+            }
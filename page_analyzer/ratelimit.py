@@ -0,0 +1,222 @@
+"""Per-host request rate limiting.
+
+Every host gets a token bucket: ``rate`` requests per second on average
+with bursts of up to ``burst`` requests.  Hosts are keyed by
+``url_utils.host_key``, so urls on different ports of one server share a
+bucket.  A ``Retry-After`` from a 429 or 503 reply blocks the host until
+that time has passed (capped at ``max_retry_after`` seconds).
+
+Limits are kept per process; separate workers each apply their own.
+"""
+
+import asyncio
+import heapq
+import itertools
+import threading
+import time
+from collections import deque
+from datetime import UTC, datetime
+from email.utils import parsedate_to_datetime
+
+from .url_utils import host_key
+
+RATE_LIMIT_STATUSES = (429, 503)
+
+
+def parse_retry_after(value, now=None):
+    """Return the delay a ``Retry-After`` header asks for, in seconds.
+
+    Both the delay-seconds and the HTTP-date forms are accepted; ``None``
+    is returned for a missing or malformed header.
+    """
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=UTC)
+    now = now or datetime.now(UTC)
+    return max(0.0, (when - now).total_seconds())
+
+
+class _Bucket:
+    __slots__ = ("blocked_until", "tokens", "updated")
+
+    def __init__(self, tokens, now):
+        self.tokens = tokens
+        self.updated = now
+        self.blocked_until = 0.0
+
+
+class HostRateLimiter:
+    """Token buckets keyed by host; ``rate <= 0`` disables the limit."""
+
+    def __init__(
+        self,
+        rate=1.0,
+        burst=2,
+        *,
+        max_retry_after=60.0,
+        max_hosts=10_000,
+        clock=time.monotonic,
+    ):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.max_retry_after = max_retry_after
+        self.max_hosts = max_hosts
+        self.clock = clock
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def _bucket(self, host, now):
+        bucket = self._buckets.get(host)
+        if bucket is None:
+            if len(self._buckets) >= self.max_hosts:
+                self._prune(now)
+            bucket = self._buckets[host] = _Bucket(self.burst, now)
+        elif self.rate > 0:
+            bucket.tokens = min(
+                self.burst,
+                bucket.tokens + (now - bucket.updated) * self.rate,
+            )
+        bucket.updated = now
+        return bucket
+
+    def _prune(self, now):
+        """Forget hosts whose bucket has refilled and is not blocked."""
+        for host, bucket in list(self._buckets.items()):
+            idle = now - bucket.updated
+            if (
+                bucket.blocked_until <= now
+                and bucket.tokens + idle * self.rate >= self.burst
+            ):
+                del self._buckets[host]
+
+    def _ready_at(self, bucket, now):
+        ready = now
+        if self.rate > 0 and bucket.tokens < 1:
+            ready += (1 - bucket.tokens) / self.rate
+        return max(ready, bucket.blocked_until)
+
+    def ready_at(self, host):
+        """Clock time at which ``host`` may be sent the next request."""
+        with self._lock:
+            now = self.clock()
+            return self._ready_at(self._bucket(host, now), now)
+
+    def take(self, host, max_wait=None):
+        """Reserve a request to ``host``; return how long to wait for it.
+
+        When the wait would be longer than ``max_wait`` nothing is
+        reserved and the wait is returned all the same.
+        """
+        with self._lock:
+            now = self.clock()
+            bucket = self._bucket(host, now)
+            ready = self._ready_at(bucket, now)
+            if max_wait is not None and ready - now > max_wait:
+                return ready - now
+            if self.rate > 0:
+                bucket.tokens -= 1
+            return ready - now
+
+    def defer(self, host, seconds):
+        """Hold requests to ``host`` back for ``seconds`` (Retry-After)."""
+        seconds = min(seconds, self.max_retry_after)
+        with self._lock:
+            now = self.clock()
+            bucket = self._bucket(host, now)
+            bucket.blocked_until = max(bucket.blocked_until, now + seconds)
+
+    def retry_after(self, url, value):
+        """Apply the ``Retry-After`` of a 429/503 reply; return the delay."""
+        delay = parse_retry_after(value)
+        if delay is not None:
+            self.defer(host_key(url), delay)
+        return delay
+
+
+class HostScheduler:
+    """Hand out queued items so that hosts take turns.
+
+    Items are kept in one queue per host.  ``get`` returns an item of the
+    host that may be contacted soonest according to the limiter, so a
+    host that is rate limited or blocked by ``Retry-After`` does not hold
+    back items for other hosts queued behind it.
+    """
+
+    def __init__(self, limiter):
+        self.limiter = limiter
+        self._queues = {}
+        self._ready = []
+        self._order = itertools.count()
+        self._size = 0
+        self._closed = False
+        self._changed = asyncio.Condition()
+
+    def __len__(self):
+        return self._size
+
+    async def put(self, item, url):
+        host = host_key(url)
+        async with self._changed:
+            queue = self._queues.get(host)
+            if queue is None:
+                queue = self._queues[host] = deque()
+                self._push(host)
+            queue.append(item)
+            self._size += 1
+            self._changed.notify_all()
+
+    async def close(self):
+        """Let ``get`` return ``None`` once the queued items are handed out."""
+        async with self._changed:
+            self._closed = True
+            self._changed.notify_all()
+
+    async def wait_below(self, size):
+        async with self._changed:
+            await self._changed.wait_for(lambda: self._size < size)
+
+    def _push(self, host):
+        ready_at = self.limiter.ready_at(host)
+        heapq.heappush(self._ready, (ready_at, next(self._order), host))
+
+    async def get(self):
+        async with self._changed:
+            while True:
+                if not self._ready:
+                    if self._closed:
+                        return None
+                    await self._changed.wait()
+                    continue
+                ready_at, _, host = self._ready[0]
+                actual = self.limiter.ready_at(host)
+                delay = actual - self.limiter.clock()
+                if delay > 0 and actual > ready_at:
+                    # Rate limited since it was queued: let others go first.
+                    heapq.heappop(self._ready)
+                    self._push(host)
+                    continue
+                if delay > 0:
+                    try:
+                        await asyncio.wait_for(self._changed.wait(), delay)
+                    except TimeoutError:
+                        pass
+                    continue
+                heapq.heappop(self._ready)
+                self.limiter.take(host)
+                queue = self._queues[host]
+                item = queue.popleft()
+                self._size -= 1
+                if queue:
+                    self._push(host)
+                else:
+                    del self._queues[host]
+                self._changed.notify_all()
+                return item
@@ -0,0 +1,188 @@
+"""DNS cache for the synchronous fetcher.
+
+``socket.getaddrinfo`` does not report record TTLs, so answers are kept
+for a fixed ``ttl``; a name that does not exist (NXDOMAIN / no data) is
+remembered for ``negative_ttl``.  Temporary resolver failures are never
+cached.  At most ``max_size`` names are kept, least recently used first
+out.
+
+``CachingHTTPAdapter`` plugs the cache into requests: its connections
+resolve through the cache and then connect to the cached addresses in
+turn, while TLS still verifies the certificate against the hostname.
+"""
+
+import socket
+import threading
+import time
+from collections import OrderedDict
+
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import (
+    ConnectTimeoutError,
+    NameResolutionError,
+    NewConnectionError,
+)
+
+from .metrics import FETCH_PHASE_SECONDS
+
+NEGATIVE_ERRORS = frozenset(
+    code
+    for code in (
+        getattr(socket, "EAI_NONAME", None),
+        getattr(socket, "EAI_NODATA", None),
+    )
+    if code is not None
+)
+
+
+class DnsCache:
+    def __init__(
+        self,
+        ttl=300.0,
+        negative_ttl=30.0,
+        max_size=1024,
+        *,
+        resolve=socket.getaddrinfo,
+        clock=time.monotonic,
+    ):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_size = max_size
+        self._resolve = resolve
+        self._clock = clock
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.negative_hits = 0
+        self.evictions = 0
+
+    def getaddrinfo(self, host, port, family=0, socktype=socket.SOCK_STREAM):
+        """Cached ``socket.getaddrinfo``; raises ``socket.gaierror``."""
+        key = (host, port, family, socktype)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > self._clock():
+                self._entries.move_to_end(key)
+                _, result = entry
+                if isinstance(result, socket.gaierror):
+                    self.negative_hits += 1
+                    raise socket.gaierror(result.errno, result.strerror)
+                self.hits += 1
+                return result
+            self.misses += 1
+        try:
+            result = self._resolve(host, port, family, socktype)
+        except socket.gaierror as error:
+            if error.errno in NEGATIVE_ERRORS and self.negative_ttl > 0:
+                self._store(key, error, self.negative_ttl)
+            raise
+        if self.ttl > 0:
+            self._store(key, result, self.ttl)
+        return result
+
+    def _store(self, key, result, ttl):
+        with self._lock:
+            self._entries[key] = (self._clock() + ttl, result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "negative_hits": self.negative_hits,
+                "evictions": self.evictions,
+            }
+
+
+class _CachingConnectionMixin:
+    dns_cache = None
+    _dns_seconds = 0.0
+
+    def connect(self):
+        # TCP connect and TLS handshake; the lookup is timed on its own.
+        started = time.perf_counter()
+        self._dns_seconds = 0.0
+        super().connect()
+        FETCH_PHASE_SECONDS.observe(
+            time.perf_counter() - started - self._dns_seconds, phase="connect"
+        )
+
+    def _new_conn(self):
+        host = self._dns_host
+        started = time.perf_counter()
+        try:
+            addresses = self.dns_cache.getaddrinfo(host, self.port)
+        except socket.gaierror as error:
+            raise NameResolutionError(self.host, self, error) from error
+        finally:
+            self._dns_seconds = time.perf_counter() - started
+            FETCH_PHASE_SECONDS.observe(self._dns_seconds, phase="dns")
+        last_error = None
+        try:
+            for *_, sockaddr in addresses:
+                # urllib3 connects to _dns_host; TLS and the Host header
+                # use the hostname again once it is restored below.
+                self._dns_host = sockaddr[0]
+                try:
+                    return super()._new_conn()
+                except (ConnectTimeoutError, NewConnectionError) as error:
+                    last_error = error
+        finally:
+            self._dns_host = host
+        if last_error is None:
+            raise NameResolutionError(
+                self.host, self, socket.gaierror("no addresses")
+            )
+        raise last_error
+
+
+def _pool_classes(dns_cache):
+    http = type(
+        "CachingHTTPConnection",
+        (_CachingConnectionMixin, HTTPConnection),
+        {"dns_cache": dns_cache},
+    )
+    https = type(
+        "CachingHTTPSConnection",
+        (_CachingConnectionMixin, HTTPSConnection),
+        {"dns_cache": dns_cache},
+    )
+    return {
+        "http": type(
+            "CachingHTTPConnectionPool",
+            (HTTPConnectionPool,),
+            {"ConnectionCls": http},
+        ),
+        "https": type(
+            "CachingHTTPSConnectionPool",
+            (HTTPSConnectionPool,),
+            {"ConnectionCls": https},
+        ),
+    }
+
+
+class CachingHTTPAdapter(HTTPAdapter):
+    """``HTTPAdapter`` whose connections resolve hosts through a cache."""
+
+    def __init__(self, dns_cache, **kwargs):
+        self.dns_cache = dns_cache
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = _pool_classes(
+            self.dns_cache
+        )
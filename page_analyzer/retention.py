@@ -0,0 +1,119 @@
+"""Retention and downsampling of url_checks.
+
+Every check is kept for ``raw_days``.  After that only the newest check
+of each url per hour is kept, and after ``hourly_days`` only the newest
+one per day.  Checks older than ``daily_days`` are deleted, except the
+latest check of a url, which conditional re-checks and the url list
+rely on.
+
+Urls are processed ``url_batch_size`` at a time and the selected checks
+are deleted in transactions of at most ``delete_batch_size`` rows, so
+locks are held only briefly and the job can run next to the web app and
+the workers.
+"""
+
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+
+from . import database
+
+
+@dataclass(frozen=True)
+class RetentionPolicy:
+    raw_days: float = 30
+    hourly_days: float = 90
+    daily_days: float | None = 365
+
+    def __post_init__(self):
+        limits = [self.raw_days, self.hourly_days]
+        if self.daily_days is not None:
+            limits.append(self.daily_days)
+        if limits[0] < 0 or limits != sorted(limits):
+            raise ValueError(
+                "expected 0 <= raw_days <= hourly_days <= daily_days"
+            )
+
+    def cutoffs(self, now):
+        """Return ``(raw_before, hourly_before, drop_before)``."""
+        return (
+            now - timedelta(days=self.raw_days),
+            now - timedelta(days=self.hourly_days),
+            None
+            if self.daily_days is None
+            else now - timedelta(days=self.daily_days),
+        )
+
+
+@dataclass
+class RetentionStats:
+    urls: int = 0
+    deleted: int = 0
+    deleted_bytes: int = 0
+    size_before: int = 0
+    size_after: int = 0
+    started: float = field(default_factory=time.monotonic)
+    finished: float | None = None
+
+    def summary(self):
+        elapsed = (self.finished or time.monotonic()) - self.started
+        return (
+            f"{self.urls} url(s) scanned in {elapsed:.1f}s, "
+            f"{self.deleted} check(s) deleted "
+            f"({_megabytes(self.deleted_bytes)} of row data freed); "
+            f"url_checks {_megabytes(self.size_before)} -> "
+            f"{_megabytes(self.size_after)} on disk"
+        )
+
+
+def _megabytes(size):
+    return f"{size / 1024 / 1024:.1f} MiB"
+
+
+def prune_checks(
+    policy,
+    *,
+    url_batch_size=100,
+    delete_batch_size=5000,
+    vacuum=False,
+    dry_run=False,
+    now=None,
+    on_batch=None,
+):
+    """Apply ``policy`` to url_checks and return ``RetentionStats``.
+
+    Space of deleted rows is reused for new checks once the table is
+    vacuumed (``vacuum=True`` or autovacuum); the files only shrink when
+    whole trailing pages become empty, so ``size_after`` often stays
+    close to ``size_before``.  With ``dry_run`` nothing is deleted and
+    ``deleted`` counts the checks that would go.
+    """
+    raw_before, hourly_before, drop_before = policy.cutoffs(
+        now or datetime.now()
+    )
+    stats = RetentionStats(size_before=database.url_checks_size())
+    max_id = database.max_url_id()
+    for start in range(1, max_id + 1, url_batch_size):
+        checks = database.find_prunable_checks(
+            start,
+            start + url_batch_size,
+            raw_before=raw_before,
+            hourly_before=hourly_before,
+            drop_before=drop_before,
+        )
+        for offset in range(0, len(checks), delete_batch_size):
+            chunk = checks[offset : offset + delete_batch_size]
+            if dry_run:
+                stats.deleted += len(chunk)
+                continue
+            deleted, size = database.delete_checks(chunk)
+            stats.deleted += deleted
+            stats.deleted_bytes += size
+        stats.urls = min(start + url_batch_size - 1, max_id)
+        if on_batch:
+            on_batch(stats)
+    if vacuum and not dry_run:
+        database.vacuum_url_checks()
+    stats.size_after = database.url_checks_size()
+    stats.finished = time.monotonic()
+    return stats
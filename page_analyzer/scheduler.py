@@ -0,0 +1,147 @@
+"""Recurring checks of the urls that have a ``check_interval``.
+
+``run_scheduler`` repeatedly claims a batch of due urls, checks them in
+a thread pool with ``run_check`` (the same fetch and parse as a queued
+check), hands the results to a ``CheckWriter`` that stores them in
+batches and sets the next check of each url one interval later.  Claiming
+uses ``FOR UPDATE SKIP LOCKED`` and leases the claimed urls, so several
+schedulers can run side by side; a url whose scheduler died is picked up
+again once its lease expires.
+
+Every next check time is shifted by up to ``jitter`` of the interval
+either way, so urls checked together drift apart instead of hitting
+their hosts in lockstep.
+"""
+
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
+from requests.exceptions import RequestException
+
+from .database import claim_due_urls, reschedule_urls
+from .metrics import registry
+from .partitions import ensure_partitions
+from .worker import PARTITIONS_INTERVAL, run_check
+from .writer import CheckWriter
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LEASE = timedelta(minutes=10)
+DEFAULT_JITTER = 0.1
+
+
+@dataclass
+class SchedulerStats:
+    checked: int = 0
+    failed: int = 0
+
+    def summary(self):
+        return f"{self.checked} url(s) checked, {self.failed} failed"
+
+
+def next_check_time(interval, now, jitter=DEFAULT_JITTER, rng=random):
+    """``now`` plus ``interval`` shifted by up to ``jitter`` of it."""
+    return now + interval * (1 + rng.uniform(-jitter, jitter))
+
+
+def _check(url_id, url, writer):
+    try:
+        run_check(url_id, url, store=writer.add)
+    except RequestException as error:
+        logger.info("scheduled check of %s failed: %s", url, error)
+        return False
+    except Exception:
+        logger.exception("scheduled check of %s crashed", url)
+        return False
+    return True
+
+
+def run_due_checks(
+    batch_size=50,
+    *,
+    concurrency=8,
+    lease=DEFAULT_LEASE,
+    jitter=DEFAULT_JITTER,
+    stats=None,
+    writer=None,
+):
+    """Check one batch of due urls; return how many were claimed.
+
+    Results go to ``writer``; without one they are written together at
+    the end of the batch.  Failed checks are rescheduled like successful
+    ones, so an unreachable site is retried on its normal interval.
+    """
+    stats = stats or SchedulerStats()
+    due = claim_due_urls(batch_size, lease)
+    if not due:
+        return 0
+    batch_writer = writer or CheckWriter(batch_size, flush_interval=None)
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = pool.map(
+            lambda row: _check(row[0], row[1], batch_writer), due
+        )
+        rescheduled = []
+        for (url_id, _, interval), ok in zip(due, results, strict=True):
+            if ok:
+                stats.checked += 1
+            else:
+                stats.failed += 1
+            rescheduled.append(
+                (url_id, next_check_time(interval, datetime.now(), jitter))
+            )
+    if writer is None:
+        batch_writer.close()
+    reschedule_urls(rescheduled)
+    return len(due)
+
+
+def run_scheduler(
+    poll_interval=5.0,
+    *,
+    batch_size=50,
+    concurrency=8,
+    lease=DEFAULT_LEASE,
+    jitter=DEFAULT_JITTER,
+    write_batch_size=500,
+    flush_interval=1.0,
+    stop=None,
+):
+    """Check due urls until ``stop`` is set; return ``SchedulerStats``.
+
+    Full batches are followed by the next one right away; otherwise the
+    scheduler waits ``poll_interval`` seconds.  Checks are written
+    ``write_batch_size`` at a time, or after ``flush_interval`` seconds.
+    Upcoming url_checks partitions are created at start and then hourly,
+    like the worker does.
+    """
+    stop = stop or threading.Event()
+    registry.start()
+    stats = SchedulerStats()
+    next_partitions = 0.0
+    with CheckWriter(write_batch_size, flush_interval) as writer:
+        while not stop.is_set():
+            if time.monotonic() >= next_partitions:
+                for name in ensure_partitions():
+                    logger.info("created partition %s", name)
+                next_partitions = time.monotonic() + PARTITIONS_INTERVAL
+            claimed = run_due_checks(
+                batch_size=batch_size,
+                concurrency=concurrency,
+                lease=lease,
+                jitter=jitter,
+                stats=stats,
+                writer=writer,
+            )
+            if claimed:
+                logger.info(
+                    "%s; %s url(s) in last batch", stats.summary(), claimed
+                )
+            if claimed < batch_size:
+                stop.wait(poll_interval)
+            registry.flush()
+    return stats
@@ -0,0 +1,235 @@
+"""Incremental extraction of the SEO tags a check stores.
+
+``SeoParser`` is fed HTML in pieces and picks out the first ``<h1>``, the
+first ``<title>`` and the first ``<meta name="description">`` the same
+way ``parse_seo`` reads them from a BeautifulSoup ``html.parser`` tree:
+
+* the text of an element is the concatenation of its text nodes, each
+  stripped of surrounding whitespace; text inside ``script``, ``style``,
+  ``template``, ``rt`` and ``rp`` is not part of it;
+* an element ends at its own end tag or at the end tag of any element
+  that was open before it; stray end tags are ignored;
+* an element without text gives ``""``, a missing element ``None``;
+* the description is the stripped ``content`` of the first meta tag
+  whose ``name`` is exactly ``description``, or ``None`` when that
+  content is missing or empty.
+
+Character references are decoded as ``html.unescape`` does.  NUL
+characters are removed from every value: PostgreSQL cannot store them.
+
+``extract_seo_lxml`` reads the same values from an lxml tree.  It is only
+available when lxml is installed.  It agrees with the rules above on
+well-formed pages; on badly nested markup it follows libxml2's error
+recovery, and markup inside ``<title>`` is kept as text.
+"""
+
+from html.parser import HTMLParser
+
+try:
+    from lxml import etree
+except ImportError:  # pragma: no cover - lxml is an optional extra
+    etree = None
+
+LXML_AVAILABLE = etree is not None
+
+VOID_ELEMENTS = frozenset(
+    {
+        "area",
+        "base",
+        "basefont",
+        "bgsound",
+        "br",
+        "col",
+        "command",
+        "embed",
+        "frame",
+        "hr",
+        "image",
+        "img",
+        "input",
+        "isindex",
+        "keygen",
+        "link",
+        "menuitem",
+        "meta",
+        "nextid",
+        "param",
+        "source",
+        "spacer",
+        "track",
+        "wbr",
+    }
+)
+STRING_CONTAINERS = frozenset({"rp", "rt", "script", "style", "template"})
+TEXT_FIELDS = ("h1", "title")
+
+
+def clean_text(text):
+    """Remove NUL characters, which PostgreSQL text cannot hold."""
+    return text.replace("\x00", "")
+
+
+class SeoParser(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.h1 = None
+        self.title = None
+        self.description = None
+        self.body_closed = False
+        self._stack = []
+        self._containers = 0
+        self._already_closed = []
+        self._data = []
+        self._open = {}
+        self._found = set()
+
+    @property
+    def found_all(self):
+        return len(self._found) == len(TEXT_FIELDS) + 1
+
+    @property
+    def done(self):
+        """True once further markup cannot change the result."""
+        return self.found_all or self.body_closed
+
+    def result(self):
+        return self.h1, self.title, self.description
+
+    def close(self):
+        super().close()
+        self._end_data()
+        for field in list(self._open):
+            self._finish(field)
+
+    def _end_data(self, *, cdata=False):
+        if not self._data:
+            return
+        text = "".join(self._data).strip()
+        self._data = []
+        if text and (cdata or not self._containers):
+            for pieces in self._open.values():
+                pieces[1].append(text)
+
+    def _finish(self, field):
+        _, pieces = self._open.pop(field)
+        setattr(self, field, "".join(pieces))
+        self._found.add(field)
+
+    def _push(self, tag):
+        self._stack.append(tag)
+        if tag in STRING_CONTAINERS:
+            self._containers += 1
+        if tag in TEXT_FIELDS and tag not in self._found | set(self._open):
+            self._open[tag] = (len(self._stack) - 1, [])
+
+    def _pop_to(self, tag):
+        if tag not in self._stack:
+            return
+        index = len(self._stack) - 1 - self._stack[::-1].index(tag)
+        for popped in self._stack[index:]:
+            if popped in STRING_CONTAINERS:
+                self._containers -= 1
+        del self._stack[index:]
+        for field, (depth, _) in list(self._open.items()):
+            if depth >= index:
+                self._finish(field)
+
+    def _start(self, tag, attrs):
+        self._end_data()
+        self._push(tag)
+        if tag == "meta" and "description" not in self._found:
+            values = {key: value or "" for key, value in attrs}
+            if values.get("name") == "description":
+                content = values.get("content")
+                self.description = (
+                    clean_text(content).strip() if content else None
+                )
+                self._found.add("description")
+
+    def _end(self, tag):
+        self._end_data()
+        self._pop_to(tag)
+        if tag == "body":
+            self.body_closed = True
+
+    def handle_starttag(self, tag, attrs):
+        self._start(tag, attrs)
+        if tag in VOID_ELEMENTS:
+            self._end(tag)
+            self._already_closed.append(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        self._start(tag, attrs)
+        self._end(tag)
+
+    def handle_endtag(self, tag):
+        if tag in self._already_closed:
+            self._already_closed.remove(tag)
+        else:
+            self._end(tag)
+
+    def handle_data(self, data):
+        self._data.append(clean_text(data))
+
+    def handle_comment(self, data):
+        self._end_data()
+
+    def handle_decl(self, decl):
+        self._end_data()
+
+    def handle_pi(self, data):
+        self._end_data()
+
+    def unknown_decl(self, data):
+        self._end_data()
+        if data.upper().startswith("CDATA["):
+            self._data.append(clean_text(data[len("CDATA[") :]))
+            self._end_data(cdata=True)
+
+
+def extract_seo(html, chunk_size=16384):
+    """Return ``(h1, title, description)`` for a complete document.
+
+    The document is fed in chunks and parsing stops as soon as all three
+    values are known.
+    """
+    parser = SeoParser()
+    for start in range(0, len(html), chunk_size):
+        parser.feed(html[start : start + chunk_size])
+        if parser.found_all:
+            break
+    parser.close()
+    return parser.result()
+
+
+def _lxml_text(element):
+    pieces = []
+
+    def visit(node, skip):
+        skip = skip or node.tag in STRING_CONTAINERS
+        if isinstance(node.tag, str) and node.text and not skip:
+            pieces.append(clean_text(node.text).strip())
+        for child in node:
+            visit(child, skip)
+            if child.tail and not skip:
+                pieces.append(clean_text(child.tail).strip())
+
+    visit(element, skip=False)
+    return "".join(pieces)
+
+
+def extract_seo_lxml(html):
+    """Return ``(h1, title, description)`` using lxml's HTML parser."""
+    parser = etree.HTMLParser(encoding="utf-8")
+    root = etree.fromstring(html.encode("utf-8", "replace"), parser)
+    if root is None:
+        return None, None, None
+    h1 = root.find(".//h1")
+    title = root.find(".//title")
+    meta = next(root.iterfind(".//meta[@name='description']"), None)
+    content = None if meta is None else meta.get("content")
+    return (
+        None if h1 is None else _lxml_text(h1),
+        None if title is None else _lxml_text(title),
+        clean_text(content).strip() if content else None,
+    )
@@ -1,16 +1,87 @@
-from urllib.parse import urlparse
+import os
+import re
+from functools import lru_cache
+from urllib.parse import urlsplit
 
+import idna
 import validators
 
 DEFAULT_MAX_LENGTH = 255
+VALIDATION_CACHE_SIZE = int(os.getenv("URL_VALIDATION_CACHE_SIZE", "4096"))
+DEFAULT_PORTS = {"http": 80, "https": 443}
+MAX_LABEL_LENGTH = 63
+
+# Shape every url accepted by validators.url has: a scheme, "://", a
+# non-empty authority and no whitespace.  Strings failing it are
+# rejected without running the full validator.
+URL_SHAPE_RE = re.compile(r"[A-Za-z][A-Za-z0-9+.\-]*://[^\s/?#]\S*")
 
 
 def validate_url(url: str, max_length: int = DEFAULT_MAX_LENGTH) -> bool:
     if not url or len(url) > max_length:
         return False
-    return validators.url(url) is True
+    return _validate(url)
+
+
+@lru_cache(maxsize=VALIDATION_CACHE_SIZE)
+def _validate(url):
+    if not URL_SHAPE_RE.fullmatch(url):
+        return False
+    if validators.url(url) is not True:
+        return False
+    try:
+        return _encode_host(urlsplit(url).hostname or "") is not None
+    except ValueError:
+        return False
 
 
 def normalize_url(url: str) -> str:
-    parsed = urlparse(url)
-    return f"{parsed.scheme}://{parsed.netloc}"
\ No newline at end of file
+    """Scheme and host of ``url`` in canonical form.
+
+    The scheme and host are lowercased, an internationalized host is
+    IDNA-encoded and the default port of the scheme is dropped, so
+    ``HTTPS://Пример.рф:443/path`` becomes ``https://xn--e1afmkfd.xn--p1ai``.
+    Raises ``ValueError`` for a host that has no IDNA form; such urls
+    do not pass ``validate_url``.
+    """
+    parsed = urlsplit(url)
+    scheme = parsed.scheme.lower()
+    host = _encode_host(parsed.hostname or "")
+    if host is None:
+        raise ValueError(f"invalid host in {url!r}")
+    if ":" in host:
+        host = f"[{host}]"
+    try:
+        port = parsed.port
+    except ValueError:
+        return f"{scheme}://{parsed.netloc.lower()}"
+    if port is not None and port != DEFAULT_PORTS.get(scheme):
+        host = f"{host}:{port}"
+    userinfo, at, _ = parsed.netloc.rpartition("@")
+    return f"{scheme}://{userinfo}{at}{host}"
+
+
+def _encode_host(host):
+    """``host`` lowercased and, when not ASCII, encoded with IDNA 2008.
+
+    UTS #46 mapping folds case and width but keeps "ß" and "ς", unlike
+    the IDNA 2003 ``idna`` codec.  Returns None when a label is longer
+    than DNS allows or the host cannot be encoded.
+    """
+    if not host.isascii():
+        try:
+            host = idna.encode(host, uts46=True).decode("ascii")
+        except UnicodeError:
+            return None
+    if any(len(label) > MAX_LABEL_LENGTH for label in host.split(".")):
+        return None
+    return host.lower()
+
+
+def host_key(url: str) -> str:
+    """Host a url is served from: lowercased, without port or userinfo."""
+    try:
+        url = normalize_url(url)
+    except ValueError:
+        pass
+    return urlsplit(url).hostname or ""
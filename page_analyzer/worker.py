@@ -0,0 +1,134 @@
+import logging
+import os
+import socket
+import threading
+import time
+from datetime import datetime, timedelta
+
+from requests.exceptions import RequestException
+
+from .database import (
+    claim_check_job,
+    fetch_last_check,
+    finish_check_job,
+    has_live_worker,
+    insert_url_check,
+    record_worker_heartbeat,
+    remove_worker_heartbeat,
+    requeue_stale_check_jobs,
+)
+from .metrics import registry
+from .parser import LastCheck, check_page
+from .partitions import ensure_partitions
+
+logger = logging.getLogger(__name__)
+
+CHECK_TIMEOUT = 10
+PARTITIONS_INTERVAL = 3600
+HEARTBEAT_INTERVAL = 10
+# A worker silent for this long is taken for dead.
+HEARTBEAT_TIMEOUT = 3 * HEARTBEAT_INTERVAL
+# Heartbeat rows left by crashed workers are deleted after a day.
+HEARTBEAT_FORGET_AFTER = timedelta(days=1)
+
+
+def worker_alive():
+    """Whether a worker has sent a heartbeat in ``HEARTBEAT_TIMEOUT``."""
+    return has_live_worker(
+        datetime.now() - timedelta(seconds=HEARTBEAT_TIMEOUT)
+    )
+
+
+def run_check(url_id, url, timeout=CHECK_TIMEOUT, store=None):
+    """Fetch ``url``, extract its SEO tags and store the check.
+
+    The check is passed to ``store``, ``insert_url_check`` by default,
+    and its return value is returned.
+    """
+    store = store or insert_url_check
+    last_check = fetch_last_check(url_id)
+    result = check_page(
+        url,
+        timeout=timeout,
+        last_check=last_check and LastCheck(*last_check),
+    )
+    if result.unchanged:
+        logger.debug("%s is unchanged since the last check", url)
+    return store(
+        url_id,
+        result.status_code,
+        result.h1,
+        result.title,
+        result.description,
+        etag=result.etag,
+        last_modified=result.last_modified,
+        content_hash=result.content_hash,
+    )
+
+
+def process_next_job():
+    """Run the oldest queued check; return ``False`` if there was none."""
+    job = claim_check_job()
+    if job is None:
+        return False
+    job_id, url_id, url = job
+    try:
+        check_id = run_check(url_id, url)
+    except RequestException as error:
+        logger.info("check job %s for %s failed: %s", job_id, url, error)
+        finish_check_job(job_id, error=str(error) or type(error).__name__)
+    except Exception as error:
+        logger.exception("check job %s for %s crashed", job_id, url)
+        finish_check_job(job_id, error=type(error).__name__)
+    else:
+        finish_check_job(job_id, url_check_id=check_id)
+    return True
+
+
+def run_worker(
+    poll_interval=1.0,
+    stale_after=120.0,
+    max_attempts=3,
+    stop=None,
+):
+    """Process check jobs until ``stop`` is set.
+
+    The queue is drained without sleeping; once it is empty the worker
+    polls every ``poll_interval`` seconds.  Jobs left running for longer
+    than ``stale_after`` seconds (their worker died) are re-queued.
+    Upcoming url_checks partitions are created at start and then hourly.
+    A heartbeat is recorded every ``HEARTBEAT_INTERVAL`` seconds and
+    removed on exit, so the web app knows whether jobs will be run.
+    """
+    stop = stop or threading.Event()
+    registry.start()
+    worker_name = f"{socket.gethostname()}:{os.getpid()}"
+    try:
+        _work(worker_name, poll_interval, stale_after, max_attempts, stop)
+    finally:
+        remove_worker_heartbeat(worker_name)
+
+
+def _work(worker_name, poll_interval, stale_after, max_attempts, stop):
+    next_heartbeat = 0.0
+    next_reap = 0.0
+    next_partitions = 0.0
+    while not stop.is_set():
+        if time.monotonic() >= next_heartbeat:
+            record_worker_heartbeat(
+                worker_name, datetime.now() - HEARTBEAT_FORGET_AFTER
+            )
+            next_heartbeat = time.monotonic() + HEARTBEAT_INTERVAL
+        if time.monotonic() >= next_partitions:
+            for name in ensure_partitions():
+                logger.info("created partition %s", name)
+            next_partitions = time.monotonic() + PARTITIONS_INTERVAL
+        if time.monotonic() >= next_reap:
+            started_before = datetime.now() - timedelta(seconds=stale_after)
+            requeued = requeue_stale_check_jobs(started_before, max_attempts)
+            if requeued:
+                logger.warning("re-queued %s stale check job(s)", requeued)
+            next_reap = time.monotonic() + stale_after
+        if not process_next_job():
+            stop.wait(poll_interval)
+        registry.flush()
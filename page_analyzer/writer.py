@@ -0,0 +1,188 @@
+"""Buffered writing of check results.
+
+``insert_url_check`` costs a pooled connection, an INSERT, an UPDATE and
+a commit per check.  ``CheckWriter`` collects checks and writes them with
+``insert_url_checks``: one transaction and two ``execute_values``
+statements per batch.  A batch is written when ``batch_size`` checks
+are waiting, when the oldest has waited ``flush_interval`` seconds
+(checked on every ``add`` and by a background thread; never when
+``flush_interval`` is None) and on ``close``.
+
+When the database is unavailable, the rows of the failed write go back
+into the buffer and are retried with the next batch.  Once
+``max_pending`` rows are waiting, ``add`` raises instead of buffering
+more.  Any other error comes from the rows themselves and would fail
+every retry, so the batch is written again row by row and the rows that
+still fail are logged and dropped.
+"""
+
+import logging
+import threading
+import time
+from datetime import datetime
+
+from .database import insert_url_checks, is_transient_error
+
+logger = logging.getLogger(__name__)
+
+
+class WriterBacklogError(RuntimeError):
+    """Too many checks are waiting for the database."""
+
+
+class CheckWriter:
+    def __init__(
+        self,
+        batch_size=500,
+        flush_interval=1.0,
+        *,
+        max_pending=None,
+        write=None,
+        clock=time.monotonic,
+    ):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending or batch_size * 10
+        self.written = 0
+        self.failures = 0
+        self.dropped = 0
+        self._write = write or insert_url_checks
+        self._clock = clock
+        self._rows = []
+        self._oldest = None
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._timer = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    @property
+    def pending(self):
+        return len(self._rows)
+
+    def start(self):
+        """Flush due batches from a background thread until ``close``."""
+        if self._timer is None and self.flush_interval:
+            self._timer = threading.Thread(
+                target=self._run_timer, name="check-writer", daemon=True
+            )
+            self._timer.start()
+
+    def add(
+        self,
+        url_id,
+        status_code,
+        h1,
+        title,
+        description,
+        *,
+        etag=None,
+        last_modified=None,
+        content_hash=None,
+        created_at=None,
+    ):
+        """Buffer one check, writing the batch if it is due."""
+        row = (
+            url_id,
+            status_code,
+            h1,
+            title,
+            description,
+            created_at or datetime.now(),
+            etag,
+            last_modified,
+            content_hash,
+        )
+        with self._lock:
+            if len(self._rows) >= self.max_pending:
+                raise WriterBacklogError(
+                    f"{len(self._rows)} checks are waiting to be written"
+                )
+            self._rows.append(row)
+            if self._oldest is None:
+                self._oldest = self._clock()
+        if self._due():
+            self._try_flush()
+
+    def flush(self):
+        """Write the buffered checks; return how many were written.
+
+        If the database is unavailable the rows are put back in front of
+        the buffer and the error is raised.  On any other error the rows
+        are written one at a time and those that fail are dropped.
+        """
+        with self._write_lock:
+            with self._lock:
+                rows, self._rows = self._rows, []
+                oldest, self._oldest = self._oldest, None
+            if not rows:
+                return 0
+            try:
+                self._write(rows)
+            except Exception as error:
+                self.failures += 1
+                if is_transient_error(error):
+                    self._requeue(rows, oldest)
+                    raise
+                return self._write_each(rows, oldest)
+            self.written += len(rows)
+            return len(rows)
+
+    def _requeue(self, rows, oldest):
+        with self._lock:
+            self._rows[:0] = rows
+            self._oldest = oldest
+
+    def _write_each(self, rows, oldest):
+        written = 0
+        for index, row in enumerate(rows):
+            try:
+                self._write([row])
+            except Exception as error:
+                if is_transient_error(error):
+                    self._requeue(rows[index:], oldest)
+                    raise
+                self.dropped += 1
+                logger.exception(
+                    "dropping check of url %s that cannot be written", row[0]
+                )
+            else:
+                written += 1
+                self.written += 1
+        return written
+
+    def close(self):
+        """Stop the background thread and write what is left."""
+        self._stop.set()
+        if self._timer is not None:
+            self._timer.join()
+            self._timer = None
+        self.flush()
+
+    def _due(self):
+        with self._lock:
+            return len(self._rows) >= self.batch_size or bool(
+                self.flush_interval
+                and self._oldest is not None
+                and self._clock() - self._oldest >= self.flush_interval
+            )
+
+    def _try_flush(self):
+        try:
+            self.flush()
+        except Exception:
+            logger.exception(
+                "writing %s check(s) failed, will retry", self.pending
+            )
+
+    def _run_timer(self):
+        while not self._stop.wait(self.flush_interval / 2):
+            if self._due():
+                self._try_flush()
@@ -0,0 +1,164 @@
+import importlib
+import json
+from datetime import datetime, timedelta
+
+import pytest
+import test_app_index as app_index
+
+api = importlib.import_module("page_analyzer.api")
+database = importlib.import_module("page_analyzer.database")
+
+OK_STATUS = 200
+BAD_REQUEST_STATUS = 400
+NOT_FOUND_STATUS = 404
+URL_ID = 3
+CREATED_AT = datetime(2024, 6, 1, 12, 0)
+URL_ROW = (
+    URL_ID,
+    "https://example.com",
+    CREATED_AT,
+    None,
+    None,
+    timedelta(hours=6),
+    None,
+)
+
+
+@pytest.fixture
+def queries(monkeypatch):
+    """Record the queries of the views.
+
+    Queries on url_checks are answered with ``checks``, the others with
+    ``rows``.
+    """
+    executed = {"fetch": [], "stream": [], "rows": [], "checks": []}
+
+    def answer(query):
+        return executed["checks" if "url_checks" in query else "rows"]
+
+    def fetch(query, params=()):
+        executed["fetch"].append((query, params))
+        return answer(query)
+
+    def stream(query, params=(), itersize=None):
+        executed["stream"].append((query, params, itersize))
+        yield from answer(query)
+
+    monkeypatch.setattr(api, "fetch_rows", fetch)
+    monkeypatch.setattr(api, "stream_rows", stream)
+    return executed
+
+
+@pytest.fixture
+def args(monkeypatch):
+    def set_args(**values):
+        monkeypatch.setattr(app_index.request, "args", values)
+
+    set_args()
+    return set_args
+
+
+def test_urls_page_selects_fields_and_returns_cursor(queries):
+    queries["rows"] = [(id_, f"https://{id_}.com") for id_ in (9, 8, 7)]
+    client = app_index.app.app.test_client()
+
+    response = client.get(
+        "/api/v1/urls", query_string={"fields": "name", "limit": "2"}
+    )
+
+    assert response.status_code == OK_STATUS
+    assert response.data == {
+        "items": [{"name": "https://9.com"}, {"name": "https://8.com"}],
+        "next_cursor": "8",
+    }
+    query, params = queries["fetch"][0]
+    assert query == "SELECT id, name FROM urls ORDER BY id DESC LIMIT %s"
+    assert params == (3,)
+
+
+def test_urls_page_continues_before_cursor(queries, args):
+    args(before="8")
+
+    assert api.urls() == {"items": [], "next_cursor": None}
+    query, params = queries["fetch"][0]
+    assert "WHERE id < %s" in query
+    assert params == (8, api.API_PAGE_SIZE + 1)
+
+
+@pytest.mark.parametrize(
+    "query_string",
+    [{"fields": "id,password"}, {"limit": "0"}, {"before": "x"}],
+)
+def test_urls_rejects_bad_arguments(queries, query_string):
+    client = app_index.app.app.test_client()
+
+    response = client.get("/api/v1/urls", query_string=query_string)
+
+    assert response.status_code == BAD_REQUEST_STATUS
+    assert "error" in response.data
+    assert queries["fetch"] == []
+
+
+def test_url_serializes_dates_and_intervals(queries):
+    queries["rows"] = [URL_ROW]
+
+    data = api.url(URL_ID)
+
+    assert data["created_at"] == "2024-06-01T12:00:00"
+    assert data["check_interval"] == timedelta(hours=6).total_seconds()
+    assert queries["fetch"][0][1] == (URL_ID,)
+
+
+def test_url_not_found(queries):
+    assert api.url(URL_ID) == ({"error": "url not found"}, NOT_FOUND_STATUS)
+
+
+def test_checks_stream_as_ndjson_without_long_texts(queries, args):
+    args(format="ndjson", fields="id,status_code")
+    queries["rows"] = [(URL_ID,)]
+    queries["checks"] = [(CREATED_AT, 2, OK_STATUS), (CREATED_AT, 1, OK_STATUS)]
+
+    response = api.url_checks(URL_ID)
+
+    lines = list(response.data)
+    assert response.mimetype == api.NDJSON
+    assert [json.loads(line) for line in lines] == [
+        {"id": 2, "status_code": OK_STATUS},
+        {"id": 1, "status_code": OK_STATUS},
+    ]
+    query, params, itersize = queries["stream"][0]
+    assert query.startswith("SELECT created_at, id, status_code FROM")
+    assert "LIMIT" not in query
+    assert params == (URL_ID,)
+    assert itersize == api.STREAM_ITERSIZE
+
+
+def test_checks_page_cursor_is_created_at_and_id(queries, args):
+    args(limit="1", before="2024-06-02T00:00:00_5", fields="id")
+    queries["rows"] = [(URL_ID,)]
+    queries["checks"] = [(CREATED_AT, 4), (CREATED_AT, 3)]
+
+    data = api.url_checks(URL_ID)
+
+    assert data == {
+        "items": [{"id": 4}],
+        "next_cursor": "2024-06-01T12:00:00_4",
+    }
+    _, params = queries["fetch"][-1]
+    assert params == (
+        URL_ID,
+        datetime(2024, 6, 2),
+        datetime(2024, 6, 2),
+        5,
+        2,
+    )
+
+
+def test_checks_query_only_reads_requested_columns():
+    query, params = database.checks_query(URL_ID, ["id", "title"], limit=10)
+
+    assert query == (
+        "SELECT id, title FROM url_checks WHERE url_id = %s "
+        "ORDER BY created_at DESC, id DESC LIMIT %s"
+    )
+    assert params == (URL_ID, 10)
@@ -2,15 +2,12 @@ import importlib.util
 from pathlib import Path
 
 REDIRECT = 302
-HTTP_OK = 200
-DEFAULT_TIMEOUT = 10
 
 EXAMPLE_ID_1 = 1
 EXAMPLE_ID_2 = 2
 INITIAL_CALL_COUNT = 0
 
 EXAMPLE_URL = "https://example.com"
-EXAMPLE_HTML = "<h1>h</h1>"
 
 LOCATION_URLS = "/urls"
 LOCATION_URLS_ID_1 = "/urls/1"
@@ -35,18 +32,15 @@ def test_missing_url_redirects(monkeypatch):
     def fake_flash(message, category=None):
         messages.append((message, category))
 
-    def fake_fetch_url(_id):
+    def fake_find_url(_id):
         assert _id == EXAMPLE_ID_1
-        return None, []
 
     def never_called(*args, **kwargs):
         raise AssertionError("should not be called")
 
     monkeypatch.setattr(app, "flash", fake_flash)
-    monkeypatch.setattr(app, "fetch_url", fake_fetch_url)
-    monkeypatch.setattr(app, "fetch_html", never_called)
-    monkeypatch.setattr(app, "parse_seo", never_called)
-    monkeypatch.setattr(app, "insert_url_check", never_called)
+    monkeypatch.setattr(app, "find_url_by_id", fake_find_url)
+    monkeypatch.setattr(app, "run_check", never_called)
 
     response = app.create_check(EXAMPLE_ID_1)
 
@@ -62,33 +56,22 @@ def test_successful_check(monkeypatch):
     def fake_flash(message, category=None):
         messages.append((message, category))
 
-    def fake_fetch_url(_id):
+    def fake_find_url(_id):
         assert _id == EXAMPLE_ID_1
-        return (EXAMPLE_ID_1, EXAMPLE_URL), []
+        return EXAMPLE_ID_1, EXAMPLE_URL
 
-    def fake_fetch_html(url, timeout):
-        assert url == EXAMPLE_URL
-        assert timeout == DEFAULT_TIMEOUT
-        return EXAMPLE_HTML, HTTP_OK
-
-    def fake_parse_seo(html):
-        assert html == EXAMPLE_HTML
-        return "h", "title", "desc"
-
-    def fake_insert_url_check(url_id, status_code, h1, title, description):
-        inserted["data"] = (url_id, status_code, h1, title, description)
+    def fake_run_check(url_id, url):
+        inserted["data"] = (url_id, url)
 
     monkeypatch.setattr(app, "flash", fake_flash)
-    monkeypatch.setattr(app, "fetch_url", fake_fetch_url)
-    monkeypatch.setattr(app, "fetch_html", fake_fetch_html)
-    monkeypatch.setattr(app, "parse_seo", fake_parse_seo)
-    monkeypatch.setattr(app, "insert_url_check", fake_insert_url_check)
+    monkeypatch.setattr(app, "find_url_by_id", fake_find_url)
+    monkeypatch.setattr(app, "run_check", fake_run_check)
 
     response = app.create_check(EXAMPLE_ID_1)
 
     assert response.status_code == REDIRECT
     assert response.headers["Location"].endswith(LOCATION_URLS_ID_1)
-    assert inserted["data"] == (EXAMPLE_ID_1, HTTP_OK, "h", "title", "desc")
+    assert inserted["data"] == (EXAMPLE_ID_1, EXAMPLE_URL)
     assert messages == [(MSG_SUCCESS, "success")]
 
 
@@ -99,28 +82,96 @@ def test_request_exception(monkeypatch):
     def fake_flash(message, category=None):
         messages.append((message, category))
 
-    def fake_fetch_url(_id):
+    def fake_find_url(_id):
         assert _id == EXAMPLE_ID_2
-        return (EXAMPLE_ID_2, EXAMPLE_URL), []
+        return EXAMPLE_ID_2, EXAMPLE_URL
 
-    def failing_fetch_html(*args, **kwargs):
+    def failing_run_check(*args, **kwargs):
+        called["count"] += 1
         raise app.RequestException("boom")
 
-    def fake_insert_url_check(*args, **kwargs):
-        called["count"] += 1
+    monkeypatch.setattr(app, "flash", fake_flash)
+    monkeypatch.setattr(app, "find_url_by_id", fake_find_url)
+    monkeypatch.setattr(app, "run_check", failing_run_check)
+
+    response = app.create_check(EXAMPLE_ID_2)
+
+    assert response.status_code == REDIRECT
+    assert response.headers["Location"].endswith(LOCATION_URLS_ID_2)
+    assert called["count"] == INITIAL_CALL_COUNT + 1
+    assert messages == [(MSG_ERROR, "danger")]
+
+
+MSG_QUEUED = "Проверка поставлена в очередь"
+MSG_ALREADY_QUEUED = "Проверка уже выполняется"
+JOB_ID = 42
+
+
+def _enable_queue(monkeypatch, enqueued, job_id):
+    messages = []
+
+    def fake_enqueue(url_id):
+        enqueued.append(url_id)
+        return job_id
 
     def never_called(*args, **kwargs):
         raise AssertionError("should not be called")
 
+    monkeypatch.setitem(app.app.config, "CHECKS_ASYNC", value=True)
+    def fake_flash(message, category=None):
+        messages.append((message, category))
+
     monkeypatch.setattr(app, "flash", fake_flash)
-    monkeypatch.setattr(app, "fetch_url", fake_fetch_url)
-    monkeypatch.setattr(app, "fetch_html", failing_fetch_html)
-    monkeypatch.setattr(app, "parse_seo", never_called)
-    monkeypatch.setattr(app, "insert_url_check", fake_insert_url_check)
+    monkeypatch.setattr(app, "find_url_by_id", lambda _id: (_id, EXAMPLE_URL))
+    monkeypatch.setattr(app, "enqueue_check", fake_enqueue)
+    monkeypatch.setattr(app, "run_check", never_called)
+    return messages
 
-    response = app.create_check(EXAMPLE_ID_2)
+
+def test_check_is_queued_when_async(monkeypatch):
+    enqueued = []
+    messages = _enable_queue(monkeypatch, enqueued, JOB_ID)
+
+    response = app.create_check(EXAMPLE_ID_1)
 
     assert response.status_code == REDIRECT
-    assert response.headers["Location"].endswith(LOCATION_URLS_ID_2)
-    assert called["count"] == INITIAL_CALL_COUNT
-    assert messages == [(MSG_ERROR, "danger")]
+    assert response.headers["Location"].endswith(LOCATION_URLS_ID_1)
+    assert enqueued == [EXAMPLE_ID_1]
+    assert messages == [(MSG_QUEUED, "info")]
+
+
+def test_check_already_queued(monkeypatch):
+    enqueued = []
+    messages = _enable_queue(monkeypatch, enqueued, None)
+
+    response = app.create_check(EXAMPLE_ID_1)
+
+    assert response.status_code == REDIRECT
+    assert messages == [(MSG_ALREADY_QUEUED, "info")]
+
+
+def test_check_is_queued_by_default_while_a_worker_runs(monkeypatch):
+    enqueued = []
+    messages = _enable_queue(monkeypatch, enqueued, JOB_ID)
+    monkeypatch.setitem(app.app.config, "CHECKS_ASYNC", None)
+    monkeypatch.setattr(app, "worker_alive", lambda: True)
+
+    app.create_check(EXAMPLE_ID_1)
+
+    assert enqueued == [EXAMPLE_ID_1]
+    assert messages == [(MSG_QUEUED, "info")]
+
+
+def test_check_runs_in_request_by_default_without_a_worker(monkeypatch):
+    checked = []
+    messages = _enable_queue(monkeypatch, [], JOB_ID)
+    monkeypatch.setitem(app.app.config, "CHECKS_ASYNC", None)
+    monkeypatch.setattr(app, "worker_alive", lambda: False)
+    monkeypatch.setattr(
+        app, "run_check", lambda url_id, url: checked.append(url_id)
+    )
+
+    app.create_check(EXAMPLE_ID_1)
+
+    assert checked == [EXAMPLE_ID_1]
+    assert messages == [(MSG_SUCCESS, "success")]
@@ -6,7 +6,17 @@ from pathlib import Path
 import pytest
 
 ns = types.SimpleNamespace
-sys.modules["psycopg2"] = ns(connect=lambda *_, **__: None)
+sys.modules["psycopg2"] = ns(
+    connect=lambda *_, **__: None,
+    Error=type("Error", (Exception,), {}),
+)
+sys.modules["psycopg2"].OperationalError = type(
+    "OperationalError", (sys.modules["psycopg2"].Error,), {}
+)
+sys.modules["psycopg2"].InterfaceError = type(
+    "InterfaceError", (sys.modules["psycopg2"].Error,), {}
+)
+sys.modules["psycopg2.extras"] = ns(execute_values=lambda *_, **__: None)
 sys.modules["dotenv"] = ns(load_dotenv=lambda *_, **__: None)
 
 validators_stub = types.ModuleType("validators")
@@ -18,8 +28,38 @@ requests_stub.get = lambda *args, **kwargs: None
 exceptions_stub = types.ModuleType("requests.exceptions")
 exceptions_stub.RequestException = Exception
 requests_stub.exceptions = exceptions_stub
+adapters_stub = types.ModuleType("requests.adapters")
+
+
+class HTTPAdapter:
+    def __init__(self, **kwargs):
+        self.kwargs = kwargs
+
+
+adapters_stub.HTTPAdapter = HTTPAdapter
+requests_stub.adapters = adapters_stub
 sys.modules["requests"] = requests_stub
 sys.modules["requests.exceptions"] = exceptions_stub
+sys.modules["requests.adapters"] = adapters_stub
+
+retry_stub = types.ModuleType("urllib3.util.retry")
+retry_stub.Retry = lambda **kwargs: None
+sys.modules["urllib3"] = types.ModuleType("urllib3")
+sys.modules["urllib3.util"] = types.ModuleType("urllib3.util")
+sys.modules["urllib3.util.retry"] = retry_stub
+for name, attrs in {
+    "urllib3.connection": ("HTTPConnection", "HTTPSConnection"),
+    "urllib3.connectionpool": ("HTTPConnectionPool", "HTTPSConnectionPool"),
+    "urllib3.exceptions": (
+        "ConnectTimeoutError",
+        "NameResolutionError",
+        "NewConnectionError",
+    ),
+}.items():
+    stub = types.ModuleType(name)
+    for attr in attrs:
+        setattr(stub, attr, type(attr, (Exception,), {}))
+    sys.modules[name] = stub
 
 bs4_stub = types.ModuleType("bs4")
 bs4_stub.BeautifulSoup = lambda *args, **kwargs: None
@@ -30,16 +70,35 @@ _flask.current_app = None
 
 
 class Response:
-    def __init__(self, data="", status=200, headers=None):
+    def __init__(
+        self,
+        data="",
+        status=200,
+        headers=None,
+        mimetype=None,
+        content_type=None,
+    ):
         self.data = data.encode() if isinstance(data, str) else data
         self.status_code = status
         self.headers = headers or {}
+        self.mimetype = mimetype
+        self.content_type = content_type or mimetype
+
+
+class AppGlobals(types.SimpleNamespace):
+    def pop(self, name, default=None):
+        return self.__dict__.pop(name, default)
 
 
 class Request:
     def __init__(self):
         self.method = "GET"
+        self.path = "/"
         self.form = {}
+        self.files = {}
+        self.args = {}
+        self.headers = {}
+        self.endpoint = None
 
 
 request = Request()
@@ -50,6 +109,8 @@ class Flask:
         self.routes = {}
         self.url_map = {}
         self.config = {}
+        self.before_request_funcs = []
+        self.after_request_funcs = []
         _flask.current_app = self
 
     def route(self, path, methods=None):
@@ -70,24 +131,66 @@ class Flask:
     def post(self, path):
         return self.route(path, methods=["POST"])
 
+    def before_request(self, func):
+        self.before_request_funcs.append(func)
+        return func
+
+    def after_request(self, func):
+        self.after_request_funcs.append(func)
+        return func
+
+    def register_blueprint(self, blueprint):
+        for path, methods, func in blueprint.views:
+            self.route(blueprint.url_prefix + path, methods)(
+                blueprint.handle_errors(func)
+            )
+
     def test_client(self):
         app = self
 
         class Client:
-            def open(self, path, method="GET", data=None):
+            def open(
+                self,
+                path,
+                method="GET",
+                data=None,
+                query_string=None,
+                headers=None,
+            ):
                 request.method = method
-                request.form = data or {}
+                request.path = path
+                data = data or {}
+                request.form = {
+                    k: v for k, v in data.items() if not isinstance(v, tuple)
+                }
+                # Like Flask's test client: (stream, filename) is an upload.
+                request.files = {
+                    k: ns(stream=v[0], filename=v[1])
+                    for k, v in data.items()
+                    if isinstance(v, tuple)
+                }
+                request.args = query_string or {}
+                request.headers = headers or {}
                 func = app.routes[(path, method)]
+                request.endpoint = func.__name__
+                for before in app.before_request_funcs:
+                    before()
                 result = func()
                 if isinstance(result, Response):
-                    return result
-                if isinstance(result, tuple):
+                    response = result
+                elif isinstance(result, tuple):
                     body, status = result
-                    return Response(body, status)
-                return Response(result)
-
-            def get(self, path):
-                return self.open(path, "GET")
+                    response = Response(body, status)
+                else:
+                    response = Response(result)
+                for after in app.after_request_funcs:
+                    response = after(response)
+                return response
+
+            def get(self, path, query_string=None, headers=None):
+                return self.open(
+                    path, "GET", query_string=query_string, headers=headers
+                )
 
             def post(self, path, data=None, *, follow_redirects=False):
                 return self.open(path, "POST", data)
@@ -95,6 +198,37 @@ class Flask:
         return Client()
 
 
+class Blueprint(Flask):
+    def __init__(self, name, import_name, url_prefix=""):
+        self.url_prefix = url_prefix
+        self.views = []
+        self.error_handlers = {}
+
+    def route(self, path, methods=None):
+        def decorator(func):
+            self.views.append((path, methods, func))
+            return func
+
+        return decorator
+
+    def errorhandler(self, exc_type):
+        def decorator(func):
+            self.error_handlers[exc_type] = func
+            return func
+
+        return decorator
+
+    def handle_errors(self, func):
+        def view(*args, **kwargs):
+            try:
+                return func(*args, **kwargs)
+            except tuple(self.error_handlers) as error:
+                return self.error_handlers[type(error)](error)
+
+        view.__name__ = func.__name__
+        return view
+
+
 def url_for(endpoint, **values):
     path = _flask.current_app.url_map.get(endpoint, "")
     for key, value in values.items():
@@ -107,6 +241,10 @@ def redirect(location, code=302):
     return Response("", status=code, headers={"Location": location})
 
 
+def make_response(body="", status=200):
+    return Response(body, status)
+
+
 def flash(message, category=None):
     pass
 
@@ -116,11 +254,16 @@ def render_template(template_name, **kwargs):
 
 
 _flask.Flask = Flask
+_flask.Blueprint = Blueprint
+_flask.stream_with_context = lambda generator: generator
 _flask.redirect = redirect
 _flask.render_template = render_template
 _flask.request = request
 _flask.url_for = url_for
 _flask.flash = flash
+_flask.make_response = make_response
+_flask.session = {}
+_flask.g = AppGlobals()
 _flask.Response = Response
 sys.modules["flask"] = _flask
 
@@ -134,6 +277,9 @@ spec = importlib.util.spec_from_file_location("page_analyzer.app", app_path)
 app = importlib.util.module_from_spec(spec)
 sys.modules["page_analyzer.app"] = app
 spec.loader.exec_module(app)
+# Checks run in the request unless a test picks another mode; the default
+# would look for a worker heartbeat in the database.
+app.app.config["CHECKS_ASYNC"] = False
 
 OK_STATUS = 200
 TEMP_REDIRECT_STATUS = 307
@@ -161,4 +307,15 @@ def test_index_get_renders_template(monkeypatch, client):
 def test_index_post_redirects(client):
     response = client.post("/", follow_redirects=False)
     assert response.status_code == TEMP_REDIRECT_STATUS
-    assert response.headers["Location"].endswith("/urls")
\ No newline at end of file
+    assert response.headers["Location"].endswith("/urls")
+
+def test_health_reports_pool_stats(monkeypatch, client):
+    stats = {"size": 1, "idle": 1, "in_use": 0}
+    monkeypatch.setattr(app, "pool_stats", lambda: stats)
+
+    response = client.get("/health")
+
+    assert response.status_code == OK_STATUS
+    assert response.data["status"] == "ok"
+    assert response.data["db_pool"] == stats
+    assert response.data["dns_cache"]["hits"] == 0
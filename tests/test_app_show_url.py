@@ -1,10 +1,12 @@
 import sys
+from datetime import datetime
 from pathlib import Path
 
 sys.path.append(str(Path(__file__).resolve().parent))
 from test_app_index import app
 
 REDIRECT_STATUS = 302
+PAGE_SIZE = 2
 
 
 def test_show_url_not_found_redirects(monkeypatch):
@@ -13,7 +15,7 @@ def test_show_url_not_found_redirects(monkeypatch):
     def fake_flash(message, category=None):
         messages.append((message, category))
 
-    monkeypatch.setattr(app, "fetch_url", lambda id: (None, []))
+    monkeypatch.setattr(app, "fetch_url", lambda id, **kwargs: (None, []))
     monkeypatch.setattr(app, "flash", fake_flash)
 
     response = app.show_url(1)
@@ -33,7 +35,9 @@ def test_show_url_renders_template(monkeypatch):
         rendered["kwargs"] = kwargs
         return ""
 
-    monkeypatch.setattr(app, "fetch_url", lambda id: (url_record, checks))
+    monkeypatch.setattr(
+        app, "fetch_url", lambda id, **kwargs: (url_record, checks)
+    )
     monkeypatch.setattr(app, "render_template", fake_render)
 
     response = app.show_url(1)
@@ -41,4 +45,75 @@ def test_show_url_renders_template(monkeypatch):
     assert response == ""
     assert rendered["name"] == "show_url.html"
     assert rendered["kwargs"]["url"] == url_record
-    assert rendered["kwargs"]["checks"] == checks
\ No newline at end of file
+    assert rendered["kwargs"]["checks"] == checks
+
+def test_show_url_lists_jobs_when_async(monkeypatch):
+    rendered = {}
+    url_record = (1, "https://example.com", "2024-01-01")
+    jobs = [(3, "queued", "2024-01-03", None, None, None)]
+
+    def fake_render(template_name, **kwargs):
+        rendered.update(kwargs)
+        return ""
+
+    monkeypatch.setitem(app.app.config, "CHECKS_ASYNC", value=True)
+    monkeypatch.setattr(app, "fetch_url", lambda id, **kwargs: (url_record, []))
+    monkeypatch.setattr(app, "fetch_check_jobs", lambda id: jobs)
+    monkeypatch.setattr(app, "render_template", fake_render)
+
+    app.show_url(1)
+
+    assert rendered["jobs"] == jobs
+
+
+def test_show_url_pages_checks(monkeypatch):
+    rendered = {}
+    calls = {}
+    url_record = (1, "https://example.com", "2024-01-01")
+    checks = [
+        (id, 200, "", "", "", datetime(2024, 1, id, 12, 0)) for id in (9, 8, 7)
+    ]
+
+    def fake_fetch_url(id, **kwargs):
+        calls.update(kwargs)
+        return url_record, checks
+
+    def fake_render(template_name, **kwargs):
+        rendered.update(kwargs)
+        return ""
+
+    monkeypatch.setattr(app, "fetch_url", fake_fetch_url)
+    monkeypatch.setattr(app, "render_template", fake_render)
+    monkeypatch.setattr(
+        app.request,
+        "args",
+        {"before": "2024-01-10T12:00:00_10", "limit": str(PAGE_SIZE)},
+    )
+
+    app.show_url(1)
+
+    assert calls == {
+        "limit": PAGE_SIZE + 1,
+        "before": (datetime(2024, 1, 10, 12, 0), 10),
+        "after": None,
+    }
+    assert rendered["checks"] == checks[:PAGE_SIZE]
+    assert rendered["prev_cursor"] == "2024-01-09T12:00:00_9"
+    assert rendered["next_cursor"] == "2024-01-08T12:00:00_8"
+
+
+def test_show_url_ignores_malformed_cursor(monkeypatch):
+    calls = {}
+
+    def fake_fetch_url(id, **kwargs):
+        calls.update(kwargs)
+        return (1, "https://example.com", None), []
+
+    monkeypatch.setattr(app, "fetch_url", fake_fetch_url)
+    monkeypatch.setattr(app, "render_template", lambda *args, **kwargs: "")
+    monkeypatch.setattr(app.request, "args", {"before": "yesterday_x"})
+
+    app.show_url(1)
+
+    assert calls["before"] is None
+    assert calls["limit"] == app.CHECKS_PAGE_SIZE + 1
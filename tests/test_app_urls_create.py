@@ -7,11 +7,13 @@ app = app_index.app
 
 FOUND_STATUS = 302
 UNPROCESSABLE_ENTITY_STATUS = 422
+SERVER_ERROR_STATUS = 500
 URLS = "/urls"
 
 MSG_INVALID = "Некорректный URL"
 MSG_EXISTS = "Страница уже существует"
 MSG_ADDED = "Страница успешно добавлена"
+MSG_ERROR = "Ошибка при добавлении"
 
 
 @pytest.fixture()
@@ -32,14 +34,11 @@ def test_invalid_url(monkeypatch, client):
         calls["normalize"] += 1
         return url
 
-    def _find(_name):
-        calls["find"] += 1
+    def _upsert(_name):
+        calls["upsert"] += 1
+        return 1, True
 
-    def _insert(_name):
-        calls["insert"] += 1
-        return 1
-
-    calls = {"find": 0, "insert": 0, "normalize": 0}
+    calls = {"upsert": 0, "normalize": 0}
     set_ = monkeypatch.setattr
 
     set_(app, "flash", _flash)
@@ -47,17 +46,14 @@ def test_invalid_url(monkeypatch, client):
     set_(app, "validate_url", url_utils.validate_url)
     set_(url_utils, "normalize_url", _normalize)
     set_(app, "normalize_url", _normalize)
-    set_(database, "find_url_by_name", _find)
-    set_(app, "find_url_by_name", _find)
-    set_(database, "insert_url", _insert)
-    set_(app, "insert_url", _insert)
+    set_(database, "upsert_url", _upsert)
+    set_(app, "upsert_url", _upsert)
 
     response = client.post("/urls", data={"url": "bad"})
 
     assert response.status_code == UNPROCESSABLE_ENTITY_STATUS
     assert (MSG_INVALID, "danger") in flashes
-    assert calls["find"] == 0
-    assert calls["insert"] == 0
+    assert calls["upsert"] == 0
     assert calls["normalize"] == 0
 
 
@@ -73,14 +69,8 @@ def test_existing_url(monkeypatch, client):
     def _same(url):
         return url
 
-    def _find_existing(_name):
-        return (5,)
-
-    insert_called = {"value": False}
-
-    def _insert(_name):
-        insert_called["value"] = True
-        return 10
+    def _upsert_existing(_name):
+        return 5, False
 
     set_ = monkeypatch.setattr
     set_(app, "flash", _flash)
@@ -88,10 +78,8 @@ def test_existing_url(monkeypatch, client):
     set_(app, "validate_url", url_utils.validate_url)
     set_(url_utils, "normalize_url", _same)
     set_(app, "normalize_url", url_utils.normalize_url)
-    set_(database, "find_url_by_name", _find_existing)
-    set_(app, "find_url_by_name", database.find_url_by_name)
-    set_(database, "insert_url", _insert)
-    set_(app, "insert_url", _insert)
+    set_(database, "upsert_url", _upsert_existing)
+    set_(app, "upsert_url", database.upsert_url)
 
     response = client.post(
         "/urls",
@@ -101,8 +89,7 @@ def test_existing_url(monkeypatch, client):
 
     assert response.status_code == FOUND_STATUS
     assert response.headers["Location"].endswith(f"{URLS}/5")
-    assert (MSG_EXISTS, "info") in flashes
-    assert insert_called["value"] is False
+    assert flashes == [(MSG_EXISTS, "info")]
 
 
 def test_new_url(monkeypatch, client):
@@ -117,11 +104,8 @@ def test_new_url(monkeypatch, client):
     def _same(url):
         return url
 
-    def _find_none(_name):
-        return None
-
-    def _insert_new(_name):
-        return 7
+    def _upsert_new(_name):
+        return 7, True
 
     set_ = monkeypatch.setattr
     set_(app, "flash", _flash)
@@ -129,10 +113,8 @@ def test_new_url(monkeypatch, client):
     set_(app, "validate_url", url_utils.validate_url)
     set_(url_utils, "normalize_url", _same)
     set_(app, "normalize_url", url_utils.normalize_url)
-    set_(database, "find_url_by_name", _find_none)
-    set_(app, "find_url_by_name", database.find_url_by_name)
-    set_(database, "insert_url", _insert_new)
-    set_(app, "insert_url", database.insert_url)
+    set_(database, "upsert_url", _upsert_new)
+    set_(app, "upsert_url", database.upsert_url)
 
     response = client.post(
         "/urls",
@@ -142,4 +124,25 @@ def test_new_url(monkeypatch, client):
 
     assert response.status_code == FOUND_STATUS
     assert response.headers["Location"].endswith(f"{URLS}/7")
-    assert (MSG_ADDED, "success") in flashes
+    assert flashes == [(MSG_ADDED, "success")]
+
+
+def test_database_error(monkeypatch, client):
+    flashes = []
+
+    def _flash(msg, category=None):
+        flashes.append((msg, category))
+
+    def _upsert_fails(_name):
+        raise RuntimeError("connection lost")
+
+    set_ = monkeypatch.setattr
+    set_(app, "flash", _flash)
+    set_(app, "validate_url", lambda _url: True)
+    set_(app, "normalize_url", lambda url: url)
+    set_(app, "upsert_url", _upsert_fails)
+
+    response = client.post("/urls", data={"url": "http://down.com"})
+
+    assert response.status_code == SERVER_ERROR_STATUS
+    assert (MSG_ERROR, "danger") in flashes
@@ -0,0 +1,53 @@
+import io
+
+import pytest
+import test_app_index as app_index
+
+app = app_index.app
+importer = app_index.sys.modules["page_analyzer.importer"]
+
+FOUND_STATUS = 302
+
+
+@pytest.fixture()
+def client():
+    return app.app.test_client()
+
+
+@pytest.fixture()
+def flashes(monkeypatch):
+    messages = []
+    monkeypatch.setattr(
+        app,
+        "flash",
+        lambda msg, category=None: messages.append((msg, category)),
+    )
+    return messages
+
+
+def test_import_requires_file(client, flashes):
+    response = client.post("/urls/import", data={})
+
+    assert response.status_code == FOUND_STATUS
+    assert response.headers["Location"] == "/"
+    assert flashes == [("Выберите файл для импорта", "danger")]
+
+
+def test_import_reports_counts(monkeypatch, client, flashes):
+    imported = []
+
+    def fake_import(lines):
+        imported.extend(lines)
+        return importer.ImportStats(inserted=2, duplicates=1, invalid=3)
+
+    monkeypatch.setattr(app, "import_urls", fake_import)
+    upload = io.BytesIO("https://a.com\nhttps://ж.рф\n".encode())
+
+    response = client.post("/urls/import", data={"file": (upload, "u.txt")})
+
+    assert response.status_code == FOUND_STATUS
+    assert response.headers["Location"] == "/urls"
+    assert imported == ["https://a.com\n", "https://ж.рф\n"]
+    assert flashes == [
+        ("Добавлено: 2, уже были: 1, некорректных: 3", "success")
+    ]
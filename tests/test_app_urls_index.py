@@ -1,4 +1,5 @@
 import importlib.util
+import sys
 from pathlib import Path
 
 import pytest
@@ -10,7 +11,12 @@ test_app_index = importlib.util.module_from_spec(spec)
 spec.loader.exec_module(test_app_index)
 
 app = test_app_index.app
+cache = sys.modules["page_analyzer.cache"]
 OK_STATUS = test_app_index.OK_STATUS
+PAGE_SIZE = 2
+CURSOR = 6
+NOT_MODIFIED_STATUS = 304
+RENDERS_AFTER_MISS = 2
 
 
 @pytest.fixture()
@@ -20,7 +26,9 @@ def client():
 
 def test_urls_index_renders_template_and_data(monkeypatch, client):
     sample_urls = [(1, "https://example.com", None, None)]
-    monkeypatch.setattr(app, "fetch_urls_with_last_check", lambda: sample_urls)
+    monkeypatch.setattr(
+        app, "fetch_urls_with_last_check", lambda **kwargs: sample_urls
+    )
 
     rendered = {}
 
@@ -36,4 +44,128 @@ def test_urls_index_renders_template_and_data(monkeypatch, client):
     assert response.status_code == OK_STATUS
     assert rendered["name"] == "urls.html"
     assert rendered["urls"] == sample_urls
-    assert str(sample_urls).encode() in response.data
\ No newline at end of file
+    assert str(sample_urls).encode() in response.data
+
+def _rows(*ids):
+    return [(i, f"https://site{i}.com", None, None) for i in ids]
+
+
+def _capture_render(monkeypatch):
+    rendered = {}
+
+    def fake_render(template_name, **kwargs):
+        rendered.update(kwargs)
+        return ""
+
+    monkeypatch.setattr(app, "render_template", fake_render)
+    return rendered
+
+
+def test_urls_index_first_page_has_next_cursor(monkeypatch, client):
+    calls = {}
+
+    def fake_fetch(**kwargs):
+        calls.update(kwargs)
+        return _rows(5, 4, 3)
+
+    monkeypatch.setattr(app, "fetch_urls_with_last_check", fake_fetch)
+    rendered = _capture_render(monkeypatch)
+
+    client.get("/urls", query_string={"limit": str(PAGE_SIZE)})
+
+    assert calls == {"limit": PAGE_SIZE + 1, "before": None, "after": None}
+    assert rendered["urls"] == _rows(5, 4)
+    assert rendered["prev_cursor"] is None
+    assert rendered["next_cursor"] == rendered["urls"][-1][0]
+
+
+def test_urls_index_pages_backwards(monkeypatch, client):
+    calls = {}
+
+    def fake_fetch(**kwargs):
+        calls.update(kwargs)
+        return _rows(9, 8, 7)
+
+    monkeypatch.setattr(app, "fetch_urls_with_last_check", fake_fetch)
+    rendered = _capture_render(monkeypatch)
+
+    client.get(
+        "/urls",
+        query_string={"after": str(CURSOR), "limit": str(PAGE_SIZE)},
+    )
+
+    assert calls["after"] == CURSOR
+    assert rendered["urls"] == _rows(8, 7)
+    assert rendered["prev_cursor"] == rendered["urls"][0][0]
+    assert rendered["next_cursor"] == rendered["urls"][-1][0]
+
+
+def test_urls_index_clamps_page_size(monkeypatch, client):
+    calls = {}
+
+    def fake_fetch(**kwargs):
+        calls.update(kwargs)
+        return []
+
+    monkeypatch.setattr(app, "fetch_urls_with_last_check", fake_fetch)
+    _capture_render(monkeypatch)
+
+    client.get("/urls", query_string={"limit": "100000"})
+
+    assert calls["limit"] == app.URLS_MAX_PAGE_SIZE + 1
+
+
+def test_urls_index_served_from_page_cache(monkeypatch, client):
+    calls = []
+
+    def fake_fetch(**kwargs):
+        calls.append(kwargs)
+        return _rows(1)
+
+    monkeypatch.setattr(app, "page_cache", cache.MemoryPageCache())
+    monkeypatch.setattr(app, "fetch_urls_with_last_check", fake_fetch)
+    monkeypatch.setattr(app, "render_template", lambda name, **kw: "page")
+
+    first = client.get("/urls")
+    second = client.get("/urls")
+
+    assert len(calls) == 1
+    assert second.data == first.data == b"page"
+    assert second.headers["ETag"] == first.headers["ETag"]
+    assert second.headers["Cache-Control"] == "no-cache"
+
+    app.page_cache.invalidate()
+    client.get("/urls")
+    assert len(calls) == RENDERS_AFTER_MISS
+
+
+def test_urls_index_answers_revalidation_with_304(monkeypatch, client):
+    monkeypatch.setattr(app, "page_cache", cache.MemoryPageCache())
+    monkeypatch.setattr(app, "fetch_urls_with_last_check", lambda **kw: [])
+    monkeypatch.setattr(app, "render_template", lambda name, **kw: "page")
+
+    etag = client.get("/urls").headers["ETag"]
+    response = client.get("/urls", headers={"If-None-Match": etag})
+
+    assert response.status_code == NOT_MODIFIED_STATUS
+    assert response.data == b""
+    assert response.headers["ETag"] == etag
+
+
+def test_urls_index_bypasses_cache_with_pending_flashes(monkeypatch, client):
+    calls = []
+
+    def fake_fetch(**kwargs):
+        calls.append(kwargs)
+        return []
+
+    monkeypatch.setattr(app, "page_cache", cache.MemoryPageCache())
+    monkeypatch.setitem(app.session, "_flashes", [("info", "message")])
+    monkeypatch.setattr(app, "fetch_urls_with_last_check", fake_fetch)
+    monkeypatch.setattr(app, "render_template", lambda name, **kw: "page")
+
+    client.get("/urls")
+    client.get("/urls")
+
+    assert len(calls) == RENDERS_AFTER_MISS
+    assert app.page_cache.stats()["size"] == 0
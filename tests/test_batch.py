@@ -0,0 +1,178 @@
+import asyncio
+import importlib
+import sys
+import types
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+import test_app_index  # noqa: F401  installs the third-party stubs
+
+
+class ClientError(Exception):
+    pass
+
+
+class ClientConnectorError(ClientError):
+    pass
+
+
+class ClientSession:
+    def __init__(self, **kwargs):
+        self.kwargs = kwargs
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        pass
+
+
+class TraceConfig:
+    def __init__(self):
+        self.on_connection_create_start = []
+        self.on_connection_create_end = []
+        self.on_dns_resolvehost_start = []
+        self.on_dns_resolvehost_end = []
+
+
+aiohttp_stub = types.ModuleType("aiohttp")
+aiohttp_stub.ClientError = ClientError
+aiohttp_stub.ClientConnectorError = ClientConnectorError
+aiohttp_stub.ClientResponseError = ClientError
+aiohttp_stub.ClientSession = ClientSession
+aiohttp_stub.ClientTimeout = lambda **kwargs: kwargs
+aiohttp_stub.TCPConnector = lambda **kwargs: kwargs
+aiohttp_stub.TraceConfig = TraceConfig
+sys.modules["aiohttp"] = aiohttp_stub
+
+batch = importlib.import_module("page_analyzer.batch")
+database = importlib.import_module("page_analyzer.database")
+metrics = importlib.import_module("page_analyzer.metrics")
+
+HTTP_OK = 200
+HTTP_NOT_MODIFIED = 304
+BATCH_SIZE = 2
+PARSE_CHUNK_SIZE = 2
+URLS = [(i, f"https://site{i}.com") for i in range(1, 6)]
+BROKEN_URL = "https://site3.com"
+LATENCIES = (0.1, 0.2, 0.3, 0.4, 1.0)
+FINGERPRINT = (None, None, "hash")
+PARSE_CPU_SECONDS = 0.25
+
+
+def test_batch_checker_writes_checks_in_batches(monkeypatch):
+    flushed = []
+
+    async def fake_fetch(session, url, headers):
+        await asyncio.sleep(0)
+        if url == BROKEN_URL:
+            raise ClientError("connection refused")
+        return f"<h1>{url}</h1>", HTTP_OK, FINGERPRINT
+
+    monkeypatch.setattr(batch, "parse_seo", lambda html: (html, None, None))
+    monkeypatch.setattr(batch, "insert_url_checks", flushed.append)
+
+    checker = batch.BatchChecker(concurrency=3, batch_size=BATCH_SIZE)
+    monkeypatch.setattr(checker, "fetch", fake_fetch)
+    stats = asyncio.run(checker.run(URLS))
+
+    rows = [row for chunk in flushed for row in chunk]
+    assert sorted(row[0] for row in rows) == [1, 2, 4, 5]
+    assert all(len(chunk) <= BATCH_SIZE for chunk in flushed)
+    assert stats.checked == len(URLS) - 1
+    assert stats.failed == 1
+    assert "5 url(s)" in stats.summary()
+
+
+def test_failed_batch_writes_do_not_end_the_run(monkeypatch):
+    written = []
+    outages = [database.psycopg2.OperationalError("server closed")]
+
+    def insert(rows):
+        if outages:
+            raise outages.pop()
+        if any(row[0] == 1 for row in rows):
+            raise ValueError("A string literal cannot contain NUL")
+        written.extend(row[0] for row in rows)
+
+    async def fake_fetch(session, url, headers):
+        return "<h1>h</h1>", HTTP_OK, FINGERPRINT
+
+    monkeypatch.setattr(batch, "WRITE_RETRY_DELAY", 0)
+    monkeypatch.setattr(batch, "parse_seo", lambda html: (html, None, None))
+    monkeypatch.setattr(batch, "insert_url_checks", insert)
+    checker = batch.BatchChecker(concurrency=1, batch_size=BATCH_SIZE)
+    monkeypatch.setattr(checker, "fetch", fake_fetch)
+
+    stats = asyncio.run(checker.run(URLS))
+
+    assert sorted(written) == [2, 3, 4, 5]
+    assert stats.unsaved == 1
+    assert "1 not saved" in stats.summary()
+
+
+def test_batch_stats_percentiles():
+    stats = batch.BatchStats()
+    for latency in LATENCIES:
+        stats.record(latency, ok=True)
+    assert stats.percentile(50) == LATENCIES[2]
+    assert stats.percentile(100) == LATENCIES[-1]
+
+
+def test_batch_checker_parses_in_chunks_in_a_process_pool(monkeypatch):
+    flushed = []
+    chunks = []
+
+    async def fake_fetch(session, url, headers):
+        return url, HTTP_OK, FINGERPRINT
+
+    def fake_parse_many(htmls):
+        chunks.append(list(htmls))
+        return [((html, None, None), PARSE_CPU_SECONDS) for html in htmls]
+
+    monkeypatch.setattr(
+        batch,
+        "ProcessPoolExecutor",
+        lambda max_workers, mp_context: ThreadPoolExecutor(max_workers),
+    )
+    monkeypatch.setattr(batch, "parse_many", fake_parse_many)
+    monkeypatch.setattr(batch, "insert_url_checks", flushed.extend)
+
+    metrics.PARSE_CPU_SECONDS.reset()
+
+    checker = batch.BatchChecker(
+        concurrency=2, parse_workers=2, parse_chunk_size=PARSE_CHUNK_SIZE
+    )
+    monkeypatch.setattr(checker, "fetch", fake_fetch)
+    asyncio.run(checker.run(URLS))
+
+    assert sorted(len(chunk) for chunk in chunks) == [1, 2, 2]
+    ((_, values),) = metrics.PARSE_CPU_SECONDS.snapshot()
+    assert sum(values[:-1]) == len(URLS)
+    assert values[-1] == pytest.approx(PARSE_CPU_SECONDS * len(URLS))
+    assert sorted((row[0], row[2]) for row in flushed) == [
+        (url_id, url) for url_id, url in URLS
+    ]
+
+
+def test_batch_checker_reuses_unchanged_pages(monkeypatch):
+    flushed = []
+    requested = []
+    last_check = (HTTP_OK, "h1", "title", None, '"v1"', None, "hash")
+
+    async def fake_fetch(session, url, headers):
+        requested.append(headers)
+        return "", HTTP_NOT_MODIFIED, (None, None, "empty")
+
+    monkeypatch.setattr(batch, "parse_seo", lambda html: pytest.fail())
+    monkeypatch.setattr(batch, "insert_url_checks", flushed.extend)
+
+    checker = batch.BatchChecker(concurrency=1)
+    monkeypatch.setattr(checker, "fetch", fake_fetch)
+    stats = asyncio.run(checker.run([(1, "https://site1.com", last_check)]))
+
+    assert requested == [{"If-None-Match": '"v1"'}]
+    assert stats.unchanged == 1
+    (row,) = flushed
+    assert row[:5] == (1, HTTP_OK, "h1", "title", None)
+    assert row[6:] == ('"v1"', None, "hash")
@@ -0,0 +1,172 @@
+import sys
+import types
+
+import pytest
+from test_parser import load_package_module
+
+MAX_ENTRIES = 2
+TTL = 60
+NOW = 1_700_000_000.5
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = NOW
+
+    def __call__(self):
+        return self.now
+
+
+def install_dotenv(monkeypatch, load_dotenv=lambda: None):
+    monkeypatch.setitem(
+        sys.modules, "dotenv", types.SimpleNamespace(load_dotenv=load_dotenv)
+    )
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    monkeypatch.delenv("PAGE_CACHE", raising=False)
+    install_dotenv(monkeypatch)
+    return load_package_module(monkeypatch, "cache")
+
+
+def test_cached_page_validators(cache):
+    page = cache.CachedPage.render("<p>hi</p>", now=NOW)
+    headers = page.headers()
+
+    assert headers["ETag"] == f'"{page.etag}"'
+    assert headers["Last-Modified"] == "Tue, 14 Nov 2023 22:13:20 GMT"
+    assert page.not_modified(if_none_match=headers["ETag"])
+    assert page.not_modified(if_none_match=f'"other", W/{headers["ETag"]}')
+    assert page.not_modified(if_none_match="*")
+    assert not page.not_modified(if_none_match='"other"')
+    assert page.not_modified(if_modified_since=headers["Last-Modified"])
+    assert not page.not_modified(
+        if_modified_since="Tue, 14 Nov 2023 22:13:19 GMT"
+    )
+    assert not page.not_modified(if_modified_since="yesterday")
+    # If-None-Match takes precedence over If-Modified-Since.
+    assert not page.not_modified('"other"', headers["Last-Modified"])
+
+
+def test_memory_cache_generations_and_lru(cache):
+    clock = FakeClock()
+    pages = cache.MemoryPageCache(MAX_ENTRIES, TTL, clock=clock)
+    page = cache.CachedPage.render("body", now=clock())
+    generation = pages.generation()
+
+    for key in ("/a", "/b", "/c"):
+        pages.put(key, generation, page)
+
+    assert pages.get("/a", generation) is None
+    assert pages.get("/c", generation) == page
+
+    pages.invalidate()
+    assert pages.get("/c", pages.generation()) is None
+    # A page rendered before the write must not be stored afterwards.
+    pages.put("/c", generation, page)
+    assert pages.stats()["size"] == 0
+
+    pages.put("/c", pages.generation(), page)
+    clock.now += TTL
+    assert pages.get("/c", pages.generation()) is None
+
+
+def test_file_cache_is_shared_between_instances(cache, tmp_path):
+    clock = FakeClock()
+    writer = cache.FilePageCache(tmp_path, MAX_ENTRIES, TTL, clock=clock)
+    reader = cache.FilePageCache(tmp_path, MAX_ENTRIES, TTL, clock=clock)
+    page = cache.CachedPage.render("body", now=clock())
+    generation = writer.generation()
+
+    writer.put("/urls", generation, page)
+    assert reader.generation() == generation
+    assert reader.get("/urls", generation) == page
+
+    reader.invalidate()
+    assert writer.generation() != generation
+    assert writer.get("/urls", writer.generation()) is None
+
+    writer.put("/urls", writer.generation(), page)
+    assert not (tmp_path / generation[1]).exists()
+
+
+@pytest.mark.parametrize("backend", ["memory", "file"])
+def test_invalidating_a_url_keeps_the_other_pages(cache, tmp_path, backend):
+    clock = FakeClock()
+    if backend == "file":
+        pages = cache.FilePageCache(tmp_path, clock=clock)
+    else:
+        pages = cache.MemoryPageCache(clock=clock)
+    page = cache.CachedPage.render("body", now=clock())
+    keys = {
+        "/urls": cache.LIST_PAGES,
+        "/urls/1": cache.url_pages(1),
+        "/urls/2": cache.url_pages(2),
+    }
+    for key, scope in keys.items():
+        pages.put(key, pages.generation(scope), page)
+    stale = pages.generation(cache.url_pages(1))
+
+    pages.invalidate([cache.LIST_PAGES, cache.url_pages(1)])
+
+    assert pages.get("/urls", pages.generation(cache.LIST_PAGES)) is None
+    assert pages.get("/urls/1", pages.generation(cache.url_pages(1))) is None
+    assert pages.get("/urls/2", pages.generation(cache.url_pages(2))) == page
+    pages.put("/urls/1", stale, page)
+    assert pages.get("/urls/1", pages.generation(cache.url_pages(1))) is None
+
+
+def test_memory_cache_forgets_scopes_without_pages(cache):
+    pages = cache.MemoryPageCache(MAX_ENTRIES)
+    page = cache.CachedPage.render("body")
+    stale = pages.generation(cache.url_pages(0))
+
+    for url_id in range(100):
+        scope = cache.url_pages(url_id)
+        pages.put(f"/urls/{url_id}", pages.generation(scope), page)
+        pages.invalidate([cache.url_pages(url_id + 1)])
+
+    assert len(pages._scopes) == MAX_ENTRIES
+    # url 0 was evicted; a page rendered before the writes still is stale.
+    pages.put("/urls/0", stale, page)
+    assert pages.get("/urls/0", pages.generation(cache.url_pages(0))) is None
+    pages.invalidate([cache.url_pages(99)])
+    assert cache.url_pages(99) not in pages._scopes
+    assert pages.get("/urls/98", pages.generation(cache.url_pages(98)))
+
+
+def test_young_pages_have_no_last_modified(cache):
+    page = cache.CachedPage.render("<p>hi</p>", now=NOW)
+    since = page.headers(now=NOW + 1)["Last-Modified"]
+
+    assert "Last-Modified" not in page.headers(now=NOW + 0.9)
+    assert not page.not_modified(if_modified_since=since, now=NOW + 0.9)
+    assert page.not_modified(if_modified_since=since, now=NOW + 1)
+    assert page.not_modified(if_none_match=f'"{page.etag}"', now=NOW)
+
+
+def test_page_cache_from_dotenv(monkeypatch):
+    monkeypatch.delenv("PAGE_CACHE", raising=False)
+    install_dotenv(
+        monkeypatch, lambda: monkeypatch.setenv("PAGE_CACHE", "memory")
+    )
+
+    cache = load_package_module(monkeypatch, "cache")
+
+    assert isinstance(cache.page_cache, cache.MemoryPageCache)
+
+
+def test_page_cache_from_env(cache, monkeypatch, tmp_path):
+    assert cache.page_cache_from_env() is None
+
+    monkeypatch.setenv("PAGE_CACHE", "memory")
+    assert isinstance(cache.page_cache_from_env(), cache.MemoryPageCache)
+
+    monkeypatch.setenv("PAGE_CACHE", "file")
+    monkeypatch.setenv("PAGE_CACHE_DIR", str(tmp_path))
+    assert cache.page_cache_from_env().directory == str(tmp_path)
+
+    monkeypatch.setenv("PAGE_CACHE", "redis")
+    with pytest.raises(ValueError, match="redis"):
+        cache.page_cache_from_env()
@@ -1,5 +1,6 @@
 import importlib.util
 import pathlib
+import re
 import sqlite3
 import sys
 import types
@@ -7,28 +8,77 @@ import types
 import pytest
 
 sys.modules["psycopg2"] = types.SimpleNamespace(
-    connect=lambda *args, **kwargs: None
+    connect=lambda *args, **kwargs: None,
+    OperationalError=type("OperationalError", (Exception,), {}),
+    InterfaceError=type("InterfaceError", (Exception,), {}),
+)
+
+sys.modules["psycopg2.extras"] = types.SimpleNamespace(
+    execute_values=lambda *args, **kwargs: None
 )
 
 sys.modules["dotenv"] = types.SimpleNamespace(
     load_dotenv=lambda *args, **kwargs: None
 )
 
+package_dir = pathlib.Path(__file__).resolve().parents[1] / "page_analyzer"
+page_pkg = types.ModuleType("page_analyzer")
+page_pkg.__path__ = [str(package_dir)]
+sys.modules.setdefault("page_analyzer", page_pkg)
+
 spec = importlib.util.spec_from_file_location(
-    "database",
-    (
-        pathlib.Path(__file__)
-        .resolve()
-        .parents[1]
-        / "page_analyzer"
-        / "database.py"
-    ),
+    "page_analyzer.database", package_dir / "database.py"
 )
 database = importlib.util.module_from_spec(spec)
 spec.loader.exec_module(database)
 
 OK_STATUS = 200
 NOT_FOUND_STATUS = 404
+TEXT_LENGTH = 5
+CHECKED_AT = "2024-01-01 00:00:00"
+EARLIER = "2023-12-31 00:00:00"
+
+# Rewrites of the Postgres-only syntax the queries use.  The ORDER BY of
+# the original query is kept, so tie-breaks are exercised as written.
+POSTGRES_TO_SQLITE = [
+    (re.compile(r"UPDATE (\w+) (\w+)\s+SET"), r"UPDATE \1 AS \2 SET"),
+    (
+        re.compile(
+            r"SELECT DISTINCT ON \((?P<key>\w+)\) (?P<cols>.+?)\s+"
+            r"FROM (?P<rest>.+?)\s+ORDER BY (?P=key), (?P<order>[^)]+?)\s*\)",
+            re.DOTALL,
+        ),
+        r"SELECT \g<cols> FROM (SELECT *, row_number() OVER ("
+        r"PARTITION BY \g<key> ORDER BY \g<order>) AS rank "
+        r"FROM \g<rest>) WHERE rank = 1)",
+    ),
+    (
+        re.compile(r"\bc\.\*"),
+        ", ".join(
+            f"c.{column.strip()}"
+            for column in database.LAST_CHECK_COLUMNS.split(",")
+        ),
+    ),
+]
+# A lateral subquery that picks one row becomes a join on the id that a
+# correlated subquery, with the same WHERE and ORDER BY, picks.
+LATERAL_JOIN = re.compile(
+    r"(?P<join>(?:LEFT )?JOIN) LATERAL \(\s*SELECT .+?\s+"
+    r"FROM (?P<table>\w+)\s+(?P<rest>WHERE .+?LIMIT 1)\s*\) (?P<alias>\w+) "
+    r"ON true",
+    re.DOTALL | re.IGNORECASE,
+)
+
+
+def to_sqlite(query):
+    for pattern, replacement in POSTGRES_TO_SQLITE:
+        query = pattern.sub(replacement, query)
+    query = LATERAL_JOIN.sub(
+        r"\g<join> \g<table> \g<alias> ON \g<alias>.id = "
+        r"(SELECT id FROM \g<table> \g<rest>)",
+        query,
+    )
+    return query.replace("%s", "?")
 
 
 class SQLiteCursor:
@@ -44,10 +94,13 @@ class SQLiteCursor:
     def execute(self, query, params=None):
         if params is None:
             params = ()
-        query = query.replace("%s", "?")
-        self.cursor.execute(query, params)
+        self.cursor.execute(to_sqlite(query), params)
         return self
 
+    @property
+    def rowcount(self):
+        return self.cursor.rowcount
+
     def fetchone(self):
         return self.cursor.fetchone()
 
@@ -80,7 +133,9 @@ def db(monkeypatch):
         CREATE TABLE urls (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             name TEXT UNIQUE NOT NULL,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            last_checked_at TIMESTAMP,
+            last_status_code INT
         )
         """,
     )
@@ -93,7 +148,10 @@ def db(monkeypatch):
             h1 TEXT,
             title TEXT,
             description TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            etag TEXT,
+            last_modified TEXT,
+            content_hash TEXT
         )
         """,
     )
@@ -103,25 +161,40 @@ def db(monkeypatch):
     raw_conn.close()
 
 
-def test_insert_and_find_url(db):
-    name = "https://example.com"
-    new_id = database.insert_url(name)
-    row = database.find_url_by_name(name)
-    assert row[0] == new_id
+def add_url(db, name):
+    return db.conn.execute(
+        "INSERT INTO urls (name) VALUES (?)", (name,)
+    ).lastrowid
+
+
+def add_checks(db, *checks):
+    db.conn.executemany(
+        """
+        INSERT INTO url_checks (url_id, status_code, created_at)
+        VALUES (?, ?, ?)
+        """,
+        checks,
+    )
 
 
 def test_insert_check_and_fetch_url(db):
     name = "https://example.org"
-    url_id = database.insert_url(name)
+    url_id = add_url(db, name)
     database.insert_url_check(url_id, OK_STATUS, "h1", "title", "desc")
     url_item, checks = database.fetch_url(url_id)
     assert url_item[0] == url_id
     assert checks[0][1] == OK_STATUS
 
 
+def test_find_url_by_id(db):
+    url_id = add_url(db, "https://found.com")
+    assert database.find_url_by_id(url_id) == (url_id, "https://found.com")
+    assert database.find_url_by_id(url_id + 1) is None
+
+
 def test_fetch_urls_with_last_check(db):
-    id1 = database.insert_url("https://a.com")
-    id2 = database.insert_url("https://b.com")
+    id1 = add_url(db, "https://a.com")
+    id2 = add_url(db, "https://b.com")
     database.insert_url_check(id1, OK_STATUS, None, None, None)
     database.insert_url_check(id2, NOT_FOUND_STATUS, None, None, None)
     urls = database.fetch_urls_with_last_check()
@@ -129,3 +202,191 @@ def test_fetch_urls_with_last_check(db):
     assert urls[0][3] == NOT_FOUND_STATUS
     assert urls[1][0] == id1
     assert urls[1][3] == OK_STATUS
+
+
+def test_fetch_urls_with_last_check_uses_latest_check(db):
+    url_id = add_url(db, "https://c.com")
+    database.insert_url_check(url_id, NOT_FOUND_STATUS, None, None, None)
+    database.insert_url_check(url_id, OK_STATUS, None, None, None)
+    urls = database.fetch_urls_with_last_check()
+    assert urls == [(url_id, "https://c.com", urls[0][2], OK_STATUS)]
+
+
+def test_fetch_urls_with_last_check_keyset_pages(db):
+    ids = [add_url(db, f"https://{i}.com") for i in range(5)]
+    first = database.fetch_urls_with_last_check(limit=2)
+    assert [row[0] for row in first] == [ids[4], ids[3]]
+    second = database.fetch_urls_with_last_check(limit=2, before=ids[3])
+    assert [row[0] for row in second] == [ids[2], ids[1]]
+    back = database.fetch_urls_with_last_check(limit=2, after=ids[2])
+    assert [row[0] for row in back] == [ids[4], ids[3]]
+
+
+def test_insert_check_updates_url_summary(db):
+    url_id = add_url(db, "https://d.com")
+    database.insert_url_check(url_id, NOT_FOUND_STATUS, None, None, None)
+    cur = db.cursor().execute(
+        "SELECT last_checked_at, last_status_code FROM urls WHERE id=%s",
+        (url_id,),
+    )
+    last_checked_at, last_status_code = cur.fetchone()
+    assert last_checked_at is not None
+    assert last_status_code == NOT_FOUND_STATUS
+
+
+def test_fetch_last_check_returns_newest_fingerprint(db):
+    url_id = add_url(db, "https://e.com")
+    assert database.fetch_last_check(url_id) is None
+    database.insert_url_check(url_id, OK_STATUS, "old", None, None)
+    database.insert_url_check(
+        url_id,
+        OK_STATUS,
+        "new",
+        "title",
+        None,
+        etag='"v2"',
+        content_hash="abc",
+    )
+    assert database.fetch_last_check(url_id) == (
+        OK_STATUS,
+        "new",
+        "title",
+        None,
+        '"v2"',
+        None,
+        "abc",
+    )
+
+
+def test_iter_urls_walks_every_row_in_batches(db):
+    ids = [add_url(db, f"https://{i}.org") for i in range(5)]
+    assert [row[0] for row in database.iter_urls(batch_size=2)] == ids
+
+
+def test_fetch_url_pages_checks_by_created_at_and_id(db, monkeypatch):
+    monkeypatch.setattr(database, "CHECK_TEXT_LENGTH", TEXT_LENGTH)
+    url_id = add_url(db, "https://pages.com")
+    created_at = "2024-01-01 00:00:00"
+    db.conn.executemany(
+        """
+        INSERT INTO url_checks (url_id, status_code, h1, created_at)
+        VALUES (?, ?, ?, ?)
+        """,
+        [(url_id, OK_STATUS, "heading " * 10, created_at)] * 3
+        + [(url_id, OK_STATUS, None, "2023-12-31 00:00:00")],
+    )
+    _, first = database.fetch_url(url_id, limit=2)
+    ids = [row[0] for row in first]
+    assert ids == sorted(ids, reverse=True)
+    assert first[0][2] == "heading "[:TEXT_LENGTH]
+
+    cursor = (first[-1][5], first[-1][0])
+    _, second = database.fetch_url(url_id, limit=2, before=cursor)
+    older_id = ids[0] + 1
+    # Ties on created_at are broken by id, then the older check follows.
+    assert [row[0] for row in second] == [ids[-1] - 1, older_id]
+
+    cursor = (second[0][5], second[0][0])
+    _, back = database.fetch_url(url_id, limit=2, after=cursor)
+    assert back == first
+
+
+def test_backfill_last_checks_fills_urls_from_their_latest_check(db):
+    checked = add_url(db, "https://checked.com")
+    tied = add_url(db, "https://tied.com")
+    unchecked = add_url(db, "https://unchecked.com")
+    add_checks(
+        db,
+        (checked, NOT_FOUND_STATUS, EARLIER),
+        (checked, OK_STATUS, CHECKED_AT),
+        # Same created_at: the check with the higher id wins.
+        (tied, OK_STATUS, CHECKED_AT),
+        (tied, NOT_FOUND_STATUS, CHECKED_AT),
+    )
+    batches = []
+
+    updated = database.backfill_last_checks(
+        batch_size=2, on_batch=lambda *args: batches.append(args)
+    )
+
+    assert (updated, batches) == (2, [(2, unchecked, 2), (4, unchecked, 2)])
+    rows = db.cursor().execute(
+        "SELECT id, last_checked_at, last_status_code FROM urls ORDER BY id"
+    )
+    assert rows.fetchall() == [
+        (checked, CHECKED_AT, OK_STATUS),
+        (tied, CHECKED_AT, NOT_FOUND_STATUS),
+        (unchecked, None, None),
+    ]
+    assert database.find_last_check_mismatches() == []
+
+
+def test_backfill_last_checks_never_moves_a_summary_back(db):
+    url_id = add_url(db, "https://newer.com")
+    add_checks(db, (url_id, NOT_FOUND_STATUS, EARLIER))
+    db.conn.execute(
+        "UPDATE urls SET last_checked_at = ?, last_status_code = ?",
+        (CHECKED_AT, OK_STATUS),
+    )
+
+    assert database.backfill_last_checks() == 0
+    assert database.find_last_check_mismatches() == [
+        (url_id, CHECKED_AT, OK_STATUS, EARLIER, NOT_FOUND_STATUS)
+    ]
+
+
+def test_find_last_check_mismatches(db):
+    stale = add_url(db, "https://stale.com")
+    tied = add_url(db, "https://tied.org")
+    in_sync = add_url(db, "https://in-sync.com")
+    unchecked = add_url(db, "https://unchecked.org")
+    orphan = add_url(db, "https://orphan.com")
+    add_checks(
+        db,
+        (stale, OK_STATUS, CHECKED_AT),
+        (tied, NOT_FOUND_STATUS, CHECKED_AT),
+        (tied, OK_STATUS, CHECKED_AT),
+        (in_sync, OK_STATUS, CHECKED_AT),
+    )
+    db.conn.executemany(
+        """
+        UPDATE urls SET last_checked_at = ?, last_status_code = ?
+        WHERE id = ?
+        """,
+        [
+            (EARLIER, NOT_FOUND_STATUS, stale),
+            (CHECKED_AT, NOT_FOUND_STATUS, tied),
+            (CHECKED_AT, OK_STATUS, in_sync),
+            (CHECKED_AT, OK_STATUS, orphan),
+        ],
+    )
+
+    assert database.find_last_check_mismatches() == [
+        (stale, EARLIER, NOT_FOUND_STATUS, CHECKED_AT, OK_STATUS),
+        (tied, CHECKED_AT, NOT_FOUND_STATUS, CHECKED_AT, OK_STATUS),
+        (orphan, CHECKED_AT, OK_STATUS, None, None),
+    ]
+    assert database.find_last_check_mismatches(limit=1) == [
+        (stale, EARLIER, NOT_FOUND_STATUS, CHECKED_AT, OK_STATUS)
+    ]
+    assert unchecked not in {
+        row[0] for row in database.find_last_check_mismatches()
+    }
+
+
+def test_iter_urls_with_last_check(db):
+    checked = add_url(db, "https://checked.net")
+    unchecked = add_url(db, "https://unchecked.net")
+    database.insert_url_check(checked, NOT_FOUND_STATUS, "old", None, None)
+    database.insert_url_check(checked, OK_STATUS, "new", None, None)
+
+    rows = list(database.iter_urls(batch_size=1, with_last_check=True))
+
+    assert rows == [
+        (
+            checked,
+            "https://checked.net",
+            (OK_STATUS, "new", None, None, None, None, None),
+        ),
+        (unchecked, "https://unchecked.net", None),
+    ]
@@ -0,0 +1,154 @@
+import csv
+import importlib
+import json
+from datetime import datetime, timedelta
+
+import pytest
+import test_app_index  # noqa: F401  installs the third-party stubs
+
+export = importlib.import_module("page_analyzer.export")
+
+NOW = datetime(2024, 6, 1, 12, 0)
+ROW_GROUP_SIZE = 2
+ITERSIZE = 500
+HTTP_OK = 200
+
+
+def check(check_id):
+    return (
+        check_id,
+        1,
+        HTTP_OK,
+        "h1",
+        "title, with comma",
+        None,
+        NOW - timedelta(hours=check_id),
+        None,
+        None,
+        "abc",
+    )
+
+
+@pytest.fixture
+def stored(monkeypatch):
+    """Checks in the fake database and the queries run against it."""
+    checks = {"rows": [check(1), check(2), check(3)], "queries": []}
+
+    def settled(timeout):
+        checks["timeout"] = timeout
+        newest = max((row[0] for row in checks["rows"]), default=0)
+        return checks.get("settled", newest)
+
+    def stream(query, params=(), itersize=None):
+        checks["queries"].append((query, params, itersize))
+        after_id, up_to_id = params
+        for row in sorted(checks["rows"]):
+            if after_id < row[0] <= up_to_id:
+                yield row
+
+    monkeypatch.setattr(export.database, "settled_check_id", settled)
+    monkeypatch.setattr(export.database, "stream_rows", stream)
+    return checks
+
+
+def read_csv(path):
+    with open(path, encoding="utf-8", newline="") as csv_file:
+        return list(csv.reader(csv_file))
+
+
+def test_export_writes_csv_and_state(tmp_path, stored):
+    chunks = []
+
+    stats = export.export_checks(
+        tmp_path,
+        itersize=ITERSIZE,
+        row_group_size=ROW_GROUP_SIZE,
+        on_chunk=lambda stats: chunks.append(stats.rows),
+    )
+
+    assert stats.path == tmp_path / "url_checks_1_3.csv"
+    rows = read_csv(stats.path)
+    assert rows[0] == list(export.EXPORT_COLUMNS)
+    assert rows[1][:5] == ["1", "1", "200", "h1", "title, with comma"]
+    assert rows[1][6] == "2024-06-01T11:00:00"
+    assert len(rows) == len(stored["rows"]) + 1
+    assert chunks == [2, 3]
+    state = json.loads((tmp_path / export.STATE_FILE).read_text())
+    assert state["last_id"] == len(stored["rows"])
+    query, params, itersize = stored["queries"][0]
+    assert query.endswith("WHERE id > %s AND id <= %s ORDER BY id")
+    assert params == (0, len(stored["rows"]))
+    assert itersize == ITERSIZE
+    assert stored["timeout"] == export.DEFAULT_WAIT
+
+
+def test_export_only_reads_new_checks(tmp_path, stored):
+    export.export_checks(tmp_path)
+    stored["rows"].append(check(4))
+
+    stats = export.export_checks(tmp_path)
+
+    assert stats.path.name == "url_checks_4_4.csv"
+    assert stored["queries"][-1][1][0] == len(stored["rows"]) - 1
+    assert export.export_checks(tmp_path).rows == 0
+    full = export.export_checks(tmp_path, full=True)
+    assert full.rows == len(stored["rows"])
+
+
+def test_export_stops_at_the_settled_id(tmp_path, stored):
+    # Check 4 is still being inserted while 5 is already committed.
+    stored["rows"].append(check(5))
+    stored["settled"] = 3
+
+    assert export.export_checks(tmp_path).path.name == "url_checks_1_3.csv"
+
+    stored["rows"].append(check(4))
+    stored["settled"] = 5
+    stats = export.export_checks(tmp_path)
+    assert stats.path.name == "url_checks_4_5.csv"
+
+
+def test_export_with_nothing_new_leaves_no_file(tmp_path, stored):
+    stored["rows"] = []
+
+    stored["settled"] = 3
+
+    stats = export.export_checks(tmp_path)
+
+    assert stats.summary() == "no new checks to export"
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_failed_export_keeps_state_and_removes_partial_file(
+    tmp_path, monkeypatch, stored
+):
+    export.ExportState(last_id=1).save(tmp_path / export.STATE_FILE)
+
+    def broken_stream(query, params=(), itersize=None):
+        yield check(2)
+        raise RuntimeError("connection lost")
+
+    monkeypatch.setattr(export.database, "stream_rows", broken_stream)
+
+    with pytest.raises(RuntimeError):
+        export.export_checks(tmp_path, row_group_size=1)
+
+    assert [path.name for path in tmp_path.iterdir()] == [export.STATE_FILE]
+    assert export.ExportState.load(tmp_path / export.STATE_FILE).last_id == 1
+
+
+def test_parquet_export_uses_row_groups(tmp_path, stored):
+    pq = pytest.importorskip("pyarrow.parquet")
+    if not export.PARQUET_AVAILABLE:
+        pytest.skip("pyarrow was missing when page_analyzer was imported")
+
+    stats = export.export_checks(
+        tmp_path, "parquet", row_group_size=ROW_GROUP_SIZE
+    )
+
+    parquet_file = pq.ParquetFile(stats.path)
+    row_groups = -(-len(stored["rows"]) // ROW_GROUP_SIZE)
+    assert parquet_file.metadata.num_row_groups == row_groups
+    table = parquet_file.read()
+    assert table.column("id").to_pylist() == [1, 2, 3]
+    assert table.column("created_at").to_pylist()[0] == check(1)[6]
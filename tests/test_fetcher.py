@@ -0,0 +1,100 @@
+import sys
+import types
+from datetime import timedelta
+
+import pytest
+from test_parser import parser  # noqa: F401  loads fetcher with stubs
+
+READ_TIMEOUT = 7
+PER_HOST = 3
+RETRIES = 4
+HTTP_OK = 200
+TOO_MANY_REQUESTS = 429
+ELAPSED = timedelta(milliseconds=20)
+
+
+@pytest.fixture
+def fetcher_module(parser):  # noqa: F811
+    return sys.modules["page_analyzer.fetcher"]
+
+
+def test_config_from_env(fetcher_module, monkeypatch):
+    monkeypatch.setenv("FETCH_READ_TIMEOUT", str(READ_TIMEOUT))
+    monkeypatch.setenv("FETCH_PER_HOST", str(PER_HOST))
+    monkeypatch.setenv("FETCH_USER_AGENT", "test-agent")
+
+    config = fetcher_module.FetcherConfig.from_env()
+
+    assert config.read_timeout == READ_TIMEOUT
+    assert config.per_host == PER_HOST
+    assert config.user_agent == "test-agent"
+
+
+def test_session_is_shared_and_configured(fetcher_module, monkeypatch):
+    mounted = {}
+    monkeypatch.setattr(
+        fetcher_module.requests.Session,
+        "mount",
+        lambda self, prefix, adapter: mounted.update({prefix: adapter}),
+    )
+    config = fetcher_module.FetcherConfig(
+        per_host=PER_HOST, retries=RETRIES, user_agent="ua"
+    )
+    fetcher = fetcher_module.Fetcher(config)
+
+    session = fetcher.session
+
+    assert fetcher.session is session
+    assert session.headers["User-Agent"] == "ua"
+    adapter = mounted["https://"]
+    assert adapter["pool_maxsize"] == PER_HOST
+    assert adapter["pool_block"]
+    retry = adapter["max_retries"]
+    assert retry["connect"] == RETRIES
+    assert retry["status"] == RETRIES
+    assert retry["read"] == 0
+    assert retry["respect_retry_after_header"] is False
+    assert set(retry["status_forcelist"]) == set(fetcher_module.RETRY_STATUSES)
+
+
+def test_get_uses_separate_connect_and_read_timeouts(fetcher_module):
+    calls = []
+    config = fetcher_module.FetcherConfig(connect_timeout=1, read_timeout=2)
+    fetcher = fetcher_module.Fetcher(config)
+
+    def fake_get(url, timeout):
+        calls.append((url, timeout))
+        return types.SimpleNamespace(status_code=HTTP_OK, elapsed=ELAPSED)
+
+    fetcher.session.get = fake_get
+
+    fetcher.get("https://example.com")
+    fetcher.get("https://example.com", timeout=READ_TIMEOUT)
+
+    assert calls == [
+        ("https://example.com", (1, 2)),
+        ("https://example.com", (1, READ_TIMEOUT)),
+    ]
+
+
+def test_session_is_rebuilt_after_fork(fetcher_module):
+    fetcher = fetcher_module.Fetcher(fetcher_module.FetcherConfig())
+    session = fetcher.session
+    fetcher._pid = -1
+
+    assert fetcher.session is not session
+
+
+def test_get_refuses_to_wait_out_a_long_retry_after(fetcher_module):
+    config = fetcher_module.FetcherConfig(read_timeout=READ_TIMEOUT)
+    fetcher = fetcher_module.Fetcher(config)
+    fetcher.session.get = lambda url, timeout: types.SimpleNamespace(
+        status_code=TOO_MANY_REQUESTS,
+        headers={"Retry-After": "30"},
+        elapsed=ELAPSED,
+    )
+
+    fetcher.get("https://example.com/a")
+
+    with pytest.raises(fetcher_module.RateLimitedError):
+        fetcher.get("https://example.com:8080/b")
@@ -0,0 +1,77 @@
+import importlib
+
+import test_app_index  # noqa: F401  installs the third-party stubs
+
+importer = importlib.import_module("page_analyzer.importer")
+
+BATCH_SIZE = 2
+EXISTING = "https://b.com"
+
+
+def test_read_urls_takes_first_column_and_skips_header():
+    lines = [
+        "﻿url,comment\n",
+        "https://a.com,first\n",
+        "\n",
+        '"https://b.com/x",second\n',
+        "  https://c.com  \n",
+    ]
+
+    assert list(importer.read_urls(lines)) == [
+        "https://a.com",
+        "https://b.com/x",
+        "https://c.com",
+    ]
+
+
+def test_import_urls_counts_and_batches(monkeypatch):
+    batches = []
+
+    def fake_insert(names):
+        batches.append(list(names))
+        return len([name for name in names if name != EXISTING])
+
+    monkeypatch.setattr(importer, "insert_urls", fake_insert)
+    lines = [
+        "https://a.com/page\n",
+        "https://a.com/other\n",
+        "not a url\n",
+        f"{EXISTING}\n",
+        "https://c.com\n",
+        "ftp\n",
+    ]
+
+    stats = importer.import_urls(lines, batch_size=BATCH_SIZE)
+
+    assert batches == [["https://a.com", EXISTING], ["https://c.com"]]
+    assert (stats.inserted, stats.duplicates, stats.invalid) == (2, 2, 2)
+    assert stats.summary() == "2 inserted, 2 duplicate(s), 2 invalid"
+
+
+def test_normalize_stored_urls_renames_and_merges(monkeypatch):
+    stored = [
+        (1, "https://example.com"),
+        (2, "HTTPS://Example.com"),
+        (3, "http://Other.com:80"),
+        (4, "https://" + "ä" * 64 + ".de"),
+    ]
+    names = {name: url_id for url_id, name in stored}
+    changes = []
+
+    def fake_canonicalize(url_id, name, *, apply):
+        assert apply
+        return names.setdefault(name, url_id)
+
+    monkeypatch.setattr(importer, "iter_urls", lambda: iter(stored))
+    monkeypatch.setattr(importer, "canonicalize_url", fake_canonicalize)
+
+    stats = importer.normalize_stored_urls(
+        on_change=lambda *change: changes.append(change)
+    )
+
+    assert changes == [
+        (2, "HTTPS://Example.com", "https://example.com", 1),
+        (3, "http://Other.com:80", "http://other.com", 3),
+        (4, stored[3][1], None, None),
+    ]
+    assert stats.summary() == "1 renamed, 1 merged, 1 invalid"
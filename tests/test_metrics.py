@@ -0,0 +1,198 @@
+import importlib
+import json
+import logging
+import os
+
+import pytest
+import test_app_index as app_index
+
+metrics = importlib.import_module("page_analyzer.metrics")
+database = importlib.import_module("page_analyzer.database")
+
+OK_STATUS = 200
+SLOW_QUERY_MS = 100
+OTHER_PID = 999_999
+FLUSH_INTERVAL = 5
+
+
+def series(metric, **labels):
+    key = [str(labels[name]) for name in metric.labelnames]
+    for labels_, values in metric.snapshot():
+        if labels_ == key:
+            return values
+    return None
+
+
+def test_histogram_renders_cumulative_buckets():
+    registry = metrics.Registry()
+    histogram = registry.histogram(
+        "latency_seconds", "Latency.", ("route",), buckets=(0.1, 1.0)
+    )
+
+    histogram.observe(0.05, route="/")
+    histogram.observe(0.5, route="/")
+    histogram.observe(5, route="/")
+
+    lines = registry.render().splitlines()
+    assert lines[:2] == [
+        "# HELP page_analyzer_latency_seconds Latency.",
+        "# TYPE page_analyzer_latency_seconds histogram",
+    ]
+    assert lines[2:] == [
+        'page_analyzer_latency_seconds_bucket{route="/",le="0.1"} 1',
+        'page_analyzer_latency_seconds_bucket{route="/",le="1.0"} 2',
+        'page_analyzer_latency_seconds_bucket{route="/",le="+Inf"} 3',
+        'page_analyzer_latency_seconds_sum{route="/"} 5.55',
+        'page_analyzer_latency_seconds_count{route="/"} 3',
+    ]
+
+
+def test_counter_escapes_label_values():
+    registry = metrics.Registry()
+    counter = registry.counter("errors_total", "Errors.", ("reason",))
+
+    counter.inc(reason='bad "quote"\n')
+    counter.inc(reason='bad "quote"\n')
+
+    assert registry.render().splitlines()[-1] == (
+        'page_analyzer_errors_total{reason="bad \\"quote\\"\\n"} 2'
+    )
+
+
+def test_render_adds_up_the_files_of_other_processes(tmp_path):
+    registry = metrics.Registry(tmp_path, flush_interval=60)
+    registry.start()
+    histogram = registry.histogram("latency_seconds", "Latency.", ("route",))
+    histogram.observe(0.2, route="/")
+    registry.flush()
+    other = {
+        histogram.name: [
+            [["/"], [0] * len(metrics.DEFAULT_BUCKETS) + [2, 30.0]],
+            [["/urls"], [1] + [0] * len(metrics.DEFAULT_BUCKETS) + [0.001]],
+        ]
+    }
+    (tmp_path / f"metrics_{OTHER_PID}.json").write_text(json.dumps(other))
+    histogram.observe(0.2, route="/")
+    registry.flush()
+
+    text = registry.render()
+
+    assert f'{histogram.name}_count{{route="/"}} 4' in text
+    assert f'{histogram.name}_sum{{route="/"}} 30.4' in text
+    assert f'{histogram.name}_count{{route="/urls"}} 1' in text
+    own = json.loads((tmp_path / f"metrics_{os.getpid()}.json").read_text())
+    assert own[histogram.name][0][1][-1] == pytest.approx(0.2)
+
+
+def test_flush_is_rate_limited(tmp_path):
+    registry = metrics.Registry(tmp_path, flush_interval=60)
+    registry.start()
+    counter = registry.counter("events_total", "Events.")
+    counter.inc()
+    registry.flush()
+    counter.inc()
+
+    registry.flush()
+    path = tmp_path / f"metrics_{os.getpid()}.json"
+    assert json.loads(path.read_text())[counter.name] == [[[], [1]]]
+
+    registry.flush(force=True)
+    assert json.loads(path.read_text())[counter.name] == [[[], [2]]]
+
+
+def test_settings_are_read_from_the_environment_on_first_use(
+    tmp_path, monkeypatch
+):
+    registry = metrics.Registry(from_env=True)
+    # As when .env is loaded after the module is imported.
+    monkeypatch.setenv("METRICS_DIR", str(tmp_path / "metrics"))
+    monkeypatch.setenv("METRICS_FLUSH_INTERVAL", str(FLUSH_INTERVAL))
+
+    assert registry.directory == tmp_path / "metrics"
+    assert registry.directory.is_dir()
+    assert registry.flush_interval == FLUSH_INTERVAL
+
+
+def test_processes_that_did_not_start_write_nothing(tmp_path):
+    registry = metrics.Registry(tmp_path)
+    registry.counter("events_total", "Events.").inc()
+
+    registry.flush(force=True)
+
+    assert list(tmp_path.glob("metrics_*.json")) == []
+
+
+def test_files_of_exited_processes_are_archived(tmp_path, monkeypatch):
+    registry = metrics.Registry(tmp_path)
+    counter = registry.counter("events_total", "Events.")
+    own = tmp_path / f"metrics_{os.getpid()}.json"
+    own.write_text(json.dumps({counter.name: [[[], [3]]]}))
+    exited = tmp_path / f"metrics_{OTHER_PID}.json"
+    exited.write_text(json.dumps({counter.name: [[[], [2]]]}))
+    running = tmp_path / "metrics_1.json"
+    running.write_text(json.dumps({counter.name: [[[], [1]]]}))
+    monkeypatch.setattr(metrics, "_is_running", lambda pid: pid != OTHER_PID)
+    registry.start()
+    counter.inc()
+
+    registry.flush()
+
+    assert not exited.exists()
+    assert running.exists()
+    archive = json.loads((tmp_path / metrics.ARCHIVE_NAME).read_text())
+    assert archive[counter.name] == [[[], [5]]]
+    assert json.loads(own.read_text())[counter.name] == [[[], [1]]]
+    assert registry.render().splitlines()[-1] == f"{counter.name} 7"
+
+    registry.archive(os.getpid())
+
+    assert not own.exists()
+    assert registry.render().splitlines()[-1] == f"{counter.name} 8"
+
+
+def test_slow_queries_are_logged_and_counted(monkeypatch, caplog):
+    ticks = iter([0.0, SLOW_QUERY_MS / 1000])
+    monkeypatch.setattr(database, "SLOW_QUERY_MS", SLOW_QUERY_MS)
+    monkeypatch.setattr(database.time, "perf_counter", lambda: next(ticks))
+    before = series(metrics.DB_SLOW_QUERIES, statement="lookup") or [0]
+
+    @database.timed_query
+    def lookup():
+        return "row"
+
+    with caplog.at_level(logging.WARNING, logger=database.__name__):
+        assert lookup() == "row"
+
+    assert "slow query lookup took 100.0 ms" in caplog.text
+    assert series(metrics.DB_SLOW_QUERIES, statement="lookup") == [
+        before[0] + 1
+    ]
+    assert series(metrics.DB_QUERY_SECONDS, statement="lookup")[-1] > 0
+
+
+def test_metrics_endpoint_reports_request_latency(monkeypatch):
+    monkeypatch.setattr(app_index.app, "render_template", lambda name: "")
+    client = app_index.app.app.test_client()
+    client.get("/")
+
+    response = client.get("/metrics")
+
+    assert response.status_code == OK_STATUS
+    assert response.content_type == metrics.CONTENT_TYPE
+    assert (
+        "page_analyzer_http_request_duration_seconds_count"
+        '{endpoint="index",method="GET",status="200"}'
+    ) in response.data.decode()
+
+
+def test_render_template_is_timed(monkeypatch):
+    monkeypatch.setattr(
+        app_index.app, "flask_render_template", lambda name, **context: name
+    )
+    before = series(metrics.TEMPLATE_RENDER_SECONDS, template="urls.html")
+    count = sum(before[:-1]) if before else 0
+
+    assert app_index.app.render_template("urls.html", urls=[]) == "urls.html"
+
+    values = series(metrics.TEMPLATE_RENDER_SECONDS, template="urls.html")
+    assert sum(values[:-1]) == count + 1
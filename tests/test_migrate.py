@@ -0,0 +1,106 @@
+import importlib.util
+from pathlib import Path
+
+import pytest
+
+module_path = (
+    Path(__file__).resolve().parents[1] / "page_analyzer" / "migrate.py"
+)
+spec = importlib.util.spec_from_file_location("migrate", module_path)
+migrate = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(migrate)
+
+FIRST_VERSION = 1
+SECOND_VERSION = 2
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self.rows = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        pass
+
+    def execute(self, query, params=None):
+        self.conn.executed.append(query.strip())
+        if query.startswith("INSERT INTO schema_version"):
+            self.conn.versions.add(params[0])
+        if query == "SELECT version FROM schema_version":
+            self.rows = [(version,) for version in self.conn.versions]
+
+    def fetchall(self):
+        return self.rows
+
+
+class FakeConnection:
+    def __init__(self, versions=()):
+        self.autocommit = False
+        self.versions = set(versions)
+        self.executed = []
+
+    def cursor(self):
+        return FakeCursor(self)
+
+
+@pytest.fixture
+def migrations_dir(tmp_path):
+    (tmp_path / "0001_create.sql").write_text("CREATE TABLE a (id INT);\n")
+    (tmp_path / "0002_index.sql").write_text(
+        "-- migrate: no-transaction\n"
+        "CREATE INDEX CONCURRENTLY a_idx ON a (id);\n"
+        "-- second statement\n"
+        "CREATE INDEX CONCURRENTLY a_idx2 ON a (id DESC);\n"
+    )
+    return tmp_path
+
+
+def test_discover_orders_by_version(migrations_dir):
+    found = migrate.discover(migrations_dir)
+    assert [m.version for m in found] == [FIRST_VERSION, SECOND_VERSION]
+    assert found[0].transactional
+    assert not found[1].transactional
+
+
+def test_discover_rejects_bad_names(tmp_path):
+    (tmp_path / "initial.sql").write_text("SELECT 1;")
+    with pytest.raises(ValueError, match="bad migration file name"):
+        migrate.discover(tmp_path)
+
+
+def test_no_transaction_migration_is_split_into_statements(migrations_dir):
+    migration = migrate.discover(migrations_dir)[1]
+    statements = migration.statements()
+    assert len(statements) == SECOND_VERSION
+    assert statements[0].endswith("CREATE INDEX CONCURRENTLY a_idx ON a (id)")
+
+
+def test_migrate_applies_pending_only(migrations_dir):
+    conn = FakeConnection(versions={FIRST_VERSION})
+
+    applied = migrate.migrate(conn, migrations_dir)
+
+    assert [m.version for m in applied] == [SECOND_VERSION]
+    assert conn.autocommit
+    assert "BEGIN" not in conn.executed
+    assert "CREATE TABLE a (id INT);" not in conn.executed
+    assert conn.versions == {FIRST_VERSION, SECOND_VERSION}
+    assert conn.executed[-1].startswith("SELECT pg_advisory_unlock")
+
+
+def test_migrate_wraps_transactional_files(migrations_dir):
+    conn = FakeConnection()
+
+    migrate.migrate(conn, migrations_dir, target=FIRST_VERSION)
+
+    begin = conn.executed.index("BEGIN")
+    assert conn.executed[begin + 1] == "CREATE TABLE a (id INT);"
+    assert conn.executed[begin + 3] == "COMMIT"
+    assert conn.versions == {FIRST_VERSION}
+
+
+def test_shipped_migrations_are_valid():
+    assert migrate.discover()
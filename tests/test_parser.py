@@ -2,11 +2,14 @@ import importlib.util
 import re
 import sys
 import types
+from datetime import timedelta
 from http import HTTPStatus
 from pathlib import Path
 
 import pytest
 
+ELAPSED = timedelta(milliseconds=20)
+
 
 class RequestException(Exception):
     pass
@@ -51,32 +54,95 @@ class FakeSoup:
         return None
 
 
+class FakeSession:
+    def __init__(self):
+        self.headers = {}
+
+    def mount(self, prefix, adapter):
+        pass
+
+    def get(self, url, timeout=None, **kwargs):
+        raise AssertionError("network access in tests")
+
+
+class FakeAdapter(dict):
+    def __init__(self, **kwargs):
+        super().__init__(kwargs)
+
+
+URLLIB3_STUBS = {
+    "urllib3.connection": ("HTTPConnection", "HTTPSConnection"),
+    "urllib3.connectionpool": ("HTTPConnectionPool", "HTTPSConnectionPool"),
+    "urllib3.exceptions": (
+        "ConnectTimeoutError",
+        "NameResolutionError",
+        "NewConnectionError",
+    ),
+}
+
+
+PACKAGE_DIR = Path(__file__).resolve().parents[1] / "page_analyzer"
+
+
+def load_package_module(monkeypatch, name):
+    page_pkg = types.ModuleType("page_analyzer")
+    page_pkg.__path__ = [str(PACKAGE_DIR)]
+    monkeypatch.setitem(
+        sys.modules, "page_analyzer", sys.modules.get("page_analyzer", page_pkg)
+    )
+    spec = importlib.util.spec_from_file_location(
+        f"page_analyzer.{name}", PACKAGE_DIR / f"{name}.py"
+    )
+    module = importlib.util.module_from_spec(spec)
+    monkeypatch.setitem(sys.modules, f"page_analyzer.{name}", module)
+    spec.loader.exec_module(module)
+    return module
+
+
 @pytest.fixture
 def parser(monkeypatch):
     requests_stub = types.ModuleType("requests")
     exceptions_stub = types.ModuleType("requests.exceptions")
     exceptions_stub.RequestException = RequestException
     requests_stub.exceptions = exceptions_stub
+    requests_stub.Session = FakeSession
+    adapters_stub = types.ModuleType("requests.adapters")
+    adapters_stub.HTTPAdapter = FakeAdapter
     monkeypatch.setitem(sys.modules, "requests", requests_stub)
     monkeypatch.setitem(sys.modules, "requests.exceptions", exceptions_stub)
+    monkeypatch.setitem(sys.modules, "requests.adapters", adapters_stub)
+
+    retry_stub = types.ModuleType("urllib3.util.retry")
+    retry_stub.Retry = lambda **kwargs: kwargs
+    monkeypatch.setitem(sys.modules, "urllib3", types.ModuleType("urllib3"))
+    monkeypatch.setitem(
+        sys.modules, "urllib3.util", types.ModuleType("urllib3.util")
+    )
+    monkeypatch.setitem(sys.modules, "urllib3.util.retry", retry_stub)
+    for name, attrs in URLLIB3_STUBS.items():
+        stub = types.ModuleType(name)
+        for attr in attrs:
+            setattr(stub, attr, type(attr, (Exception,), {}))
+        monkeypatch.setitem(sys.modules, name, stub)
+
+    validators_stub = types.ModuleType("validators")
+    validators_stub.url = lambda value: True
+    monkeypatch.setitem(sys.modules, "validators", validators_stub)
 
     bs4_stub = types.ModuleType("bs4")
     bs4_stub.BeautifulSoup = FakeSoup
     monkeypatch.setitem(sys.modules, "bs4", bs4_stub)
 
-    parser_path = (
-        Path(__file__).resolve().parents[1] / "page_analyzer" / "parser.py"
-    )
-    spec = importlib.util.spec_from_file_location("parser", parser_path)
-    parser_module = importlib.util.module_from_spec(spec)
-    spec.loader.exec_module(parser_module)
-    return parser_module
+    load_package_module(monkeypatch, "resolver")
+    load_package_module(monkeypatch, "fetcher")
+    return load_package_module(monkeypatch, "parser")
 
 
 def test_fetch_html(parser, monkeypatch):
     class MockResponse:
         status_code = 200
         text = "<html></html>"
+        elapsed = ELAPSED
 
         def raise_for_status(self):
             pass
@@ -84,7 +150,7 @@ def test_fetch_html(parser, monkeypatch):
     def mock_get(url, timeout):
         return MockResponse()
 
-    monkeypatch.setattr(parser.requests, "get", mock_get, raising=False)
+    monkeypatch.setattr(parser.fetcher.session, "get", mock_get)
     html, status = parser.fetch_html("http://example.com")
     assert html == "<html></html>"
     assert status == HTTPStatus.OK
@@ -94,7 +160,7 @@ def test_fetch_html_error(parser, monkeypatch):
     def mock_get(url, timeout):
         raise RequestException("error")
 
-    monkeypatch.setattr(parser.requests, "get", mock_get, raising=False)
+    monkeypatch.setattr(parser.fetcher.session, "get", mock_get)
     with pytest.raises(RequestException):
         parser.fetch_html("http://example.com")
 
@@ -117,3 +183,148 @@ def test_parse_seo_missing_tags(parser):
     assert h1 is None
     assert title is None
     assert description is None
+
+
+class StreamingResponse:
+    status_code = 200
+    elapsed = ELAPSED
+
+    def __init__(self, chunks, headers=None):
+        self.chunks = chunks
+        self.headers = headers or {}
+        self.encoding = None
+        self.sent = 0
+        self.closed = False
+
+    def raise_for_status(self):
+        pass
+
+    def iter_content(self, chunk_size):
+        for chunk in self.chunks:
+            self.sent += 1
+            yield chunk
+
+    def close(self):
+        self.closed = True
+
+
+def test_fetch_seo_stops_once_tags_are_found(parser, monkeypatch):
+    head = (
+        b"<html><head><title>T</title>"
+        b"<meta name='description' content='D'></head><body><h1>H</h1>"
+    )
+    response = StreamingResponse([head, b"<p>" * 1000, b"</body>"])
+    monkeypatch.setattr(
+        parser.fetcher.session, "get", lambda url, **kwargs: response
+    )
+
+    result = parser.fetch_seo("http://example.com")
+
+    assert (result.h1, result.title, result.description) == ("H", "T", "D")
+    assert result.bytes_read == len(head)
+    assert result.stopped_early
+    assert not result.truncated
+    assert response.sent == 1
+    assert response.closed
+
+
+def test_fetch_seo_respects_max_bytes(parser, monkeypatch):
+    max_bytes = 20
+    response = StreamingResponse([b"<title>Title</title><p>", b"x" * 100])
+    monkeypatch.setattr(
+        parser.fetcher.session, "get", lambda url, **kwargs: response
+    )
+
+    result = parser.fetch_seo("http://example.com", max_bytes=max_bytes)
+
+    assert result.bytes_read == max_bytes
+    assert result.truncated
+    assert result.title == "Title"
+    assert result.h1 is None
+
+
+def test_fetch_seo_decodes_meta_charset(parser, monkeypatch):
+    html = "<meta charset='windows-1251'><title>Привет</title>"
+    response = StreamingResponse([html.encode("cp1251")])
+    monkeypatch.setattr(
+        parser.fetcher.session, "get", lambda url, **kwargs: response
+    )
+
+    assert parser.fetch_seo("http://example.com").title == "Привет"
+
+
+def test_parser_backend_selection(parser, monkeypatch):
+    monkeypatch.setenv("SEO_PARSER_BACKEND", "bs4")
+    assert parser.get_parser_backend() is parser.parse_seo_bs4
+    assert parser.get_parser_backend("html") is parser.extract_seo
+    with pytest.raises(ValueError, match="unknown"):
+        parser.get_parser_backend("regex")
+
+
+class PageResponse:
+    elapsed = ELAPSED
+
+    def __init__(self, status_code, body=b"", headers=None):
+        self.status_code = status_code
+        self.content = body
+        self.text = body.decode()
+        self.headers = headers or {}
+
+    def raise_for_status(self):
+        pass
+
+
+PAGE = b"<title>T</title><h1>H</h1>"
+
+
+def serve(parser, monkeypatch, response):
+    sent = []
+
+    def fake_get(url, **kwargs):
+        sent.append(kwargs.get("headers"))
+        return response
+
+    monkeypatch.setattr(parser.fetcher.session, "get", fake_get)
+    return sent
+
+
+def test_check_page_parses_and_fingerprints(parser, monkeypatch):
+    response = PageResponse(HTTPStatus.OK, PAGE, {"ETag": '"v1"'})
+    sent = serve(parser, monkeypatch, response)
+
+    result = parser.check_page("http://example.com")
+
+    assert sent == [None]
+    assert (result.h1, result.title, result.etag) == ("H", "T", '"v1"')
+    assert result.content_hash == parser.content_hash(PAGE)
+    assert not result.unchanged
+
+
+def test_check_page_reuses_last_check_on_not_modified(parser, monkeypatch):
+    last_check = parser.LastCheck(
+        HTTPStatus.OK, "H", "T", None, '"v1"', "Mon, 01 Jan 2024", "abc"
+    )
+    sent = serve(parser, monkeypatch, PageResponse(HTTPStatus.NOT_MODIFIED))
+
+    result = parser.check_page("http://example.com", last_check=last_check)
+
+    assert sent == [
+        {"If-None-Match": '"v1"', "If-Modified-Since": "Mon, 01 Jan 2024"}
+    ]
+    assert result.unchanged
+    assert result.status_code == HTTPStatus.OK
+    assert (result.h1, result.title, result.etag) == ("H", "T", '"v1"')
+    assert result.content_hash == "abc"
+
+
+def test_check_page_skips_parsing_when_hash_matches(parser, monkeypatch):
+    last_check = parser.LastCheck(
+        HTTPStatus.OK, "old", None, None, content_hash=parser.content_hash(PAGE)
+    )
+    serve(parser, monkeypatch, PageResponse(HTTPStatus.OK, PAGE))
+    monkeypatch.setattr(parser, "parse_seo", lambda html: pytest.fail())
+
+    result = parser.check_page("http://example.com", last_check=last_check)
+
+    assert result.unchanged
+    assert result.h1 == "old"
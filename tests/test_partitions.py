@@ -0,0 +1,193 @@
+import importlib
+from datetime import datetime
+
+import pytest
+import test_app_index  # noqa: F401  installs the third-party stubs
+
+partitions = importlib.import_module("page_analyzer.partitions")
+
+NOW = datetime(2024, 11, 15, 8, 30)
+LEGACY = partitions.Partition("url_checks_legacy", None, datetime(2024, 12, 1))
+DECEMBER = partitions.Partition(
+    "url_checks_2024_12", datetime(2024, 12, 1), datetime(2025, 1, 1)
+)
+
+
+def test_month_helpers():
+    assert partitions.month_start(NOW) == datetime(2024, 11, 1)
+    assert partitions.add_months(datetime(2024, 11, 1), 3) == datetime(
+        2025, 2, 1
+    )
+    assert partitions.add_months(datetime(2024, 1, 1), -1) == datetime(
+        2023, 12, 1
+    )
+    assert partitions.partition_name(datetime(2025, 2, 1)) == (
+        "url_checks_2025_02"
+    )
+
+
+def test_parse_bound():
+    assert partitions._parse_bound(
+        "FOR VALUES FROM (MINVALUE) TO ('2024-12-01 00:00:00')"
+    ) == (None, datetime(2024, 12, 1))
+    assert partitions._parse_bound(
+        "FOR VALUES FROM ('2024-12-01 00:00:00') TO ('2025-01-01 00:00:00')"
+    ) == (datetime(2024, 12, 1), datetime(2025, 1, 1))
+
+
+class FakeCursor:
+    """Records statements; ``to_regclass`` finds the tables in ``tables``."""
+
+    def __init__(self, statements, tables=(), rows=()):
+        self.statements = statements
+        self.tables = tables
+        self.rows = list(rows)
+        self.result = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, query, params=None):
+        if query.startswith("SELECT to_regclass"):
+            self.result = (params[0] if params[0] in self.tables else None,)
+            return
+        self.statements.append((" ".join(query.split()), params))
+
+    def fetchone(self):
+        return self.result
+
+    def fetchall(self):
+        return self.rows
+
+
+class FakeConnection:
+    def __init__(self, statements, tables=(), rows=()):
+        self.statements = statements
+        self.tables = tables
+        self.rows = rows
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def cursor(self):
+        return FakeCursor(self.statements, self.tables, self.rows)
+
+    def commit(self):
+        self.statements.append(("COMMIT", None))
+
+
+@pytest.fixture
+def tables():
+    return {partitions.DEFAULT_PARTITION}
+
+
+@pytest.fixture
+def statements(monkeypatch, tables):
+    executed = []
+    database = partitions.database
+    monkeypatch.setattr(partitions, "is_partitioned", lambda: True)
+    monkeypatch.setattr(
+        partitions, "list_partitions", lambda: [LEGACY, DECEMBER]
+    )
+    monkeypatch.setattr(
+        database, "get_conn", lambda: FakeConnection(executed, tables)
+    )
+    monkeypatch.setattr(
+        database,
+        "run_outside_transaction",
+        lambda statement: executed.append((statement, None)),
+    )
+    return executed
+
+
+def test_ensure_partitions_creates_missing_months(statements):
+    created = partitions.ensure_partitions(months_ahead=2, now=NOW)
+
+    january = (datetime(2025, 1, 1), datetime(2025, 2, 1))
+    assert created == ["url_checks_2025_01"]
+    assert statements == [
+        ("SELECT pg_advisory_xact_lock(%s)", (partitions.PARTITIONS_LOCK_ID,)),
+        (
+            "CREATE TABLE url_checks_2025_01 "
+            "(LIKE url_checks INCLUDING DEFAULTS)",
+            None,
+        ),
+        (
+            "WITH moved AS (DELETE FROM url_checks_default "
+            "WHERE created_at >= %s AND created_at < %s RETURNING *) "
+            "INSERT INTO url_checks_2025_01 SELECT * FROM moved",
+            january,
+        ),
+        (
+            "ALTER TABLE url_checks ATTACH PARTITION url_checks_2025_01 "
+            "FOR VALUES FROM (%s) TO (%s)",
+            january,
+        ),
+        ("COMMIT", None),
+    ]
+
+
+def test_ensure_partitions_skips_month_made_concurrently(statements, tables):
+    tables.add("url_checks_2025_01")
+
+    assert partitions.ensure_partitions(months_ahead=2, now=NOW) == []
+    assert [query for query, _ in statements] == [
+        "SELECT pg_advisory_xact_lock(%s)"
+    ]
+
+
+def test_list_partitions_leaves_out_the_default_partition(monkeypatch):
+    rows = [
+        ("url_checks_default", "DEFAULT"),
+        (
+            DECEMBER.name,
+            "FOR VALUES FROM ('2024-12-01 00:00:00') "
+            "TO ('2025-01-01 00:00:00')",
+        ),
+        (LEGACY.name, "FOR VALUES FROM (MINVALUE) TO ('2024-12-01 00:00:00')"),
+    ]
+    monkeypatch.setattr(
+        partitions.database,
+        "get_conn",
+        lambda: FakeConnection([], rows=rows),
+    )
+
+    assert partitions.list_partitions() == [LEGACY, DECEMBER]
+
+
+def test_ensure_partitions_skips_unpartitioned_table(monkeypatch, statements):
+    monkeypatch.setattr(partitions, "is_partitioned", lambda: False)
+
+    assert partitions.ensure_partitions(now=NOW) == []
+    assert statements == []
+
+
+def test_detach_partitions_only_takes_whole_old_months(statements):
+    assert partitions.detach_partitions(datetime(2024, 12, 20)) == [
+        "url_checks_legacy"
+    ]
+    assert partitions.detach_partitions(datetime(2025, 1, 1), drop=True) == [
+        "url_checks_legacy",
+        "url_checks_2024_12",
+    ]
+    assert statements[:3] == [
+        (
+            "SET LOCAL lock_timeout = %s",
+            (partitions.DETACH_LOCK_TIMEOUT,),
+        ),
+        (
+            'ALTER TABLE url_checks DETACH PARTITION "url_checks_legacy"',
+            None,
+        ),
+        ("COMMIT", None),
+    ]
+    assert statements[-2:] == [
+        ('DROP TABLE "url_checks_2024_12"', None),
+        ("COMMIT", None),
+    ]
@@ -0,0 +1,145 @@
+import importlib.util
+import sys
+import types
+from pathlib import Path
+
+import pytest
+
+
+class FakeError(Exception):
+    pass
+
+
+sys.modules["psycopg2"] = types.SimpleNamespace(
+    connect=lambda *args, **kwargs: None, Error=FakeError
+)
+
+module_path = Path(__file__).resolve().parents[1] / "page_analyzer" / "pool.py"
+spec = importlib.util.spec_from_file_location("pool", module_path)
+pool_module = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(pool_module)
+
+ConnectionPool = pool_module.ConnectionPool
+PoolTimeoutError = pool_module.PoolTimeoutError
+
+MAX_SIZE = 2
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        pass
+
+    def execute(self, query, params=None):
+        if self.conn.broken:
+            raise FakeError("server closed the connection")
+        self.conn.queries.append(query)
+
+
+class FakeConnection:
+    def __init__(self, dsn):
+        self.dsn = dsn
+        self.closed = 0
+        self.broken = False
+        self.queries = []
+        self.rollbacks = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        pass
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def rollback(self):
+        self.rollbacks += 1
+
+    def close(self):
+        self.closed = 1
+
+
+@pytest.fixture
+def pool():
+    return ConnectionPool(
+        "dsn", min_size=1, max_size=MAX_SIZE, timeout=0.01,
+        connect=FakeConnection,
+    )
+
+
+def test_connections_are_reused(pool):
+    with pool.connection() as first:
+        pass
+    with pool.connection() as second:
+        pass
+
+    assert first is second
+    stats = pool.stats()
+    assert stats["created"] == 1
+    assert stats["borrowed"] == MAX_SIZE
+    assert stats["idle"] == 1
+    assert stats["in_use"] == 0
+
+
+def test_checkout_time_is_reported():
+    waits = []
+    pool = ConnectionPool(
+        "dsn", connect=FakeConnection, on_checkout=waits.append
+    )
+
+    with pool.connection():
+        pass
+
+    assert len(waits) == 1
+    assert pool.stats()["wait_time_total"] == round(waits[0], 6)
+
+
+def test_checkout_times_out_when_exhausted(pool):
+    held = [pool.getconn() for _ in range(MAX_SIZE)]
+
+    with pytest.raises(PoolTimeoutError):
+        pool.getconn()
+
+    assert pool.stats()["timeouts"] == 1
+    pool.putconn(held[0])
+    assert pool.getconn() is held[0]
+
+
+def test_closed_connection_is_replaced(pool):
+    conn = pool.getconn()
+    pool.putconn(conn)
+    conn.closed = 2
+
+    fresh = pool.getconn()
+
+    assert fresh is not conn
+    assert pool.stats()["failed_checks"] == 1
+
+
+def test_stale_connection_is_pinged_on_borrow(pool):
+    pool.check_idle = 0
+    conn = pool.getconn()
+    pool.putconn(conn)
+    conn.broken = True
+
+    fresh = pool.getconn()
+
+    assert fresh is not conn
+    assert conn.closed
+
+
+def test_fork_forgets_inherited_connections(pool):
+    conn = pool.getconn()
+    pool.putconn(conn)
+
+    pool._after_fork()
+
+    assert pool.stats()["size"] == 0
+    assert not conn.closed
+    assert pool.getconn() is not conn
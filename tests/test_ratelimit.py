@@ -0,0 +1,116 @@
+import asyncio
+import sys
+import types
+from datetime import UTC, datetime
+
+import pytest
+from test_parser import load_package_module
+
+RATE = 2.0
+BURST = 2
+RETRY_AFTER = 30
+MAX_RETRY_AFTER = 10
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def ratelimit(monkeypatch):
+    validators_stub = types.ModuleType("validators")
+    validators_stub.url = lambda value: True
+    monkeypatch.setitem(sys.modules, "validators", validators_stub)
+    load_package_module(monkeypatch, "url_utils")
+    return load_package_module(monkeypatch, "ratelimit")
+
+
+def test_parse_retry_after(ratelimit):
+    now = datetime(2024, 1, 1, 12, 0, 0, tzinfo=UTC)
+    assert ratelimit.parse_retry_after(str(RETRY_AFTER)) == RETRY_AFTER
+    assert ratelimit.parse_retry_after(
+        "Mon, 01 Jan 2024 12:00:30 GMT", now=now
+    ) == float(RETRY_AFTER)
+    assert ratelimit.parse_retry_after("soon") is None
+    assert ratelimit.parse_retry_after(None) is None
+
+
+def test_bucket_allows_a_burst_then_spaces_requests(ratelimit):
+    clock = FakeClock()
+    limiter = ratelimit.HostRateLimiter(RATE, BURST, clock=clock)
+
+    assert [limiter.take("a.com") for _ in range(BURST)] == [0, 0]
+    assert limiter.take("a.com") == 1 / RATE
+    assert limiter.take("b.com") == 0
+
+    clock.now += 10
+    assert limiter.take("a.com") == 0
+
+
+def test_take_reserves_nothing_beyond_max_wait(ratelimit):
+    limiter = ratelimit.HostRateLimiter(RATE, BURST, clock=FakeClock())
+    for _ in range(BURST):
+        limiter.take("a.com")
+
+    assert limiter.take("a.com", max_wait=0) == 1 / RATE
+    assert limiter.take("a.com", max_wait=0) == 1 / RATE
+    assert limiter.take("a.com", max_wait=1 / RATE) == 1 / RATE
+    assert limiter.take("a.com") == 2 / RATE
+
+
+def test_retry_after_blocks_the_host(ratelimit):
+    clock = FakeClock()
+    limiter = ratelimit.HostRateLimiter(
+        RATE, BURST, max_retry_after=MAX_RETRY_AFTER, clock=clock
+    )
+
+    limiter.retry_after("https://a.com:8443/page", str(RETRY_AFTER))
+
+    assert limiter.take("a.com") == MAX_RETRY_AFTER
+    assert limiter.take("b.com") == 0
+
+
+def test_scheduler_interleaves_hosts(ratelimit):
+    limiter = ratelimit.HostRateLimiter(rate=0)
+    scheduler = ratelimit.HostScheduler(limiter)
+    urls = [
+        "https://a.com/1",
+        "https://a.com:8080/2",
+        "https://A.com/3",
+        "https://b.com/1",
+    ]
+
+    async def drain():
+        for url in urls:
+            await scheduler.put(url, url)
+        await scheduler.close()
+        return [item async for item in _until_none(scheduler)]
+
+    assert asyncio.run(drain()) == [
+        "https://a.com/1",
+        "https://b.com/1",
+        "https://a.com:8080/2",
+        "https://A.com/3",
+    ]
+
+
+def test_scheduler_skips_a_blocked_host(ratelimit):
+    limiter = ratelimit.HostRateLimiter(RATE, BURST)
+    limiter.defer("a.com", RETRY_AFTER)
+    scheduler = ratelimit.HostScheduler(limiter)
+
+    async def first():
+        await scheduler.put("a", "https://a.com/")
+        await scheduler.put("b", "https://b.com/")
+        return await asyncio.wait_for(scheduler.get(), 1)
+
+    assert asyncio.run(first()) == "b"
+
+
+async def _until_none(scheduler):
+    while (item := await scheduler.get()) is not None:
+        yield item
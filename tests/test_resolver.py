@@ -0,0 +1,75 @@
+import socket
+import sys
+
+import pytest
+from test_parser import parser  # noqa: F401  loads resolver with stubs
+
+TTL = 10
+ADDRESS = [(socket.AF_INET, socket.SOCK_STREAM, 6, "", ("10.0.0.1", 80))]
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def resolver(parser):  # noqa: F811
+    return sys.modules["page_analyzer.resolver"]
+
+
+@pytest.fixture
+def lookups():
+    return []
+
+
+def make_cache(resolver, lookups, clock, **kwargs):
+    def resolve(host, port, family, socktype):
+        lookups.append(host)
+        if host.endswith(".invalid"):
+            raise socket.gaierror(socket.EAI_NONAME, "Name not known")
+        if host.endswith(".flaky"):
+            raise socket.gaierror(socket.EAI_AGAIN, "Try again")
+        return ADDRESS
+
+    return resolver.DnsCache(resolve=resolve, clock=clock, **kwargs)
+
+
+def test_answers_are_cached_until_ttl(resolver, lookups):
+    clock = FakeClock()
+    cache = make_cache(resolver, lookups, clock, ttl=TTL)
+
+    assert cache.getaddrinfo("example.com", 80) == ADDRESS
+    assert cache.getaddrinfo("example.com", 80) == ADDRESS
+    clock.now += TTL
+    cache.getaddrinfo("example.com", 80)
+
+    assert lookups == ["example.com", "example.com"]
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == len(lookups)
+
+
+def test_nxdomain_is_cached_but_temporary_errors_are_not(resolver, lookups):
+    cache = make_cache(resolver, lookups, FakeClock())
+
+    for host in ("nope.invalid", "nope.invalid", "dns.flaky", "dns.flaky"):
+        with pytest.raises(socket.gaierror):
+            cache.getaddrinfo(host, 80)
+
+    assert lookups == ["nope.invalid", "dns.flaky", "dns.flaky"]
+    assert cache.stats()["negative_hits"] == 1
+
+
+def test_cache_size_is_bounded(resolver, lookups):
+    cache = make_cache(resolver, lookups, FakeClock(), max_size=2)
+
+    for host in ("a.com", "b.com", "a.com", "c.com", "a.com"):
+        cache.getaddrinfo(host, 80)
+
+    stats = cache.stats()
+    assert stats["size"] == cache.max_size
+    assert stats["evictions"] == 1
+    assert lookups == ["a.com", "b.com", "c.com"]
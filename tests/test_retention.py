@@ -0,0 +1,104 @@
+import importlib
+from datetime import datetime, timedelta
+
+import pytest
+import test_app_index  # noqa: F401  installs the third-party stubs
+
+retention = importlib.import_module("page_analyzer.retention")
+
+NOW = datetime(2024, 6, 1, 12, 0)
+MAX_URL_ID = 5
+URL_BATCH = 2
+DELETE_BATCH = 3
+ROW_SIZE = 100
+SIZE_BEFORE = 10_000
+SIZE_AFTER = 9_000
+
+
+def test_policy_cutoffs():
+    policy = retention.RetentionPolicy(raw_days=7, hourly_days=30)
+
+    raw_before, hourly_before, drop_before = policy.cutoffs(NOW)
+
+    assert raw_before == NOW - timedelta(days=7)
+    assert hourly_before == NOW - timedelta(days=30)
+    assert drop_before == NOW - timedelta(days=365)
+    assert retention.RetentionPolicy(daily_days=None).cutoffs(NOW)[2] is None
+
+
+@pytest.mark.parametrize(
+    ("raw_days", "hourly_days", "daily_days"),
+    [(-1, 30, 365), (30, 7, 365), (7, 30, 14)],
+)
+def test_policy_rejects_unordered_tiers(raw_days, hourly_days, daily_days):
+    with pytest.raises(ValueError, match="raw_days"):
+        retention.RetentionPolicy(raw_days, hourly_days, daily_days)
+
+
+@pytest.fixture
+def fake_database(monkeypatch):
+    calls = {"find": [], "delete": [], "vacuum": 0}
+    sizes = iter([SIZE_BEFORE, SIZE_AFTER])
+    database = retention.database
+
+    def find(start, end, **cutoffs):
+        calls["find"].append((start, end, cutoffs))
+        return [
+            (check_id, NOW - timedelta(days=check_id))
+            for check_id in range(start * 10, start * 10 + 4)
+        ]
+
+    def delete(checks):
+        calls["delete"].append(checks)
+        return len(checks), len(checks) * ROW_SIZE
+
+    def vacuum():
+        calls["vacuum"] += 1
+
+    monkeypatch.setattr(database, "max_url_id", lambda: MAX_URL_ID)
+    monkeypatch.setattr(database, "find_prunable_checks", find)
+    monkeypatch.setattr(database, "delete_checks", delete)
+    monkeypatch.setattr(database, "vacuum_url_checks", vacuum)
+    monkeypatch.setattr(database, "url_checks_size", lambda: next(sizes))
+    return calls
+
+
+def test_prune_checks_deletes_in_batches(fake_database):
+    progress = []
+
+    stats = retention.prune_checks(
+        retention.RetentionPolicy(),
+        url_batch_size=URL_BATCH,
+        delete_batch_size=DELETE_BATCH,
+        vacuum=True,
+        now=NOW,
+        on_batch=lambda stats: progress.append(stats.urls),
+    )
+
+    assert [call[:2] for call in fake_database["find"]] == [
+        (1, 3),
+        (3, 5),
+        (5, 7),
+    ]
+    assert fake_database["find"][0][2]["drop_before"] == NOW - timedelta(
+        days=365
+    )
+    assert all(
+        len(checks) <= DELETE_BATCH for checks in fake_database["delete"]
+    )
+    assert stats.deleted == sum(map(len, fake_database["delete"]))
+    assert stats.deleted_bytes == stats.deleted * ROW_SIZE
+    assert fake_database["vacuum"] == 1
+    assert (stats.size_before, stats.size_after) == (SIZE_BEFORE, SIZE_AFTER)
+    assert progress == [2, 4, MAX_URL_ID]
+    assert "check(s) deleted" in stats.summary()
+
+
+def test_prune_checks_dry_run_deletes_nothing(fake_database):
+    stats = retention.prune_checks(
+        retention.RetentionPolicy(), dry_run=True, vacuum=True, now=NOW
+    )
+
+    assert fake_database["delete"] == []
+    assert fake_database["vacuum"] == 0
+    assert stats.deleted == len(range(4))
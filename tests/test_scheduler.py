@@ -0,0 +1,105 @@
+import importlib
+import random
+import threading
+from datetime import datetime, timedelta
+
+import test_app_index  # noqa: F401  installs the third-party stubs
+
+scheduler = importlib.import_module("page_analyzer.scheduler")
+writer = importlib.import_module("page_analyzer.writer")
+
+NOW = datetime(2024, 6, 1, 12, 0)
+HOUR = timedelta(hours=1)
+JITTER = 0.1
+BATCH_SIZE = 3
+HTTP_OK = 200
+# A full batch is followed right away by the next one, a partial one ends
+# the pass.
+PASSES = [BATCH_SIZE, 1]
+DUE = [
+    (1, "https://a.com", HOUR),
+    (2, "https://down.com", HOUR),
+    (3, "https://c.com", timedelta(days=1)),
+]
+
+
+def test_next_check_time_stays_within_jitter():
+    rng = random.Random(1)
+    times = [
+        scheduler.next_check_time(HOUR, NOW, JITTER, rng) for _ in range(100)
+    ]
+
+    assert all(
+        NOW + HOUR * 0.9 <= moment <= NOW + HOUR * 1.1 for moment in times
+    )
+    assert len(set(times)) > 1
+    assert scheduler.next_check_time(HOUR, NOW, jitter=0) == NOW + HOUR
+
+
+def test_run_due_checks_reschedules_every_claimed_url(monkeypatch):
+    claimed = []
+    checked = []
+    written = []
+    rescheduled = []
+
+    def fake_claim(limit, lease):
+        claimed.append((limit, lease))
+        return DUE
+
+    def fake_run_check(url_id, url, store):
+        checked.append(url)
+        if "down" in url:
+            raise scheduler.RequestException("refused")
+        store(url_id, HTTP_OK, "h1", "title", None)
+
+    def fake_write(rows):
+        assert rescheduled == []
+        written.append(list(rows))
+
+    monkeypatch.setattr(scheduler, "claim_due_urls", fake_claim)
+    monkeypatch.setattr(scheduler, "run_check", fake_run_check)
+    monkeypatch.setattr(scheduler, "reschedule_urls", rescheduled.extend)
+    monkeypatch.setattr(writer, "insert_url_checks", fake_write)
+    stats = scheduler.SchedulerStats()
+
+    count = scheduler.run_due_checks(
+        batch_size=BATCH_SIZE, concurrency=2, jitter=0, stats=stats
+    )
+
+    assert count == len(DUE)
+    assert claimed == [(BATCH_SIZE, scheduler.DEFAULT_LEASE)]
+    assert sorted(checked) == sorted(url for _, url, _ in DUE)
+    assert (stats.checked, stats.failed) == (2, 1)
+    # One INSERT for the whole batch, not one per check.
+    assert len(written) == 1
+    assert sorted(row[0] for row in written[0]) == [1, 3]
+    assert [url_id for url_id, _ in rescheduled] == [1, 2, 3]
+    next_hour, _, next_day = (moment for _, moment in rescheduled)
+    assert next_day - next_hour > timedelta(hours=22)
+
+
+def test_run_due_checks_with_nothing_due(monkeypatch):
+    rescheduled = []
+    monkeypatch.setattr(scheduler, "claim_due_urls", lambda limit, lease: [])
+    monkeypatch.setattr(scheduler, "reschedule_urls", rescheduled.append)
+
+    assert scheduler.run_due_checks() == 0
+    assert rescheduled == []
+
+
+def test_run_scheduler_waits_after_partial_batch(monkeypatch):
+    stop = threading.Event()
+    batches = []
+
+    def fake_run_due_checks(**kwargs):
+        batches.append(kwargs["batch_size"])
+        if len(batches) == len(PASSES):
+            stop.set()
+        return PASSES[len(batches) - 1]
+
+    monkeypatch.setattr(scheduler, "ensure_partitions", lambda: [])
+    monkeypatch.setattr(scheduler, "run_due_checks", fake_run_due_checks)
+
+    scheduler.run_scheduler(poll_interval=0, batch_size=BATCH_SIZE, stop=stop)
+
+    assert batches == [BATCH_SIZE] * len(PASSES)
@@ -0,0 +1,71 @@
+import pytest
+from test_parser import load_package_module
+
+
+@pytest.fixture
+def seo(monkeypatch):
+    return load_package_module(monkeypatch, "seo")
+
+
+def test_extract_seo(seo):
+    html = (
+        "<html><head><title> My &amp; Title </title>"
+        "<meta name='description' content=' Desc '></head>"
+        "<body><h1>Head<b> er </b></h1></body></html>"
+    )
+    assert seo.extract_seo(html) == ("Header", "My & Title", "Desc")
+
+
+def test_extract_seo_missing_tags(seo):
+    html = "<html><head><meta name='description'></head><body><h1></h1>"
+    assert seo.extract_seo(html) == ("", None, None)
+
+
+def test_script_text_and_stray_end_tags_are_ignored(seo):
+    html = "<h1>A<script>var x = 1;</script></p>B</h1><title>T"
+    assert seo.extract_seo(html)[:2] == ("AB", "T")
+
+
+def test_element_ends_with_its_parent(seo):
+    html = "<div><h1>A</div>B<h1>C</h1>"
+    assert seo.extract_seo(html)[0] == "A"
+
+
+def test_nul_characters_are_removed(seo):
+    html = (
+        "<title>T\x00 </title><meta name=description content='D\x00'>"
+        "<h1>\x00H</h1>"
+    )
+    assert seo.extract_seo(html) == ("H", "T", "D")
+
+
+def test_parser_is_done_once_tags_are_found(seo):
+    parser = seo.SeoParser()
+    parser.feed("<title>T</title><meta name=description content=D>")
+    assert not parser.done
+    parser.feed("<h1>H</h1>")
+    assert parser.done
+    assert parser.result() == ("H", "T", "D")
+
+
+def test_parser_is_done_after_body(seo):
+    parser = seo.SeoParser()
+    parser.feed("<body><p>no tags</p></bo")
+    assert not parser.done
+    parser.feed("dy>")
+    assert parser.done
+
+
+def test_lxml_backend_matches(seo):
+    pytest.importorskip("lxml")
+    html = (
+        "<html><head><title> T </title>"
+        "<meta name='description' content=''></head>"
+        "<body><h1>A<!-- c --> B<script>s</script></h1></body></html>"
+    )
+    assert seo.extract_seo_lxml(html) == seo.extract_seo(html) == (
+        "AB",
+        "T",
+        None,
+    )
+    assert seo.extract_seo_lxml("") == (None, None, None)
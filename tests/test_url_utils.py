@@ -3,6 +3,8 @@ import sys
 import types
 from pathlib import Path
 
+import pytest
+
 validators_stub = types.ModuleType("validators")
 validators_stub.url = lambda value: value.startswith("http")
 sys.modules["validators"] = validators_stub
@@ -30,4 +32,64 @@ def test_validate_url():
 
 def test_normalize_url():
     assert normalize_url("https://example.com/path?q=1") == "https://example.com"
-    assert normalize_url("http://example.com") == "http://example.com"
\ No newline at end of file
+    assert normalize_url("http://example.com") == "http://example.com"
+
+
+def test_normalize_url_is_canonical():
+    assert normalize_url("HTTPS://WWW.Example.COM:443/") == (
+        "https://www.example.com"
+    )
+    assert normalize_url("http://example.com:80") == "http://example.com"
+    assert normalize_url("http://example.com:8080") == (
+        "http://example.com:8080"
+    )
+    assert normalize_url("https://Пример.рф/path") == (
+        "https://xn--e1afmkfd.xn--p1ai"
+    )
+    assert normalize_url("http://[::1]:80/") == "http://[::1]"
+    assert normalize_url("https://user@Example.com") == (
+        "https://user@example.com"
+    )
+
+
+def test_normalize_url_uses_idna_2008():
+    assert normalize_url("https://straße.de") == "https://xn--strae-oqa.de"
+    assert normalize_url("https://ПРИМЕР.рф") == (
+        "https://xn--e1afmkfd.xn--p1ai"
+    )
+
+
+def test_hosts_without_idna_form_are_rejected():
+    url = "https://" + "ä" * 64 + ".de"
+    url_utils._validate.cache_clear()
+
+    assert not validate_url(url)
+    with pytest.raises(ValueError, match="invalid host"):
+        normalize_url(url)
+    assert url_utils.host_key(url) == "ä" * 64 + ".de"
+    url_utils._validate.cache_clear()
+
+
+def test_validate_url_skips_validator_for_malformed_input(monkeypatch):
+    calls = []
+
+    def _validator(value):
+        calls.append(value)
+        return True
+
+    monkeypatch.setattr(validators_stub, "url", _validator)
+    url_utils._validate.cache_clear()
+
+    assert not validate_url("example.com")
+    assert not validate_url("https://exa mple.com")
+    assert not validate_url("https:///path")
+    assert validate_url("https://memo.com")
+    assert validate_url("https://memo.com")
+    assert calls == ["https://memo.com"]
+    url_utils._validate.cache_clear()
+
+
+def test_host_key_ignores_port_case_and_credentials():
+    assert url_utils.host_key("https://user@Example.COM:8443/path") == (
+        "example.com"
+    )
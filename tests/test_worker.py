@@ -0,0 +1,116 @@
+import importlib
+import threading
+
+import pytest
+import test_app_index  # noqa: F401  installs the third-party stubs
+
+worker = importlib.import_module("page_analyzer.worker")
+parser = importlib.import_module("page_analyzer.parser")
+
+JOB_ID = 7
+URL_ID = 3
+CHECK_ID = 11
+HTTP_OK = 200
+URL = "https://example.com"
+LAST_CHECK = (HTTP_OK, "x", None, None, '"v1"', None, "abc")
+
+
+@pytest.fixture
+def finished(monkeypatch):
+    results = []
+    monkeypatch.setattr(
+        worker, "claim_check_job", lambda: (JOB_ID, URL_ID, URL)
+    )
+    monkeypatch.setattr(
+        worker,
+        "finish_check_job",
+        lambda job_id, url_check_id=None, error=None: results.append(
+            (job_id, url_check_id, error)
+        ),
+    )
+    return results
+
+
+def test_process_next_job_runs_check(monkeypatch, finished):
+    inserted = []
+    requested = []
+    result = parser.FetchResult(
+        HTTP_OK, "x", None, None, bytes_read=10, etag='"v2"'
+    )
+
+    def fake_check_page(url, timeout, last_check):
+        requested.append((url, last_check))
+        return result
+
+    def fake_insert(*args, **kwargs):
+        inserted.append((args, kwargs))
+        return CHECK_ID
+
+    monkeypatch.setattr(worker, "fetch_last_check", lambda url_id: LAST_CHECK)
+    monkeypatch.setattr(worker, "check_page", fake_check_page)
+    monkeypatch.setattr(worker, "insert_url_check", fake_insert)
+
+    assert worker.process_next_job()
+    assert requested == [(URL, parser.LastCheck(*LAST_CHECK))]
+    assert inserted == [
+        (
+            (URL_ID, HTTP_OK, "x", None, None),
+            {"etag": '"v2"', "last_modified": None, "content_hash": None},
+        )
+    ]
+    assert finished == [(JOB_ID, CHECK_ID, None)]
+
+
+def test_process_next_job_records_fetch_error(monkeypatch, finished):
+    def failing_check(url, timeout, last_check):
+        raise worker.RequestException("timed out")
+
+    monkeypatch.setattr(worker, "fetch_last_check", lambda url_id: None)
+    monkeypatch.setattr(worker, "check_page", failing_check)
+
+    assert worker.process_next_job()
+    assert finished == [(JOB_ID, None, "timed out")]
+
+
+def test_process_next_job_on_empty_queue(monkeypatch):
+    monkeypatch.setattr(worker, "claim_check_job", lambda: None)
+    assert not worker.process_next_job()
+
+
+def test_run_worker_stops_when_idle(monkeypatch):
+    stop = threading.Event()
+    calls = {"reaped": 0, "partitions": 0}
+
+    def fake_requeue(started_before, max_attempts):
+        calls["reaped"] += 1
+        return 0
+
+    def idle():
+        stop.set()
+        return False
+
+    def fake_ensure():
+        calls["partitions"] += 1
+        return []
+
+    heartbeats = []
+    monkeypatch.setattr(worker, "requeue_stale_check_jobs", fake_requeue)
+    monkeypatch.setattr(worker, "process_next_job", idle)
+    monkeypatch.setattr(worker, "ensure_partitions", fake_ensure)
+    monkeypatch.setattr(
+        worker,
+        "record_worker_heartbeat",
+        lambda name, forget_before: heartbeats.append(("seen", name)),
+    )
+    monkeypatch.setattr(
+        worker,
+        "remove_worker_heartbeat",
+        lambda name: heartbeats.append(("gone", name)),
+    )
+
+    worker.run_worker(poll_interval=0, stop=stop)
+
+    assert calls["reaped"] == 1
+    assert calls["partitions"] == 1
+    assert [event for event, _ in heartbeats] == ["seen", "gone"]
+    assert heartbeats[0][1] == heartbeats[1][1]
@@ -0,0 +1,160 @@
+import importlib
+import threading
+from datetime import datetime
+
+import pytest
+import test_app_index  # noqa: F401  installs the third-party stubs
+
+writer = importlib.import_module("page_analyzer.writer")
+database = importlib.import_module("page_analyzer.database")
+
+BATCH_SIZE = 3
+FLUSH_INTERVAL = 10
+HTTP_OK = 200
+CREATED_AT = datetime(2024, 6, 1, 12, 0)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class FlakyWrite:
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.batches = []
+
+    def __call__(self, rows):
+        if self.failures:
+            self.failures -= 1
+            raise database.psycopg2.OperationalError("connection lost")
+        self.batches.append(list(rows))
+
+
+def add(check_writer, url_id):
+    check_writer.add(
+        url_id, HTTP_OK, "h1", "title", None, created_at=CREATED_AT
+    )
+
+
+def test_add_buffers_full_rows_until_batch_size():
+    write = FlakyWrite()
+    check_writer = writer.CheckWriter(BATCH_SIZE, write=write)
+
+    check_writer.add(1, HTTP_OK, "h1", "title", "d", etag='"v1"')
+    add(check_writer, 2)
+    assert write.batches == []
+
+    add(check_writer, 3)
+
+    assert [row[0] for row in write.batches[0]] == [1, 2, 3]
+    assert write.batches[0][0][6] == '"v1"'
+    assert check_writer.pending == 0
+    assert check_writer.written == BATCH_SIZE
+
+
+def test_add_writes_after_flush_interval():
+    write = FlakyWrite()
+    clock = FakeClock()
+    check_writer = writer.CheckWriter(
+        BATCH_SIZE, FLUSH_INTERVAL, write=write, clock=clock
+    )
+
+    add(check_writer, 1)
+    clock.now = FLUSH_INTERVAL
+    add(check_writer, 2)
+
+    assert [len(batch) for batch in write.batches] == [2]
+
+
+def test_no_flush_interval_waits_for_batch_size_or_close():
+    write = FlakyWrite()
+    clock = FakeClock()
+    check_writer = writer.CheckWriter(
+        BATCH_SIZE, None, write=write, clock=clock
+    )
+    check_writer.start()
+
+    add(check_writer, 1)
+    clock.now = FLUSH_INTERVAL
+    add(check_writer, 2)
+    assert write.batches == []
+
+    check_writer.close()
+    assert [len(batch) for batch in write.batches] == [2]
+
+
+def test_failed_write_keeps_rows_for_the_next_batch():
+    write = FlakyWrite(failures=1)
+    check_writer = writer.CheckWriter(BATCH_SIZE, write=write)
+
+    for url_id in range(1, BATCH_SIZE + 1):
+        add(check_writer, url_id)
+    assert check_writer.pending == BATCH_SIZE
+    assert check_writer.failures == 1
+
+    add(check_writer, 4)
+
+    assert [row[0] for row in write.batches[0]] == [1, 2, 3, 4]
+
+
+def test_flush_raises_and_requeues():
+    check_writer = writer.CheckWriter(BATCH_SIZE, write=FlakyWrite(failures=1))
+    add(check_writer, 1)
+
+    with pytest.raises(database.psycopg2.OperationalError):
+        check_writer.flush()
+
+    assert check_writer.pending == 1
+    assert check_writer.flush() == 1
+
+
+def test_rows_that_cannot_be_written_are_dropped_one_by_one():
+    batches = []
+
+    def write(rows):
+        if any("\x00" in row[2] for row in rows):
+            raise ValueError("A string literal cannot contain NUL")
+        batches.append([row[0] for row in rows])
+
+    check_writer = writer.CheckWriter(BATCH_SIZE, write=write)
+    add(check_writer, 1)
+    check_writer.add(2, HTTP_OK, "bad\x00", None, None)
+
+    assert check_writer.flush() == 1
+    assert batches == [[1]]
+    assert check_writer.pending == 0
+    assert check_writer.dropped == 1
+
+    add(check_writer, 3)
+    assert check_writer.flush() == 1
+
+
+def test_add_refuses_rows_beyond_max_pending():
+    check_writer = writer.CheckWriter(
+        BATCH_SIZE, max_pending=BATCH_SIZE, write=FlakyWrite(failures=99)
+    )
+    for url_id in range(BATCH_SIZE):
+        add(check_writer, url_id)
+
+    with pytest.raises(writer.WriterBacklogError):
+        add(check_writer, BATCH_SIZE)
+
+
+def test_background_thread_flushes_and_close_writes_the_rest():
+    written = threading.Event()
+    batches = []
+
+    def write(rows):
+        batches.append(list(rows))
+        written.set()
+
+    with writer.CheckWriter(BATCH_SIZE, 0.01, write=write) as check_writer:
+        add(check_writer, 1)
+        assert written.wait(5)
+        add(check_writer, 2)
+
+    assert [row[0] for batch in batches for row in batch] == [1, 2]